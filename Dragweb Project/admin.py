@@ -1,41 +1,218 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
+import hmac
+import os
+import uuid
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response
 from mysql.connector import Error
+from datetime import datetime
+
+from db import get_db_connection, get_pool
+from instrumentation import render_prometheus, slow_queries
+from catalog_cache import catalog, browse_page
+from notifications import notify_many
+from events import publish_notifications
+from assignment import assign_all, AssignmentInProgress
 
 # Create admin blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-# Database configuration
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''
+# Lets a Prometheus scraper read /admin/metrics with "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('DRUGWEB_METRICS_TOKEN')
+
+# Sorts for admin_payments -> (keyset columns, all indexed; newest first?)
+PAYMENT_SORTS = {
+    'newest': (('p.created_at', 'p.payment_id'), True),
+    'oldest': (('p.created_at', 'p.payment_id'), False),
+    'id_desc': (('p.payment_id',), True),
+    'id_asc': (('p.payment_id',), False)
+}
+
+PAYMENTS_PAGE_SIZE = 50
+
+# admin_payments rows: payment, customer and assigned delivery man in one query
+ADMIN_PAYMENT_COLUMNS = """
+    SELECT p.payment_id, p.Customer_ID, p.amount, p.payment_type, p.DeliveryMan_ID,
+           COALESCE(p.status, 'Assigned') as status, p.created_at,
+           CONCAT(u.F_name, ' ', u.L_name) as customer_name, u.phone as customer_phone, u.address as customer_address,
+           CONCAT(du.F_name, ' ', du.L_name) as deliveryman_name, du.phone as deliveryman_phone
+    FROM payment p
+    JOIN user u ON p.Customer_ID = u.ID
+    LEFT JOIN deliveryman d ON p.DeliveryMan_ID = d.DeliveryMan_ID
+    LEFT JOIN user du ON d.DeliveryMan_ID = du.ID
+"""
+
+# Timestamp format of the created_at half of a payments page key in URLs
+KEY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Dashboard sections, keyset-paged by keyset_query()
+DASHBOARD_REQUESTS_SELECT = """
+    SELECT cr.Request_ID, cr.Customer_ID, cr.request_med_name, cr.Expected_date,
+           IFNULL(cr.Status, 'Pending') AS Status,
+           CONCAT(u.F_name, ' ', u.L_name) AS customer_name
+    FROM customer_request cr
+    JOIN user u ON u.ID = cr.Customer_ID
+"""
+DASHBOARD_REVIEWS_SELECT = """
+    SELECT r.Review_ID, r.Customer_ID, r.review,
+           CONCAT(u.F_name, ' ', u.L_name) AS customer_name
+    FROM customer_review r
+    JOIN user u ON u.ID = r.Customer_ID
+"""
+
+# Bulk endpoint lookups; {ids} is the IN (...) placeholder list
+LOCK_PAYMENTS_QUERY = """
+    SELECT payment_id, status FROM payment
+    WHERE payment_id IN ({ids})
+    FOR UPDATE
+"""
+DELIVERYMEN_BY_ID_QUERY = """
+    SELECT DeliveryMan_ID, Name FROM deliveryman
+    WHERE DeliveryMan_ID IN ({ids})
+"""
+LOCK_REQUESTS_QUERY = """
+    SELECT Request_ID, Customer_ID, request_med_name FROM customer_request
+    WHERE Request_ID IN ({ids})
+    FOR UPDATE
+"""
+
+PAYMENT_STATUSES = ['Assigned', 'Pending Assignment', 'Accepted for Delivery', 'Delivered']
+
+REQUEST_STATUSES = ['Pending', 'Accepted', 'Declined']
+
+# Rows per page in the dashboard sections (a client may ask for up to the max)
+DASHBOARD_PAGE_SIZE = 25
+DASHBOARD_MAX_PAGE_SIZE = 100
+
+# Items accepted by one bulk assignment or request-handling call
+BULK_MAX_ITEMS = 1000
+
+# Request action -> (new Status, notification type, customer message)
+REQUEST_ACTIONS = {
+    'accept': ('Accepted', 'request_accepted', "Good news! Your request for {} has been accepted."),
+    'decline': ('Declined', 'request_declined', "Sorry, your request for {} has been declined.")
 }
 
-def get_db_connection():
-    """Create and return a database connection"""
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value, ignoring anything else"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
         return None
 
+def payment_key_arg(prefix, sort):
+    """Read a page key (?<prefix>=<created_at>&<prefix>_id=<payment_id>) for `sort`, or None"""
+    payment_id = request.args.get(f'{prefix}_id')
+    if not payment_id:
+        return None
+    if len(PAYMENT_SORTS[sort][0]) == 1:
+        return (payment_id,)
+    try:
+        return (datetime.strptime(request.args.get(prefix, ''), KEY_TIME_FORMAT), payment_id)
+    except ValueError:
+        return None
+
+def payment_key_args(prefix, row, sort):
+    """URL arguments that payment_key_arg(prefix, sort) reads back as `row`'s key"""
+    args = {f'{prefix}_id': row['payment_id']}
+    if len(PAYMENT_SORTS[sort][0]) == 2:
+        args[prefix] = row['created_at'].strftime(KEY_TIME_FORMAT)
+    return args
+
+def keyset_condition(columns, op):
+    """(a op %s OR (a = %s AND b op %s)) for a two-column key, b op %s for one"""
+    if len(columns) == 1:
+        return f"{columns[0]} {op} %s"
+    return f"({columns[0]} {op} %s OR ({columns[0]} = %s AND {columns[1]} {op} %s))"
+
+def keyset_params(key):
+    return list(key) if len(key) == 1 else [key[0], key[0], key[1]]
+
+def payment_filters(status='', deliveryman_id='', date_from=None, date_to=None):
+    """(conditions, params) for the admin payments filters"""
+    conditions = []
+    params = []
+    
+    if status:
+        conditions.append("p.status = %s")
+        params.append(status)
+    
+    if deliveryman_id == 'unassigned':
+        conditions.append("p.DeliveryMan_ID IS NULL")
+    elif deliveryman_id:
+        conditions.append("p.DeliveryMan_ID = %s")
+        params.append(deliveryman_id)
+    
+    if date_from:
+        conditions.append("p.created_at >= %s")
+        params.append(date_from)
+    
+    if date_to:
+        conditions.append("p.created_at < %s + INTERVAL 1 DAY")
+        params.append(date_to)
+    
+    return conditions, params
+
+def payments_page_query(conditions, params, sort, limit=PAYMENTS_PAGE_SIZE, after=None, before=None):
+    """(sql, params) for fetch_payments_page(); migrations.ROUTE_QUERIES checks the same SQL"""
+    columns, descending = PAYMENT_SORTS[sort]
+    backwards = before is not None and after is None
+    key = before if backwards else after
+    # Descending pages move towards smaller keys, unless walking back
+    downwards = descending != backwards
+    conditions = list(conditions)
+    params = list(params)
+    if key:
+        conditions.append(keyset_condition(columns, '<' if downwards else '>'))
+        params += keyset_params(key)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = ', '.join(f"{column} {'DESC' if downwards else 'ASC'}" for column in columns)
+    return f"""
+        {ADMIN_PAYMENT_COLUMNS}
+        {where}
+        ORDER BY {order}
+        LIMIT %s
+    """, params + [limit + 1]
+
+def fetch_payments_page(cursor, conditions, params, sort, limit=PAYMENTS_PAGE_SIZE, after=None, before=None):
+    """One page of admin payments, keyset-paged on the sort's columns.
+
+    `after` is the key of the last row of the previous page (Next), `before`
+    the key of the first row of the next page (Prev). Either way the query is
+    an index range read of limit + 1 rows, however deep the page.
+    Returns (payments, has_prev, has_next).
+    """
+    backwards = before is not None and after is None
+    key = before if backwards else after
+    cursor.execute(*payments_page_query(conditions, params, sort, limit, after, before))
+    rows = cursor.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        return rows, more, True
+    return rows, key is not None, more
+
 @admin_bp.route('/payments')
 def admin_payments():
-    """Admin view to see all customer payments"""
+    """Admin view to see customer payments, filtered and paginated on the server"""
     if 'user_id' not in session or session['user_type'] != 'admin':
         flash('Please login as admin first!', 'error')
         return redirect(url_for('login'))
     
+    status = request.args.get('status', '')
+    deliveryman_id = request.args.get('deliveryman_id', '')
+    date_from = parse_date(request.args.get('date_from'))
+    date_to = parse_date(request.args.get('date_to'))
+    sort = request.args.get('sort', 'newest')
+    if sort not in PAYMENT_SORTS:
+        sort = 'newest'
+    # Page number is only shown; the keys decide which rows come back
+    page = max(request.args.get('page', 1, type=int), 1)
+    after = payment_key_arg('after', sort)
+    before = payment_key_arg('before', sort)
+    if not (after or before):
+        page = 1
+    
     connection = get_db_connection()
     if not connection:
         flash("Database connection failed", "error")
@@ -43,40 +220,12 @@ def admin_payments():
     
     try:
         cursor = connection.cursor(dictionary=True)
+        conditions, params = payment_filters(status, deliveryman_id, date_from, date_to)
         
-        cursor.execute("""
-            SELECT p.payment_id, p.Customer_ID, p.amount, p.payment_type, p.DeliveryMan_ID,
-                   CONCAT(u.F_name, ' ', u.L_name) as customer_name, u.phone as customer_phone, u.address as customer_address
-            FROM payment p
-            JOIN customer c ON p.Customer_ID = c.Customer_ID
-            JOIN user u ON c.Customer_ID = u.ID
-            ORDER BY p.payment_id DESC
-        """)
-        
-        payments = cursor.fetchall()
-        
-        for payment in payments:
-            if payment['DeliveryMan_ID']:
-                try:
-                    cursor.execute("""
-                        SELECT CONCAT(u.F_name, ' ', u.L_name) as Name, u.phone as Phone 
-                        FROM deliveryman d 
-                        JOIN user u ON d.DeliveryMan_ID = u.ID 
-                        WHERE d.DeliveryMan_ID = %s
-                    """, (payment['DeliveryMan_ID'],))
-                    deliveryman = cursor.fetchone()
-                    if deliveryman:
-                        payment['deliveryman_name'] = deliveryman['Name']
-                        payment['deliveryman_phone'] = deliveryman['Phone']
-                    else:
-                        payment['deliveryman_name'] = None
-                        payment['deliveryman_phone'] = None
-                except:
-                    payment['deliveryman_name'] = None
-                    payment['deliveryman_phone'] = None
-            else:
-                payment['deliveryman_name'] = None
-                payment['deliveryman_phone'] = None
+        # One query for payments, customers and assigned delivery men, one
+        # extra row to know if there is another page without COUNT(*)
+        payments, has_prev, has_next = fetch_payments_page(cursor, conditions, params, sort,
+                                                           after=after, before=before)
         
         try:
             cursor.execute("""
@@ -89,9 +238,29 @@ def admin_payments():
         except:
             deliverymen = []
         
+        filters = {
+            'status': status,
+            'deliveryman_id': deliveryman_id,
+            'date_from': date_from.isoformat() if date_from else '',
+            'date_to': date_to.isoformat() if date_to else '',
+            'sort': sort
+        }
+        
+        # Link arguments for the neighbouring pages, filters included
+        prev_args = next_args = None
+        if payments and has_prev:
+            prev_args = dict(filters, page=page - 1, **payment_key_args('before', payments[0], sort))
+        if payments and has_next:
+            next_args = dict(filters, page=page + 1, **payment_key_args('after', payments[-1], sort))
+        
         return render_template('admin_payments.html', 
                              payments=payments, 
-                             deliverymen=deliverymen)
+                             deliverymen=deliverymen,
+                             statuses=PAYMENT_STATUSES,
+                             filters=filters,
+                             page=page,
+                             prev_args=prev_args,
+                             next_args=next_args)
         
     except Exception as e:
         flash(f"Error loading payments: {str(e)}", "error")
@@ -100,6 +269,114 @@ def admin_payments():
         cursor.close()
         connection.close()
 
+def _in_list(values):
+    return ', '.join(['%s'] * len(values))
+
+def apply_assignments(cursor, assignments):
+    """Assign (payment_id, deliveryman_id) pairs: one locking read, then one executemany.
+
+    Needs a dictionary cursor; the caller commits. Returns one result dict
+    per pair, in order.
+    """
+    payment_ids = sorted({payment_id for payment_id, _ in assignments if payment_id})
+    deliveryman_ids = sorted({deliveryman_id for _, deliveryman_id in assignments if deliveryman_id})
+    statuses = {}
+    names = {}
+    if payment_ids:
+        cursor.execute(LOCK_PAYMENTS_QUERY.format(ids=_in_list(payment_ids)), payment_ids)
+        statuses = {row['payment_id']: row['status'] for row in cursor.fetchall()}
+    if deliveryman_ids:
+        cursor.execute(DELIVERYMEN_BY_ID_QUERY.format(ids=_in_list(deliveryman_ids)), deliveryman_ids)
+        names = {row['DeliveryMan_ID']: row['Name'] or 'Unknown' for row in cursor.fetchall()}
+    
+    results = []
+    updates = []
+    seen = set()
+    for payment_id, deliveryman_id in assignments:
+        result = {'payment_id': payment_id, 'deliveryman_id': deliveryman_id, 'success': False}
+        if not payment_id or not deliveryman_id:
+            result['message'] = 'Missing payment ID or delivery man ID'
+        elif payment_id in seen:
+            result['message'] = 'Payment listed more than once'
+        elif payment_id not in statuses:
+            result['message'] = 'Payment not found'
+        elif deliveryman_id not in names:
+            result['message'] = 'Delivery man not found'
+        elif statuses[payment_id] == 'Delivered':
+            result['message'] = 'Order already delivered'
+        else:
+            result.update(success=True, deliveryman_name=names[deliveryman_id],
+                          message=f'Delivery man {names[deliveryman_id]} assigned successfully')
+            # A declined order comes back as 'Pending Assignment'; put it in the new courier's queue
+            updates.append((deliveryman_id, payment_id))
+        seen.add(payment_id)
+        results.append(result)
+    
+    if updates:
+        cursor.executemany("""
+            UPDATE payment 
+            SET DeliveryMan_ID = %s, status = 'Assigned' 
+            WHERE payment_id = %s
+        """, updates)
+    return results
+
+def apply_request_decisions(cursor, decisions):
+    """Accept or decline (Request_ID, action) pairs: one locking read, one executemany, notify_many.
+
+    Needs a dictionary cursor; the caller commits and then publishes the
+    returned events. Returns (results, events), one result dict per pair.
+    """
+    request_ids = sorted({request_id for request_id, _ in decisions if request_id})
+    requests_by_id = {}
+    if request_ids:
+        cursor.execute(LOCK_REQUESTS_QUERY.format(ids=_in_list(request_ids)), request_ids)
+        requests_by_id = {row['Request_ID']: row for row in cursor.fetchall()}
+    
+    results = []
+    updates = []
+    notifications = []
+    seen = set()
+    for request_id, action in decisions:
+        result = {'request_id': request_id, 'action': action, 'success': False}
+        if not request_id:
+            result['message'] = 'Missing request ID'
+        elif action not in REQUEST_ACTIONS:
+            result['message'] = 'Invalid action'
+        elif request_id in seen:
+            result['message'] = 'Request listed more than once'
+        elif request_id not in requests_by_id:
+            result['message'] = 'Request not found'
+        else:
+            info = requests_by_id[request_id]
+            status, notification_type, message = REQUEST_ACTIONS[action]
+            updates.append((status, request_id))
+            notifications.append((info['Customer_ID'], message.format(info['request_med_name']), notification_type))
+            result.update(success=True, status=status,
+                          message=f"Request for {info['request_med_name']} has been {status.lower()}.")
+        seen.add(request_id)
+        results.append(result)
+    
+    events = []
+    if updates:
+        cursor.executemany("""
+            UPDATE customer_request 
+            SET Status = %s 
+            WHERE Request_ID = %s
+        """, updates)
+        events = notify_many(cursor, notifications, f"handled:{uuid.uuid4().hex}")
+    return results, events
+
+def bulk_summary(results, done):
+    """JSON body for a bulk call: per-item results plus counts"""
+    succeeded = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': True,
+        'message': f'{succeeded} {done}, {len(results) - succeeded} failed',
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    })
+
 @admin_bp.route('/assign_deliveryman', methods=['POST'])
 def assign_deliveryman():
     """Assign a delivery man to a payment"""
@@ -116,29 +393,11 @@ def assign_deliveryman():
     if not connection:
         return jsonify({'success': False, 'message': 'Database connection failed'})
     
+    cursor = connection.cursor(dictionary=True)
     try:
-        cursor = connection.cursor()
-        
-        cursor.execute("""
-            UPDATE payment 
-            SET DeliveryMan_ID = %s 
-            WHERE payment_id = %s
-        """, (deliveryman_id, payment_id))
-        
-        if cursor.rowcount > 0:
-            connection.commit()
-            
-            cursor.execute("SELECT Name FROM deliveryman WHERE DeliveryMan_ID = %s", (deliveryman_id,))
-            deliveryman = cursor.fetchone()
-            deliveryman_name = deliveryman[0] if deliveryman else "Unknown"
-            
-            return jsonify({
-                'success': True, 
-                'message': f'Delivery man {deliveryman_name} assigned successfully',
-                'deliveryman_name': deliveryman_name
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Payment not found'})
+        result = apply_assignments(cursor, [(payment_id, deliveryman_id)])[0]
+        connection.commit()
+        return jsonify(result)
             
     except Exception as e:
         connection.rollback()
@@ -147,67 +406,219 @@ def assign_deliveryman():
         cursor.close()
         connection.close()
 
+@admin_bp.route('/assign_deliveryman/bulk', methods=['POST'])
+def assign_deliveryman_bulk():
+    """Assign many payments in one transaction.
+
+    JSON body: {"assignments": [{"payment_id": ..., "deliveryman_id": ...}, ...]},
+    or {"payment_ids": [...], "deliveryman_id": ...} to give them all to one courier.
+    """
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    data = request.get_json(silent=True) or {}
+    if 'assignments' in data:
+        items = [item if isinstance(item, dict) else {} for item in data.get('assignments') or []]
+        assignments = [(str(item.get('payment_id') or ''), str(item.get('deliveryman_id') or '')) for item in items]
+    else:
+        deliveryman_id = str(data.get('deliveryman_id') or '')
+        assignments = [(str(payment_id or ''), deliveryman_id) for payment_id in data.get('payment_ids') or []]
+    
+    if not assignments:
+        return jsonify({'success': False, 'message': 'No payments selected'})
+    if len(assignments) > BULK_MAX_ITEMS:
+        return jsonify({'success': False, 'message': f'At most {BULK_MAX_ITEMS} payments per call'})
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'success': False, 'message': 'Database connection failed'})
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        results = apply_assignments(cursor, assignments)
+        connection.commit()
+        return bulk_summary(results, 'assigned')
+    except Error as e:
+        connection.rollback()
+        print(f"Error in bulk assignment: {e}")
+        return jsonify({'success': False, 'message': 'Database error occurred'})
+    finally:
+        cursor.close()
+        connection.close()
+
+def partial_assignment_message(message, partial):
+    """Error message for a run that stopped partway, with the batches already committed"""
+    if partial and partial['assigned']:
+        return f"{message} after {partial['assigned']} order(s) were assigned"
+    return message
+
+@admin_bp.route('/assignments/run', methods=['POST'])
+def run_assignments():
+    """Run the automatic assignment engine over the unassigned queue now"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'success': False, 'message': 'Database connection failed'})
+    
+    try:
+        result = assign_all(connection, any_area=request.form.get('any_area') == '1')
+    except AssignmentInProgress as e:
+        return jsonify({'success': False, 'message': partial_assignment_message(str(e), e.partial),
+                        'result': e.partial})
+    except Error as e:
+        print(f"Error assigning deliveries: {e}")
+        return jsonify({'success': False, 'message': partial_assignment_message('Database error occurred', e.partial),
+                        'result': e.partial})
+    
+    return jsonify({
+        'success': True,
+        'message': f"{result['assigned']} order(s) assigned, {result['unmatched']} left with no matching area",
+        'result': result
+    })
+
 @admin_bp.route('/dashboard')
 def dashboard():
-    """Admin dashboard"""
+    """Admin dashboard shell; each section loads its own pages from the JSON endpoints below"""
     if 'user_id' not in session or session['user_type'] != 'admin':
         flash('Please login as admin first!', 'error')
         return redirect(url_for('login'))
     
+    return render_template('admin_dashboard.html',
+                           request_statuses=REQUEST_STATUSES,
+                           page_size=DASHBOARD_PAGE_SIZE)
+
+def dashboard_page_args():
+    """(limit, after, newest_first) from the query string of a dashboard section"""
+    limit = min(max(request.args.get('limit', DASHBOARD_PAGE_SIZE, type=int), 1), DASHBOARD_MAX_PAGE_SIZE)
+    after = request.args.get('after', type=int)
+    newest_first = request.args.get('sort', 'newest') != 'oldest'
+    return limit, after, newest_first
+
+def request_filters(status='', customer_id=''):
+    """(conditions, params) for the dashboard requests section"""
+    conditions = []
+    params = []
+    if status in REQUEST_STATUSES:
+        conditions.append("cr.Status = %s")
+        params.append(status)
+    if customer_id:
+        conditions.append("cr.Customer_ID = %s")
+        params.append(customer_id)
+    return conditions, params
+
+def review_filters(customer_id=''):
+    """(conditions, params) for the dashboard reviews section"""
+    if customer_id:
+        return ["r.Customer_ID = %s"], [customer_id]
+    return [], []
+
+def keyset_query(select, key, conditions, params, limit, after, newest_first):
+    """(sql, params) for one keyset page of `select` ordered by `key`"""
+    conditions = list(conditions)
+    params = list(params)
+    if after:
+        conditions.append(f"{key} {'<' if newest_first else '>'} %s")
+        params.append(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        {select}
+        {where}
+        ORDER BY {key} {'DESC' if newest_first else 'ASC'}
+        LIMIT %s
+    """, params + [limit + 1]
+
+def keyset_page(cursor, select, key, conditions, params, limit, after, newest_first):
+    """Run one keyset page of `select` ordered by `key`. Returns (rows, next_after)."""
+    cursor.execute(*keyset_query(select, key, conditions, params, limit, after, newest_first))
+    rows = cursor.fetchall()
+    next_after = rows[limit - 1][key.split('.')[-1]] if len(rows) > limit else None
+    return rows[:limit], next_after
+
+@admin_bp.route('/dashboard/medicines')
+def dashboard_medicines():
+    """One page of the medicine inventory, from the cached catalog"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    search = request.args.get('search', '').strip()
+    category = request.args.get('category', '')
+    sort_by = request.args.get('sort_by', 'name')
+    after = request.args.get('after', '')
+    limit = min(max(request.args.get('limit', DASHBOARD_PAGE_SIZE, type=int), 1), DASHBOARD_MAX_PAGE_SIZE)
+    
+    medicines, next_cursor, total_count = browse_page(search, category, sort_by, after, limit)
+    
+    result = {
+        'success': True,
+        'medicines': [med._asdict() for med in medicines],
+        'next': next_cursor,
+        'total_count': total_count
+    }
+    if not after:
+        # Filter options come with the first page
+        result['categories'] = catalog.categories()
+    return jsonify(result)
+
+@admin_bp.route('/dashboard/requests')
+def dashboard_requests():
+    """One page of medicine requests, newest first, optionally filtered by status or customer"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    limit, after, newest_first = dashboard_page_args()
+    status = request.args.get('status', '')
+    customer_id = request.args.get('customer_id', '').strip()
+    
+    conditions, params = request_filters(status, customer_id)
+    
     connection = get_db_connection()
-    medicines = []
-    reviews = []
-    requests = []
+    if not connection:
+        return jsonify({'success': False, 'message': 'Database connection failed'})
     
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        
-        try:
-            cursor.execute("SELECT * FROM medicine ORDER BY Med_Code")
-            medicines = cursor.fetchall()
-            
-            cursor.execute("""
-                SELECT cr.*, CONCAT(u.F_name, ' ', u.L_name) as customer_name
-                FROM customer_review cr
-                JOIN customer c ON cr.Customer_ID = c.Customer_ID
-                JOIN user u ON c.Customer_ID = u.ID
-            """)
-            reviews = cursor.fetchall()
-            
-            try:
-                cursor.execute("""
-                    SELECT cmr.Customer_ID, cmr.request_med_name, cmr.Expected_date, 
-                           IFNULL(cmr.Status, 'Pending') as Status,
-                           CONCAT(u.F_name, ' ', u.L_name) as customer_name 
-                    FROM customer_request cmr
-                    JOIN customer c ON cmr.Customer_ID = c.Customer_ID
-                    JOIN user u ON c.Customer_ID = u.ID
-                    ORDER BY cmr.request_med_name
-                """)
-            except:
-                cursor.execute("ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'")
-                connection.commit()
-                cursor.execute("""
-                    SELECT cmr.Customer_ID, cmr.request_med_name, cmr.Expected_date, 
-                           IFNULL(cmr.Status, 'Pending') as Status,
-                           CONCAT(u.F_name, ' ', u.L_name) as customer_name 
-                    FROM customer_request cmr
-                    JOIN customer c ON cmr.Customer_ID = c.Customer_ID
-                    JOIN user u ON c.Customer_ID = u.ID
-                    ORDER BY cmr.request_med_name
-                """)
-            requests = cursor.fetchall()
-            
-        except Exception as e:
-            flash(f'Database error: {str(e)}', 'error')
-        
+    cursor = connection.cursor(dictionary=True)
+    try:
+        # Keyset on Request_ID (indexed with Status), so deep pages cost the same as the first
+        rows, next_after = keyset_page(cursor, DASHBOARD_REQUESTS_SELECT, 'cr.Request_ID',
+                                       conditions, params, limit, after, newest_first)
+        for row in rows:
+            if row['Expected_date']:
+                row['Expected_date'] = row['Expected_date'].isoformat()
+        return jsonify({'success': True, 'requests': rows, 'next': next_after})
+    except Error as e:
+        print(f"Error loading requests page: {e}")
+        return jsonify({'success': False, 'message': 'Error loading requests'})
+    finally:
         cursor.close()
         connection.close()
+
+@admin_bp.route('/dashboard/reviews')
+def dashboard_reviews():
+    """One page of customer reviews, newest first, optionally for one customer"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    limit, after, newest_first = dashboard_page_args()
+    customer_id = request.args.get('customer_id', '').strip()
     
-    return render_template('admin_dashboard.html', 
-                         medicines=medicines, 
-                         reviews=reviews, 
-                         requests=requests)
+    conditions, params = review_filters(customer_id)
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'success': False, 'message': 'Database connection failed'})
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        rows, next_after = keyset_page(cursor, DASHBOARD_REVIEWS_SELECT, 'r.Review_ID',
+                                       conditions, params, limit, after, newest_first)
+        return jsonify({'success': True, 'reviews': rows, 'next': next_after})
+    except Error as e:
+        print(f"Error loading reviews page: {e}")
+        return jsonify({'success': False, 'message': 'Error loading reviews'})
+    finally:
+        cursor.close()
+        connection.close()
 
 @admin_bp.route('/profile')
 def profile():
@@ -241,62 +652,32 @@ def profile():
     
     return render_template('admin_profile.html', admin_info=admin_info)
 
+def request_id_arg(value):
+    """A Request_ID from JSON, or None when it is missing or not a number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 @admin_bp.route('/handle_request', methods=['POST'])
 def handle_request():
     """Handle customer medicine requests (accept/decline)"""
     if 'user_id' not in session or session['user_type'] != 'admin':
         return jsonify({'success': False, 'message': 'Unauthorized access'})
     
-    customer_id = request.json.get('customer_id')
-    medicine_name = request.json.get('medicine_name')
-    action = request.json.get('action')
+    data = request.get_json(silent=True) or {}
+    request_id = request_id_arg(data.get('request_id'))
+    action = data.get('action')
     
     connection = get_db_connection()
     if connection:
         cursor = connection.cursor(dictionary=True)
         
         try:
-            try:
-                cursor.execute("""
-                    ALTER TABLE customer_request 
-                    ADD COLUMN IF NOT EXISTS Status VARCHAR(20) DEFAULT 'Pending'
-                """)
-                connection.commit()
-            except:
-                pass
-            
-            cursor.execute("""
-                SELECT Customer_ID, request_med_name 
-                FROM customer_request 
-                WHERE Customer_ID = %s AND request_med_name = %s
-                LIMIT 1
-            """, (customer_id, medicine_name))
-            request_info = cursor.fetchone()
-            
-            if not request_info:
-                return jsonify({'success': False, 'message': 'Request not found'})
-            
-            if action == 'accept':
-                cursor.execute("""
-                    UPDATE customer_request 
-                    SET Status = 'Accepted' 
-                    WHERE Customer_ID = %s AND request_med_name = %s
-                """, (customer_id, medicine_name))
-                message = f'Request for {medicine_name} has been accepted successfully!'
-                
-            elif action == 'decline':
-                cursor.execute("""
-                    UPDATE customer_request 
-                    SET Status = 'Declined' 
-                    WHERE Customer_ID = %s AND request_med_name = %s
-                """, (customer_id, medicine_name))
-                message = f'Request for {medicine_name} has been declined.'
-                
-            else:
-                return jsonify({'success': False, 'message': 'Invalid action'})
-            
+            results, events = apply_request_decisions(cursor, [(request_id, action)])
             connection.commit()
-            return jsonify({'success': True, 'message': message})
+            publish_notifications(events)
+            return jsonify(results[0])
             
         except Exception as e:
             connection.rollback()
@@ -307,6 +688,46 @@ def handle_request():
     
     return jsonify({'success': False, 'message': 'Database connection failed'})
 
+@admin_bp.route('/handle_request/bulk', methods=['POST'])
+def handle_request_bulk():
+    """Accept or decline many requests in one transaction.
+
+    JSON body: {"requests": [{"request_id": ..., "action": "accept"}, ...]},
+    or {"request_ids": [...], "action": "accept"} to apply one action to all.
+    """
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    data = request.get_json(silent=True) or {}
+    if 'requests' in data:
+        items = [item if isinstance(item, dict) else {} for item in data.get('requests') or []]
+        decisions = [(request_id_arg(item.get('request_id')), item.get('action')) for item in items]
+    else:
+        decisions = [(request_id_arg(request_id), data.get('action')) for request_id in data.get('request_ids') or []]
+    
+    if not decisions:
+        return jsonify({'success': False, 'message': 'No requests selected'})
+    if len(decisions) > BULK_MAX_ITEMS:
+        return jsonify({'success': False, 'message': f'At most {BULK_MAX_ITEMS} requests per call'})
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'success': False, 'message': 'Database connection failed'})
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        results, events = apply_request_decisions(cursor, decisions)
+        connection.commit()
+        publish_notifications(events)
+        return bulk_summary(results, 'handled')
+    except Error as e:
+        connection.rollback()
+        print(f"Error in bulk request handling: {e}")
+        return jsonify({'success': False, 'message': 'Database error occurred'})
+    finally:
+        cursor.close()
+        connection.close()
+
 @admin_bp.route('/get_deliverymen', methods=['GET'])
 def get_deliverymen():
     """Get list of available delivery men for assignment"""
@@ -332,4 +753,32 @@ def get_deliverymen():
             cursor.close()
             connection.close()
     
-    return jsonify({'success': False, 'message': 'Database connection failed'})
\ No newline at end of file
+    return jsonify({'success': False, 'message': 'Database connection failed'})
+
+def metrics_authorized():
+    """Admin session, or the metrics bearer token if one is configured"""
+    if 'user_id' in session and session.get('user_type') == 'admin':
+        return True
+    header = request.headers.get('Authorization', '')
+    return bool(METRICS_TOKEN) and hmac.compare_digest(header, f"Bearer {METRICS_TOKEN}")
+
+@admin_bp.route('/metrics')
+def metrics():
+    """Per-endpoint request and SQL aggregates in the Prometheus text format"""
+    if not metrics_authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    
+    pool = get_pool().stats()
+    gauges = {
+        'drugweb_db_pool_in_use': ('Connections currently borrowed from the pool', pool['in_use']),
+        'drugweb_db_pool_idle': ('Idle pooled connections', pool['idle']),
+        'drugweb_db_pool_size': ('Pool size limit', pool['size'])
+    }
+    return Response(render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/slow_queries')
+def slow_query_log():
+    """Most recent slow statements (normalized SQL), newest first"""
+    if not metrics_authorized():
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    return jsonify({'success': True, 'slow_queries': slow_queries()})
@@ -1,7 +1,5 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
 from mysql.connector import Error
-import hashlib
 from datetime import datetime
 import re
 import random
@@ -12,6 +10,21 @@ from admin import admin_bp
 from customer import customer_bp
 from deliveryman import deliveryman_bp
 
+# Shared services: connection pool, schema migrations, catalog cache, ID generation, password hashing
+import db
+import instrumentation
+from db import get_db_connection
+from migrations import run_migrations
+from reminders import start_scheduler as start_reminder_scheduler
+from ledger import start_scheduler as start_snapshot_scheduler
+from assignment import start_scheduler as start_assignment_scheduler
+from catalog_cache import catalog, load_catalog, invalidate_catalog
+from cart import cart_cache
+from reviews import review_feed
+from ids import next_customer_id
+from passwords import check_password, make_password, HashingBusyError
+from roles import ROLES, resolve_user, start_session, has_role, home_endpoint
+
 app = Flask(__name__)
 app.secret_key = 'our_secret_key_here'  # Change this to a secure secret key
 
@@ -20,125 +33,45 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(customer_bp)
 app.register_blueprint(deliveryman_bp)
 
-# Database configuration
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''  # Add your MySQL password here
-}
+# Shared connection pool: connections are returned on teardown
+db.init_app(app)
 
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        # Test if database exists, if not create it
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        # Reconnect to the database
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        print("Please ensure MySQL server is running and accessible")
-        return None
+# Per-request SQL counts, timings, slow-query log and N+1 detection
+instrumentation.init_app(app)
 
-def generate_customer_id():
-    """Generate next customer ID in format CM001, CM002, etc."""
-    connection = get_db_connection()
-    if connection:
-        cursor = connection.cursor()
-        cursor.execute("SELECT Customer_ID FROM customer ORDER BY Customer_ID DESC LIMIT 1")
-        result = cursor.fetchone()
-        
-        if result:
-            last_id = result[0]
-            number = int(last_id[2:]) + 1
-            new_id = f"CM{number:03d}"
-        else:
-            new_id = "CM001"
-        
-        cursor.close()
-        connection.close()
-        return new_id
-    return "CM001"
+# Apply pending schema migrations before anything reads the database
+run_migrations()
+
+# Load the medicine catalog cache and search index once at startup
+load_catalog()
+
+# Daily jobs: request reminders and points snapshots (idempotent, so every worker may run them)
+start_reminder_scheduler()
+start_snapshot_scheduler()
+
+# Automatic delivery assignment every DRUGWEB_ASSIGN_INTERVAL seconds (runs are serialized by a MySQL lock)
+start_assignment_scheduler()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-# --- MAINTENANCE ROUTES (Restored) ---
+# --- MAINTENANCE ROUTES ---
 
-@app.route('/update_medicine_db')
-def update_medicine_db():
-    """Add Category column to medicine table"""
-    connection = get_db_connection()
-    if not connection:
-        return "❌ Database connection failed."
-    
-    try:
-        cursor = connection.cursor()
-        cursor.execute("ALTER TABLE medicine ADD COLUMN Category VARCHAR(50)")
-        connection.commit()
-        
-        cursor.execute("UPDATE medicine SET Category = 'Pain Relief' WHERE Name LIKE '%Paracetamol%' OR Name LIKE '%Aspirin%'")
-        cursor.execute("UPDATE medicine SET Category = 'Antibiotic' WHERE Name LIKE '%Amoxicillin%' OR Name LIKE '%Penicillin%'")
-        cursor.execute("UPDATE medicine SET Category = 'General' WHERE Category IS NULL")
-        connection.commit()
-        
-        cursor.close()
-        connection.close()
-        return "✅ Category column added to medicine table and sample data updated!"
-    except Exception as e:
-        return f"Database update result: {str(e)}<br><small>Note: If error mentions 'Duplicate column name', the column already exists and this is normal.</small>"
+@app.route('/pool_stats')
+def pool_stats():
+    """Connection pool metrics (in-use, waits, wait time)"""
+    if 'user_id' not in session or session.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    return jsonify({'success': True, 'pool': db.get_pool().stats()})
 
-@app.route('/update_db')
-def update_db():
-    """Add Status column to customer_request table"""
-    connection = get_db_connection()
-    if not connection:
-        return "❌ Database connection failed."
-    
-    try:
-        cursor = connection.cursor()
-        cursor.execute("ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'")
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return "✅ Status column added to customer_request table successfully!"
-    except Exception as e:
-        return f"Database update result: {str(e)}<br><small>Note: If error mentions 'Duplicate column name', the column already exists and this is normal.</small>"
-
-@app.route('/fix_db')
-def fix_db():
-    """Fix database by adding missing columns"""
-    connection = get_db_connection()
-    if not connection:
-        return "❌ Database connection failed."
-    
-    try:
-        cursor = connection.cursor()
-        
-        cursor.execute("""
-            ALTER TABLE customer_request 
-            ADD COLUMN Request_ID INT AUTO_INCREMENT PRIMARY KEY FIRST
-        """)
-        
-        cursor.execute("""
-            ALTER TABLE customer_request 
-            ADD COLUMN IF NOT EXISTS Status VARCHAR(20) DEFAULT 'Pending'
-        """)
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return "✅ Database structure fixed! Request_ID and Status columns added."
-    except Exception as e:
-        return f"Database fix result: {str(e)} (This might be normal if columns already exist)"
+@app.route('/cache_stats')
+def cache_stats():
+    """Catalog, cart and review feed cache counters"""
+    if 'user_id' not in session or session.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    return jsonify({'success': True, 'catalog': catalog.stats(), 'carts': cart_cache.stats(),
+                    'reviews': review_feed.stats()})
 
 # --- MAIN SETUP ROUTE (Updated with new design) ---
 
@@ -150,142 +83,11 @@ def setup_db():
         return "❌ Database connection failed. Please start MySQL server."
     
     try:
-        cursor = connection.cursor()
-        
-        # Create user table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user (
-                ID VARCHAR(10) PRIMARY KEY,
-                F_name VARCHAR(50) NOT NULL,
-                L_name VARCHAR(50) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(100) NOT NULL,
-                address TEXT,
-                phone VARCHAR(20)
-            )
-        """)
-        
-        # Create customer table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS customer (
-                Customer_ID VARCHAR(10) PRIMARY KEY,
-                points INT DEFAULT 0,
-                FOREIGN KEY (Customer_ID) REFERENCES user(ID)
-            )
-        """)
-        
-        # Create admin table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin (
-                Admin_ID VARCHAR(10) PRIMARY KEY,
-                FOREIGN KEY (Admin_ID) REFERENCES user(ID)
-            )
-        """)
-        
-        # Create delivery man table (Updated to match deliveryman.py expectations)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS deliveryman (
-                DeliveryMan_ID VARCHAR(10) PRIMARY KEY,
-                Name VARCHAR(100),
-                Phone VARCHAR(20),
-                Email VARCHAR(100),
-                Area VARCHAR(100),
-                FOREIGN KEY (DeliveryMan_ID) REFERENCES user(ID)
-            )
-        """)
-        
-        # Create medicine table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS medicine (
-                Med_Code VARCHAR(10) PRIMARY KEY,
-                Name VARCHAR(100) NOT NULL,
-                Generic_name VARCHAR(100),
-                Category VARCHAR(50),
-                Price DECIMAL(10,2) NOT NULL,
-                Stock INT DEFAULT 0
-            )
-        """)
+        # Schema changes live in migrations.py; this only re-applies any pending ones
+        if run_migrations() is None:
+            return "❌ Error setting up database: migrations failed, see the server log."
         
-        # Create customer_review table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS customer_review (
-                Review_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                review TEXT,
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create customer_request table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS customer_request (
-                Request_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                request_med_name VARCHAR(100),
-                Expected_date DATE,
-                Status VARCHAR(20) DEFAULT 'Pending',
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create cart table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS cart (
-                Cart_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                Med_Code VARCHAR(10),
-                Med_Name VARCHAR(100),
-                Quantity INT DEFAULT 1,
-                Price DECIMAL(10,2),
-                total_price DECIMAL(10,2),
-                Added_Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
-                FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
-            )
-        """)
-        
-        # Create notifications table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                notification_id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id VARCHAR(10),
-                message TEXT NOT NULL,
-                type VARCHAR(50) DEFAULT 'general',
-                is_read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create points_history table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS points_history (
-                history_id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id VARCHAR(10),
-                points_earned INT NOT NULL,
-                transaction_type VARCHAR(20) DEFAULT 'earned',
-                payment_id VARCHAR(20),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create payment table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS payment (
-                payment_id VARCHAR(20) PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                amount DECIMAL(10,2),
-                payment_type VARCHAR(50),
-                DeliveryMan_ID VARCHAR(10),
-                status VARCHAR(50) DEFAULT 'Assigned',
-                delivery_date DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
-                FOREIGN KEY (DeliveryMan_ID) REFERENCES deliveryman(DeliveryMan_ID)
-            )
-        """)
+        cursor = connection.cursor()
         
         # Insert Test Data
         cursor.execute("""
@@ -296,6 +98,12 @@ def setup_db():
             INSERT IGNORE INTO customer (Customer_ID, points) 
             VALUES ('CM001', 100)
         """)
+        # Ledger entry for the seeded balance, so points reconcile
+        cursor.execute("""
+            INSERT INTO points_history (customer_id, points_earned, transaction_type, description)
+            SELECT 'CM001', 100, 'opening', 'Opening balance' FROM DUAL
+            WHERE NOT EXISTS (SELECT 1 FROM points_history WHERE customer_id = 'CM001')
+        """)
         
         cursor.execute("""
             INSERT IGNORE INTO user (ID, F_name, L_name, email, password, address, phone) 
@@ -332,6 +140,7 @@ def setup_db():
         connection.commit()
         cursor.close()
         connection.close()
+        invalidate_catalog()
         
         # --- RETURN THE NEW TEMPLATE ---
         return render_template('setup_success.html')
@@ -352,49 +161,36 @@ def login():
         if connection:
             cursor = connection.cursor(dictionary=True)
             
-            # Check user credentials
-            cursor.execute("SELECT * FROM user WHERE email = %s AND password = %s", (email, password))
-            user = cursor.fetchone()
+            # User and all of their roles in one query, then check the hash on the hashing pool
+            user = resolve_user(cursor, email)
+            
+            try:
+                matches, needs_rehash = check_password(password, user['password'] if user else None)
+            except HashingBusyError as e:
+                flash(str(e), 'error')
+                return render_template('login.html')
+            
+            if user and not matches:
+                user = None
+            
+            if user and needs_rehash:
+                # Upgrade plaintext or low-cost hashes transparently
+                try:
+                    cursor.execute("UPDATE user SET password = %s WHERE ID = %s",
+                                   (make_password(password), user['ID']))
+                    connection.commit()
+                except (Error, HashingBusyError) as e:
+                    connection.rollback()
+                    print(f"Error upgrading password hash: {e}")
             
             if user:
-                user_id = user['ID']
-                
                 # Check user type and redirect accordingly
-                if user_type == 'admin':
-                    cursor.execute("SELECT * FROM admin WHERE Admin_ID = %s", (user_id,))
-                    admin = cursor.fetchone()
-                    if admin:
-                        session['user_id'] = user_id
-                        session['user_type'] = 'admin'
-                        session['user_name'] = f"{user['F_name']} {user['L_name']}"
-                        flash('Admin login successful!', 'success')
-                        return redirect(url_for('admin.dashboard'))
-                    else:
-                        flash('Invalid admin credentials!', 'error')
-                
-                elif user_type == 'deliveryman':
-                    cursor.execute("SELECT * FROM deliveryman WHERE DeliveryMan_ID = %s", (user_id,))
-                    deliveryman = cursor.fetchone()
-                    if deliveryman:
-                        session['user_id'] = user_id
-                        session['user_type'] = 'deliveryman'
-                        session['user_name'] = f"{user['F_name']} {user['L_name']}"
-                        flash('Delivery man login successful!', 'success')
-                        return redirect(url_for('deliveryman.dashboard'))
-                    else:
-                        flash('Invalid delivery man credentials!', 'error')
-                
-                elif user_type == 'customer':
-                    cursor.execute("SELECT * FROM customer WHERE Customer_ID = %s", (user_id,))
-                    customer = cursor.fetchone()
-                    if customer:
-                        session['user_id'] = user_id
-                        session['user_type'] = 'customer'
-                        session['user_name'] = f"{user['F_name']} {user['L_name']}"
-                        flash('Customer login successful!', 'success')
-                        return redirect(url_for('customer.dashboard'))
-                    else:
-                        flash('Invalid customer credentials!', 'error')
+                if user_type in user['roles']:
+                    start_session(user, user_type)
+                    flash(f'{ROLES[user_type][1]} login successful!', 'success')
+                    return redirect(url_for(home_endpoint(user_type)))
+                elif user_type in ROLES:
+                    flash(f'Invalid {ROLES[user_type][1].lower()} credentials!', 'error')
             else:
                 flash('Invalid email or password!', 'error')
             
@@ -426,15 +222,15 @@ def signup():
             if existing_user:
                 flash('Email already exists!', 'error')
             else:
-                # Generate new customer ID
-                customer_id = generate_customer_id()
-                
                 try:
+                    # Allocate new customer ID from this worker's reserved block
+                    customer_id = next_customer_id()
+                    
                     # Insert into user table
                     cursor.execute("""
                         INSERT INTO user (ID, F_name, L_name, email, password, address, phone) 
                         VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (customer_id, f_name, l_name, email, password, address, phone))
+                    """, (customer_id, f_name, l_name, email, make_password(password), address, phone))
                     
                     # Insert into customer table
                     cursor.execute("INSERT INTO customer (Customer_ID, points) VALUES (%s, 0)", (customer_id,))
@@ -443,7 +239,7 @@ def signup():
                     flash('Account created successfully! Please login.', 'success')
                     return redirect(url_for('login'))
                     
-                except Error as e:
+                except (Error, HashingBusyError) as e:
                     connection.rollback()
                     flash(f'Error creating account: {e}', 'error')
             
@@ -452,6 +248,20 @@ def signup():
     
     return render_template('signup.html')
 
+@app.route('/switch_role/<role>')
+def switch_role(role):
+    """Switch between roles held by the same account, using the roles cached at login"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    if role not in ROLES or not has_role(role):
+        flash('Your account does not have that role!', 'error')
+        return redirect(url_for(home_endpoint(session['user_type'])))
+    
+    session['user_type'] = role
+    flash(f'Switched to {ROLES[role][1].lower()} view', 'success')
+    return redirect(url_for(home_endpoint(role)))
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -565,36 +375,6 @@ def test_payment():
     except Exception as e:
         import traceback
         return f"<h1>Template Error</h1><p>{str(e)}</p><pre>{traceback.format_exc()}</pre>"
-@app.route('/force_fix_cart')
-def force_fix_cart():
-    connection = get_db_connection()
-    if not connection: return "❌ DB Connection Failed"
-    try:
-        cursor = connection.cursor()
-        # 1. Drop the bad table completely
-        cursor.execute("DROP TABLE IF EXISTS cart")
-        
-        # 2. Recreate it with the missing 'total_price' column
-        cursor.execute("""
-            CREATE TABLE cart (
-                Cart_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                Med_Code VARCHAR(10),
-                Med_Name VARCHAR(100),
-                Quantity INT DEFAULT 1,
-                Price DECIMAL(10,2),
-                total_price DECIMAL(10,2),
-                Added_Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
-                FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
-            )
-        """)
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return "<h1>✅ FIX APPLIED!</h1><p>The cart table has been reset. You can now go back to the dashboard.</p>"
-    except Exception as e:
-        return f"<h1>Error:</h1> {str(e)}"
 
 if __name__ == '__main__':
     app.run(debug=True)
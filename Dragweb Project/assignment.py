@@ -0,0 +1,319 @@
+"""Automatic delivery assignment.
+
+Unassigned payments (new orders, and orders a courier declined) are taken in
+batches, oldest first. Each is matched to a delivery man whose Area appears
+in the customer's address, and within an area goes to the courier with the
+fewest active deliveries (Assigned or Accepted for Delivery), counting the
+ones handed out earlier in the same batch. Payments whose address names no
+served area stay unassigned for an admin, unless any_area is set, in which
+case they go to the least-loaded courier overall.
+
+A batch is one transaction: the payment rows are locked, updated with one
+UPDATE per courier, and the customers are notified with
+notifications.notify_many(); the notifications are pushed to open streams
+after the commit. A run walks the whole queue in batches, keyed on
+(created_at, payment_id), so unmatched payments at its head never hold up
+the rest. A MySQL named lock keeps concurrent runs (every worker runs the
+scheduler, and admins can trigger a run) from racing.
+
+The app runs the engine every ASSIGN_INTERVAL seconds. To run it by hand:
+
+    python assignment.py [--limit N] [--any-area] [--dry-run]
+"""
+import argparse
+import heapq
+import os
+import re
+import sys
+import time
+import uuid
+
+from mysql.connector import Error
+
+from db import get_pool, init_db
+from events import publish_notifications
+from notifications import notify_many
+from scheduler import IntervalJob
+
+# New orders are inserted as 'Assigned' with no courier; declined ones become 'Pending Assignment'
+PENDING_STATUSES = ['Assigned', 'Pending Assignment']
+ACTIVE_STATUSES = ['Assigned', 'Accepted for Delivery']
+
+ASSIGN_BATCH_SIZE = int(os.environ.get('DRUGWEB_ASSIGN_BATCH_SIZE', 5000))
+ASSIGN_INTERVAL = int(os.environ.get('DRUGWEB_ASSIGN_INTERVAL', 60))
+ASSIGN_ANY_AREA = os.environ.get('DRUGWEB_ASSIGN_ANY_AREA', '0') == '1'
+AUTO_ASSIGN_ENABLED = os.environ.get('DRUGWEB_AUTO_ASSIGN', '1') != '0'
+
+LOCK_NAME = 'drugweb_assignment'
+
+# IDs per IN (...) list when reading addresses and updating payments
+CHUNK_SIZE = 1000
+
+
+class AssignmentInProgress(Exception):
+    """Raised when another run holds the assignment lock"""
+    partial = None
+
+
+def area_key(area):
+    return area.strip().lower() if area else None
+
+
+class AreaMatcher:
+    """Finds the served area named in a free-text address (the last one mentioned wins)"""
+
+    def __init__(self, areas):
+        names = sorted(areas, key=len, reverse=True)
+        self.pattern = re.compile(r'\b(' + '|'.join(map(re.escape, names)) + r')\b', re.IGNORECASE) if names else None
+        self._cache = {}
+
+    def match(self, address):
+        """The area_key() of the matched area, or None"""
+        if not self.pattern or not address:
+            return None
+        if address not in self._cache:
+            found = self.pattern.findall(address)
+            self._cache[address] = found[-1].lower() if found else None
+        return self._cache[address]
+
+
+def plan_assignments(payments, couriers, any_area=False):
+    """Choose a courier for each payment.
+
+    payments: (payment_id, customer_id, address) tuples, in the order to serve them.
+    couriers: (deliveryman_id, area, active_count) tuples.
+    Returns (assignments, unmatched): assignments are (payment_id, customer_id,
+    deliveryman_id) tuples, unmatched the payment IDs left for an admin.
+    """
+    # One min-heap of (load, deliveryman_id) per area, plus one over everybody
+    heaps = {}
+    everyone = []
+    for deliveryman_id, area, active in couriers:
+        if area_key(area):
+            heaps.setdefault(area_key(area), []).append([active, deliveryman_id])
+        everyone.append([active, deliveryman_id])
+    for heap in heaps.values():
+        heapq.heapify(heap)
+    heapq.heapify(everyone)
+    loads = {deliveryman_id: active for deliveryman_id, _, active in couriers}
+    matcher = AreaMatcher(heaps)
+
+    def least_loaded(heap):
+        # Entries go stale when the courier was picked from the other heap; refresh lazily
+        while heap[0][0] != loads[heap[0][1]]:
+            heapq.heapreplace(heap, [loads[heap[0][1]], heap[0][1]])
+        deliveryman_id = heap[0][1]
+        loads[deliveryman_id] += 1
+        heapq.heapreplace(heap, [loads[deliveryman_id], deliveryman_id])
+        return deliveryman_id
+
+    assignments = []
+    unmatched = []
+    for payment_id, customer_id, address in payments:
+        area = matcher.match(address)
+        if area:
+            assignments.append((payment_id, customer_id, least_loaded(heaps[area])))
+        elif any_area and everyone:
+            assignments.append((payment_id, customer_id, least_loaded(everyone)))
+        else:
+            unmatched.append(payment_id)
+    return assignments, unmatched
+
+
+# Every courier with its active deliveries. It reads the whole deliveryman
+# table on purpose; the correlated count ranges over
+# idx_payment_deliveryman_status_created, so delivered history is never read.
+COURIERS_QUERY = f"""
+    SELECT d.DeliveryMan_ID, d.Area,
+           (SELECT COUNT(*) FROM payment p
+            WHERE p.DeliveryMan_ID = d.DeliveryMan_ID AND p.status IN ({', '.join(['%s'] * len(ACTIVE_STATUSES))})) AS active
+    FROM deliveryman d
+"""
+
+
+def pending_query(limit, after=None):
+    """(sql, params) locking the next batch of unassigned payments, oldest first"""
+    conditions = ["DeliveryMan_ID IS NULL", f"status IN ({', '.join(['%s'] * len(PENDING_STATUSES))})"]
+    params = list(PENDING_STATUSES)
+    if after:
+        conditions.append("(created_at > %s OR (created_at = %s AND payment_id > %s))")
+        params += [after[0], after[0], after[1]]
+    return f"""
+        SELECT payment_id, Customer_ID, created_at FROM payment
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at, payment_id
+        LIMIT %s
+        FOR UPDATE
+    """, params + [limit]
+
+
+def addresses_query(customer_ids):
+    return f"SELECT ID, address FROM user WHERE ID IN ({', '.join(['%s'] * len(customer_ids))})", list(customer_ids)
+
+
+def _locked_pending(cursor, limit, after):
+    """Lock up to `limit` unassigned payments after the `after` key, oldest first.
+
+    Returns (payments, last) where payments are (payment_id, customer_id,
+    address) tuples and last is the (created_at, payment_id) of the last row.
+    """
+    cursor.execute(*pending_query(limit, after))
+    pending = cursor.fetchall()
+    last = (pending[-1]['created_at'], pending[-1]['payment_id']) if pending else None
+
+    customer_ids = sorted({row['Customer_ID'] for row in pending})
+    addresses = {}
+    for start in range(0, len(customer_ids), CHUNK_SIZE):
+        chunk = customer_ids[start:start + CHUNK_SIZE]
+        cursor.execute(*addresses_query(chunk))
+        addresses.update((row['ID'], row['address']) for row in cursor.fetchall())
+    return [(row['payment_id'], row['Customer_ID'], addresses.get(row['Customer_ID'])) for row in pending], last
+
+
+def _couriers(cursor):
+    """(deliveryman_id, area, active deliveries) for every courier"""
+    cursor.execute(COURIERS_QUERY, ACTIVE_STATUSES)
+    return [(row['DeliveryMan_ID'], row['Area'], row['active']) for row in cursor.fetchall()]
+
+
+def assign_pending(connection, limit=ASSIGN_BATCH_SIZE, any_area=ASSIGN_ANY_AREA, dry_run=False, after=None):
+    """Assign one batch of unassigned payments in a single transaction.
+
+    Returns a summary dict whose 'next' is the key to pass as `after` for the
+    following batch, or None once the queue is exhausted. Raises
+    AssignmentInProgress if another run holds the lock, and mysql.connector
+    errors after rolling back.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (LOCK_NAME,))
+        if cursor.fetchone()['locked'] != 1:
+            raise AssignmentInProgress("Another assignment run is in progress")
+        try:
+            if not connection.in_transaction:
+                connection.start_transaction()
+            started = time.perf_counter()
+            pending, last = _locked_pending(cursor, limit, after)
+            couriers = _couriers(cursor)
+            assignments, unmatched = plan_assignments(pending, couriers, any_area)
+
+            events = []
+            if assignments and not dry_run:
+                by_courier = {}
+                for payment_id, _, deliveryman_id in assignments:
+                    by_courier.setdefault(deliveryman_id, []).append(payment_id)
+                for deliveryman_id, payment_ids in by_courier.items():
+                    for start in range(0, len(payment_ids), CHUNK_SIZE):
+                        chunk = payment_ids[start:start + CHUNK_SIZE]
+                        cursor.execute(f"""
+                            UPDATE payment SET DeliveryMan_ID = %s, status = 'Assigned'
+                            WHERE payment_id IN ({', '.join(['%s'] * len(chunk))})
+                        """, [deliveryman_id] + chunk)
+                events = notify_many(cursor, [
+                    (customer_id,
+                     f"Your order (Payment #{payment_id}) has been assigned to a delivery partner.",
+                     'delivery_assigned')
+                    for payment_id, customer_id, _ in assignments
+                ], f"assign:{uuid.uuid4().hex}")
+
+            if dry_run:
+                connection.rollback()
+            else:
+                connection.commit()
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    publish_notifications(events)
+    return {
+        'pending': len(pending),
+        'assigned': 0 if dry_run else len(assignments),
+        'planned': len(assignments),
+        'unmatched': len(unmatched),
+        'couriers': len(couriers),
+        'seconds': round(time.perf_counter() - started, 3),
+        'next': last if len(pending) == limit else None
+    }
+
+
+def assign_all(connection, limit=ASSIGN_BATCH_SIZE, any_area=ASSIGN_ANY_AREA, dry_run=False):
+    """Walk the whole unassigned queue in batches. Returns the summed summary.
+
+    Each batch commits on its own, so if one fails the summary of the batches
+    already committed is attached to the exception as `partial`.
+    """
+    total = {'pending': 0, 'assigned': 0, 'planned': 0, 'unmatched': 0, 'couriers': 0, 'seconds': 0.0,
+             'batches': 0}
+    after = None
+    try:
+        while True:
+            result = assign_pending(connection, limit, any_area, dry_run, after)
+            for key in ('pending', 'assigned', 'planned', 'unmatched', 'seconds'):
+                total[key] += result[key]
+            total['couriers'] = result['couriers']
+            total['batches'] += 1
+            after = result['next']
+            if after is None:
+                total['seconds'] = round(total['seconds'], 3)
+                return total
+    except (AssignmentInProgress, Error) as e:
+        total['seconds'] = round(total['seconds'], 3)
+        e.partial = total
+        raise
+
+
+def run_assignment(limit=ASSIGN_BATCH_SIZE, any_area=ASSIGN_ANY_AREA, dry_run=False):
+    """Run the whole queue on a pooled connection. Returns the summary, or None on error or when busy."""
+    pool = get_pool()
+    try:
+        connection = pool.acquire()
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+    try:
+        return assign_all(connection, limit, any_area, dry_run)
+    except AssignmentInProgress as e:
+        if e.partial['assigned']:
+            print(f"Assignment stopped after {e.partial['assigned']} order(s): {e}")
+        return None
+    except Error as e:
+        print(f"Error assigning deliveries after {e.partial['assigned']} order(s): {e}")
+        return None
+    finally:
+        pool.release(connection)
+
+
+scheduler = IntervalJob('assignment', run_assignment, ASSIGN_INTERVAL)
+
+
+def start_scheduler():
+    """Start the periodic assignment job unless DRUGWEB_AUTO_ASSIGN=0"""
+    if AUTO_ASSIGN_ENABLED:
+        scheduler.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign unassigned payments to delivery men by area and workload')
+    parser.add_argument('--limit', type=int, default=ASSIGN_BATCH_SIZE, help='payments per batch')
+    parser.add_argument('--any-area', action='store_true', default=ASSIGN_ANY_AREA,
+                        help='give payments with no matching area to the least-loaded courier')
+    parser.add_argument('--dry-run', action='store_true', help='plan each batch, then roll it back')
+    args = parser.parse_args()
+
+    if not init_db():
+        sys.exit(1)
+    result = run_assignment(args.limit, args.any_area, args.dry_run)
+    if result is None:
+        sys.exit(1)
+    print(f"{result['assigned']:,} assigned ({result['planned']:,} planned), {result['unmatched']:,} unmatched "
+          f"of {result['pending']:,} pending across {result['couriers']:,} couriers "
+          f"in {result['batches']} batch(es), {result['seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
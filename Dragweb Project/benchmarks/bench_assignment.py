@@ -0,0 +1,139 @@
+"""Benchmark the assignment engine: 50k pending orders across 500 couriers.
+
+Usage (from the "Dragweb Project" directory, MySQL running):
+
+    python benchmarks/bench_assignment.py                       # 50k pending, 500 couriers
+    python benchmarks/bench_assignment.py --pending 10000 --rounds 5
+    python benchmarks/bench_assignment.py --reuse --batch-size 5000
+
+Runs against its own database (--database, default drugweb_bench), created
+and migrated first. generate_data.py seeds customers, --deliverymen couriers
+spread over its eight areas, and --history older payments that give the
+couriers a skewed active workload to balance against. The newest --pending
+payments are then turned back into 'Pending Assignment' before every round.
+
+Each round times one assignment run (assignment.assign_all) with
+--batch-size payments per transaction (default: all of them in one), and
+the in-memory planning step on its own, so the difference is the time spent
+in MySQL. The notifications the runs write are deleted at the end.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='drugweb_bench')
+    parser.add_argument('--pending', type=int, default=50000)
+    parser.add_argument('--deliverymen', type=int, default=500)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--history', type=int, default=100000, help='payments already assigned')
+    parser.add_argument('--batch-size', type=int, default=0, help='payments per transaction (0: all)')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--reuse', action='store_true', help='keep generated rows if the payment count matches')
+    parser.add_argument('--load-data', action='store_true', help='seed with LOAD DATA LOCAL INFILE')
+    args = parser.parse_args()
+
+    # Point db.py at the scratch database before anything imports it
+    os.environ['DRUGWEB_DB_NAME'] = args.database
+    import mysql.connector
+    import generate_data
+    from db import DB_CONFIG, init_db
+    from migrations import run_migrations
+    from assignment import assign_all, plan_assignments, _locked_pending, _couriers
+
+    if not init_db() or run_migrations() is None:
+        sys.exit(1)
+    connection = mysql.connector.connect(**DB_CONFIG, allow_local_infile=args.load_data)
+    cursor = connection.cursor(dictionary=True)
+
+    total = args.history + args.pending
+    cursor.execute("SELECT COUNT(*) AS n FROM payment WHERE payment_id LIKE 'GP%'")
+    existing = cursor.fetchone()['n']
+    connection.commit()
+    if not (args.reuse and existing == total):
+        print(f"Seeding {total:,} payments, {args.customers:,} customers, {args.deliverymen:,} couriers "
+              f"into {args.database}...")
+        started = time.perf_counter()
+        generate_data.reset(connection)
+        seed = argparse.Namespace(customers=args.customers, deliverymen=args.deliverymen, admins=0,
+                                  medicines=2000, cart_lines=0, payments=total, notifications=0, requests=0,
+                                  reviews=0, history_days=90, skew=1.0, seed=42)
+        sink_class = generate_data.LoadDataSink if args.load_data else generate_data.InsertSink
+        generate_data.Generator(sink_class(connection, 1000), seed).run()
+        generate_data.finish(connection)
+        print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    # Only the chosen newest payments are pending; older unassigned ones count as done
+    cursor.execute("UPDATE payment SET status = 'Delivered' WHERE DeliveryMan_ID IS NULL AND payment_id LIKE 'GP%'")
+    cursor.execute("""
+        SELECT payment_id FROM payment WHERE payment_id LIKE 'GP%'
+        ORDER BY created_at DESC, payment_id DESC LIMIT %s
+    """, (args.pending,))
+    pending_ids = [row['payment_id'] for row in cursor.fetchall()]
+    connection.commit()
+
+    def reset_pending():
+        for start in range(0, len(pending_ids), 1000):
+            chunk = pending_ids[start:start + 1000]
+            cursor.execute(f"""
+                UPDATE payment SET DeliveryMan_ID = NULL, status = 'Pending Assignment'
+                WHERE payment_id IN ({', '.join(['%s'] * len(chunk))})
+            """, chunk)
+        connection.commit()
+
+    limit = args.batch_size or len(pending_ids)
+    runs = []
+    plans = []
+    loads = Counter()
+    for round_number in range(1, args.rounds + 1):
+        reset_pending()
+
+        # Planning alone, on the same rows the run is about to read
+        pending, _ = _locked_pending(cursor, limit, None)
+        couriers = _couriers(cursor)
+        connection.rollback()
+        started = time.perf_counter()
+        plan_assignments(pending, couriers)
+        plans.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        result = assign_all(connection, limit)
+        runs.append(time.perf_counter() - started)
+        print(f"  round {round_number}: {result['assigned']:,} assigned, {result['unmatched']:,} unmatched "
+              f"in {result['batches']} batch(es), {runs[-1]:.2f}s")
+
+    for start in range(0, len(pending_ids), 1000):
+        chunk = pending_ids[start:start + 1000]
+        cursor.execute(f"""
+            SELECT DeliveryMan_ID, COUNT(*) AS n FROM payment
+            WHERE payment_id IN ({', '.join(['%s'] * len(chunk))}) GROUP BY DeliveryMan_ID
+        """, chunk)
+        loads.update({row['DeliveryMan_ID']: row['n'] for row in cursor.fetchall()})
+    connection.commit()
+
+    generate_data.delete_in_batches(cursor, connection, "DELETE FROM notifications WHERE dedupe_key LIKE 'assign:%'")
+    cursor.close()
+    connection.close()
+
+    assigned = sum(n for courier, n in loads.items() if courier)
+    best = min(runs)
+    print(f"\n{len(pending_ids):,} pending payments, {len(couriers):,} couriers, "
+          f"{limit:,} payments per transaction")
+    print(f"{'step':<28}{'best s':>10}{'worst s':>10}{'payments/s':>14}")
+    print(f"{'plan (in memory)':<28}{min(plans):>10.3f}{max(plans):>10.3f}{len(pending_ids) / max(min(plans), 1e-9):>14,.0f}")
+    print(f"{'full run (commit included)':<28}{best:>10.3f}{max(runs):>10.3f}{len(pending_ids) / max(best, 1e-9):>14,.0f}")
+    if assigned:
+        per_courier = [n for courier, n in loads.items() if courier]
+        print(f"last round: {assigned:,} assigned to {len(per_courier)} couriers, "
+              f"{min(per_courier)}-{max(per_courier)} each")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark password verification throughput (logins/sec) at different work factors.
+
+Usage (from the "Dragweb Project" directory, no database needed):
+
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --iterations 100000 310000 600000 --clients 32 --seconds 5
+
+For each PBKDF2 iteration count, --clients threads act as concurrent
+login requests and verify a password through passwords.check_password(),
+which runs the KDF on the bounded hashing pool. A separate thread keeps
+timing a trivial "other request" so you can see whether hashing stalls
+unrelated work. Reports logins/sec, login p50/p95 and the other-request p95.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import passwords  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(iterations, clients, seconds):
+    passwords.PASSWORD_ITERATIONS = iterations
+    stored = passwords.hash_password('correct horse', iterations)
+    deadline = time.perf_counter() + seconds
+    login_times = []
+    other_times = []
+
+    def login_client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            matches, _ = passwords.check_password('correct horse', stored)
+            assert matches
+            login_times.append(time.perf_counter() - started)
+
+    def other_requests():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            sum(range(2000))  # stand-in for a cheap page render
+            other_times.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=login_client) for _ in range(clients)]
+    threads.append(threading.Thread(target=other_requests))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return (len(login_times) / elapsed, percentile(login_times, 0.5), percentile(login_times, 0.95),
+            percentile(other_times, 0.95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100_000, 310_000, 600_000])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"hashing workers={passwords.kdf_pool.workers} clients={args.clients}")
+    print(f"{'iterations':>11}{'logins/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'other p95 ms':>14}")
+    for iterations in args.iterations:
+        rate, p50, p95, other_p95 = run(iterations, args.clients, args.seconds)
+        print(f"{iterations:>11,}{rate:>11.1f}{p50 * 1000:>9.1f}{p95 * 1000:>9.1f}{other_p95 * 1000:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
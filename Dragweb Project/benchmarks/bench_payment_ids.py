@@ -0,0 +1,101 @@
+"""Benchmark payment inserts with random vs time-ordered primary keys.
+
+Usage (from the "Dragweb Project" directory, MySQL running):
+
+    python benchmarks/bench_payment_ids.py --rows 200000 --batch 500
+
+Each run inserts into a scratch copy of the payment table (`bench_payment`,
+same columns and indexes, no foreign keys), committing every --batch rows,
+and reports rows/sec. Random keys ('PAY' + 8 random digits, the old scheme
+widened to avoid duplicates) scatter writes across the clustered index;
+ordered keys from ids.SnowflakeIdGenerator always append. The gap grows once
+the table no longer fits in the InnoDB buffer pool.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mysql.connector import connect, IntegrityError  # noqa: E402
+
+from db import DB_CONFIG  # noqa: E402
+from ids import RandomIdGenerator, SnowflakeIdGenerator  # noqa: E402
+
+
+def generation_rate(generator, count=200_000):
+    started = time.perf_counter()
+    for _ in range(count):
+        generator()
+    return count / (time.perf_counter() - started)
+
+
+def insert_rate(cursor, connection, generator, rows, batch):
+    cursor.execute("DROP TABLE IF EXISTS bench_payment")
+    cursor.execute("CREATE TABLE bench_payment LIKE payment")
+    connection.commit()
+
+    inserted = duplicates = 0
+    started = time.perf_counter()
+    while inserted < rows:
+        chunk = [(generator(), 'CM001', round(random.uniform(5, 500), 2), 'Cash on Delivery')
+                 for _ in range(min(batch, rows - inserted))]
+        try:
+            cursor.executemany("""
+                INSERT INTO bench_payment (payment_id, Customer_ID, amount, payment_type)
+                VALUES (%s, %s, %s, %s)
+            """, chunk)
+        except IntegrityError:
+            # Random keys collide; retry the batch row by row and skip duplicates
+            connection.rollback()
+            for row in chunk:
+                try:
+                    cursor.execute("""
+                        INSERT INTO bench_payment (payment_id, Customer_ID, amount, payment_type)
+                        VALUES (%s, %s, %s, %s)
+                    """, row)
+                except IntegrityError:
+                    duplicates += 1
+        connection.commit()
+        inserted += len(chunk)
+    elapsed = time.perf_counter() - started
+
+    cursor.execute("""
+        SELECT data_length, index_length FROM information_schema.TABLES
+        WHERE table_schema = DATABASE() AND table_name = 'bench_payment'
+    """)
+    data_length, index_length = cursor.fetchone()
+    cursor.execute("DROP TABLE IF EXISTS bench_payment")
+    connection.commit()
+    return rows / elapsed, duplicates, data_length + index_length
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    generators = {
+        'random': RandomIdGenerator('PAY', digits=8),
+        'ordered': SnowflakeIdGenerator('PAY')
+    }
+
+    print("ID generation (in process):")
+    for name, generator in generators.items():
+        print(f"  {name:<8} {generation_rate(generator):>12,.0f} ids/s")
+
+    connection = connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    print(f"\nInserts into bench_payment ({args.rows:,} rows, commit every {args.batch}):")
+    for name, generator in generators.items():
+        rate, duplicates, size = insert_rate(cursor, connection, generator, args.rows, args.batch)
+        print(f"  {name:<8} {rate:>12,.0f} rows/s  duplicates={duplicates:<6} table+index size={size / 1048576:,.1f} MiB")
+    cursor.close()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark the reviews feed at 1M reviews: old full read vs keyset pages and the cached first page.
+
+Usage (from the "Dragweb Project" directory, MySQL running):
+
+    python benchmarks/bench_reviews.py                      # 1M reviews in drugweb_bench
+    python benchmarks/bench_reviews.py --reviews 100000 --repeat 100
+    python benchmarks/bench_reviews.py --database drugweb_bench --reuse
+
+Runs against its own database (--database, default drugweb_bench), which is
+created and migrated first, so the real tables and indexes are measured
+without touching the app's data. Reviews come from generate_data.py, spread
+over --customers reviewers (--reuse keeps them between runs when the count
+matches).
+
+Times, with p50/p95 over --repeat runs:
+
+  * the old GET: every review joined to user, ORDER BY Customer_ID DESC
+    (run --old-repeat times, it reads the whole table),
+  * the first page read from MySQL (cache miss),
+  * the first page from ReviewFeedCache (cache hit),
+  * a deep keyset page (before= a random Review_ID),
+  * a POST: insert + commit + invalidate, with no re-read.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return times, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='drugweb_bench')
+    parser.add_argument('--reviews', type=int, default=1000000)
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--old-repeat', type=int, default=3)
+    parser.add_argument('--reuse', action='store_true', help='keep generated rows if the review count matches')
+    parser.add_argument('--load-data', action='store_true', help='seed with LOAD DATA LOCAL INFILE')
+    args = parser.parse_args()
+
+    # Point db.py at the scratch database before anything imports it
+    os.environ['DRUGWEB_DB_NAME'] = args.database
+    import mysql.connector
+    import generate_data
+    from db import DB_CONFIG, init_db
+    from migrations import run_migrations
+    from reviews import fetch_page, add_review, ReviewFeedCache
+
+    if not init_db() or run_migrations() is None:
+        sys.exit(1)
+    connection = mysql.connector.connect(**DB_CONFIG, allow_local_infile=args.load_data)
+    cursor = connection.cursor(dictionary=True)
+
+    cursor.execute("SELECT COUNT(*) AS n FROM customer_review WHERE Customer_ID LIKE 'GC%'")
+    existing = cursor.fetchone()['n']
+    connection.commit()
+    if not (args.reuse and existing == args.reviews):
+        print(f"Seeding {args.reviews:,} reviews from {args.customers:,} customers into {args.database}...")
+        started = time.perf_counter()
+        generate_data.reset(connection)
+        seed = argparse.Namespace(customers=args.customers, deliverymen=0, admins=0, medicines=0, cart_lines=0,
+                                  payments=0, notifications=0, requests=0, reviews=args.reviews,
+                                  history_days=90, skew=1.0, seed=42)
+        sink_class = generate_data.LoadDataSink if args.load_data else generate_data.InsertSink
+        generate_data.Generator(sink_class(connection, 1000), seed).run()
+        print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    cursor.execute("SELECT MIN(Review_ID) AS lo, MAX(Review_ID) AS hi FROM customer_review")
+    bounds = cursor.fetchone()
+    connection.commit()
+    rng = random.Random(7)
+    cache = ReviewFeedCache(ttl=3600)
+
+    def old_get():
+        cursor.execute("""
+            SELECT cr.review, u.F_name, u.L_name, cr.Customer_ID
+            FROM customer_review cr
+            JOIN user u ON cr.Customer_ID = u.ID
+            ORDER BY cr.Customer_ID DESC
+        """)
+        return cursor.fetchall()
+
+    def first_page_miss():
+        cache.invalidate()
+        return cache.first_page(cursor)[0]
+
+    def deep_page():
+        return fetch_page(cursor, rng.randint(bounds['lo'], bounds['hi']))[0]
+
+    inserted = []
+
+    def post_review():
+        inserted.append(add_review(cursor, generate_data.customer_id(1), 'Benchmark review'))
+        connection.commit()
+        cache.invalidate()
+
+    cache.first_page(cursor)
+    results = [
+        ('old GET (all rows, ORDER BY Customer_ID)', timed(old_get, args.old_repeat)),
+        ('first page, MySQL (cache miss)', timed(first_page_miss, args.repeat)),
+        ('first page, cached', timed(lambda: cache.first_page(cursor)[0], args.repeat)),
+        ('deep keyset page', timed(deep_page, args.repeat)),
+        ('POST: insert + invalidate', timed(post_review, args.repeat))
+    ]
+
+    # Remove the benchmark's own inserts
+    if inserted:
+        placeholders = ', '.join(['%s'] * len(inserted))
+        cursor.execute(f"DELETE FROM customer_review WHERE Review_ID IN ({placeholders})", inserted)
+        connection.commit()
+    cursor.close()
+    connection.close()
+
+    print(f"\n{args.reviews:,} reviews")
+    print(f"{'operation':<44}{'rows':>10}{'p50 ms':>12}{'p95 ms':>12}")
+    for name, (times, rows) in results:
+        count = len(rows) if isinstance(rows, list) else '-'
+        print(f"{name:<44}{count:>10}{percentile(times, 0.5) * 1000:>12.3f}{percentile(times, 0.95) * 1000:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark the medicine search index against the old LIKE '%term%' path.
+
+Usage (from the "Dragweb Project" directory):
+
+    python benchmarks/bench_search.py                 # 10k, 100k and 1M rows
+    python benchmarks/bench_search.py --sizes 10000   # one size only
+    python benchmarks/bench_search.py --mysql         # also time real LIKE queries
+
+Without --mysql the LIKE path is timed as an in-process full scan with the
+same substring semantics, which is a lower bound for what MySQL does with a
+leading wildcard. With --mysql the rows are loaded into a scratch
+`bench_medicine` table in the configured database and the original queries
+are run against it.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import MedicineSearchIndex  # noqa: E402
+
+STEMS = ['para', 'amox', 'omep', 'ceti', 'metfor', 'ator', 'losar', 'azith', 'ibupro', 'napro',
+         'cipro', 'doxy', 'predni', 'salbu', 'monte', 'panto', 'rani', 'levo', 'clopi', 'aml']
+SUFFIXES = ['cetamol', 'icillin', 'razole', 'rizine', 'min', 'vastatin', 'tan', 'romycin', 'fen', 'xen',
+            'floxacin', 'cycline', 'solone', 'tamol', 'lukast', 'prazole', 'tidine', 'thyroxine', 'dogrel', 'odipine']
+BRANDS = ['Napa', 'Seclo', 'Ace', 'Fexo', 'Maxpro', 'Tufnil', 'Monas', 'Losectil', 'Zimax', 'Rolac']
+CATEGORIES = ['Pain Relief', 'Antibiotic', 'Gastric', 'Allergy', 'Diabetes', 'Cardiac', 'Respiratory', 'General']
+QUERIES = ['napa', 'amoxicillin', 'amoxicilin', 'gastric', 'para', 'seclo 20', 'zz-no-match']
+SORTS = ['name', 'price', 'price_desc']
+
+
+def make_rows(count, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        generic = rng.choice(STEMS) + rng.choice(SUFFIXES)
+        name = f"{rng.choice(BRANDS)} {generic.capitalize()} {rng.choice([5, 10, 20, 40, 250, 500])}"
+        rows.append((f"MED{i:07d}", name, generic.capitalize(), rng.choice(CATEGORIES),
+                     round(rng.uniform(1, 500), 2), rng.randint(0, 300)))
+    return rows
+
+
+def like_scan(rows, term, sort_by, limit=12):
+    """Emulate Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s + ORDER BY + LIMIT"""
+    term = term.lower()
+    matches = [r for r in rows
+               if term in r[1].lower() or term in (r[2] or '').lower() or term in (r[3] or '').lower()]
+    if sort_by == 'price':
+        matches.sort(key=lambda r: r[4])
+    elif sort_by == 'price_desc':
+        matches.sort(key=lambda r: r[4], reverse=True)
+    else:
+        matches.sort(key=lambda r: r[1])
+    return matches[:limit], len(matches)
+
+
+def time_it(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def mysql_like(rows):
+    from mysql.connector import connect
+    from db import DB_CONFIG
+
+    connection = connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS bench_medicine")
+    cursor.execute("CREATE TABLE bench_medicine LIKE medicine")
+    for start in range(0, len(rows), 5000):
+        cursor.executemany("""
+            INSERT INTO bench_medicine (Med_Code, Name, Generic_name, Category, Price, Stock)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, rows[start:start + 5000])
+    connection.commit()
+
+    def run(term, sort_by):
+        order = {'price': 'Price ASC', 'price_desc': 'Price DESC'}.get(sort_by, 'Name ASC')
+        params = [f'%{term}%'] * 3
+        cursor.execute("""
+            SELECT COUNT(*) FROM bench_medicine
+            WHERE Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s
+        """, params)
+        cursor.fetchall()
+        cursor.execute(f"""
+            SELECT * FROM bench_medicine
+            WHERE Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s
+            ORDER BY {order} LIMIT 12
+        """, params)
+        cursor.fetchall()
+
+    def cleanup():
+        cursor.execute("DROP TABLE IF EXISTS bench_medicine")
+        cursor.close()
+        connection.close()
+
+    return run, cleanup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mysql', action='store_true', help='also time LIKE queries on a real MySQL table')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rows = make_rows(size)
+        index = MedicineSearchIndex()
+        started = time.perf_counter()
+        index.build(rows)
+        build_ms = (time.perf_counter() - started) * 1000
+        print(f"\n== {size:,} rows (index build {build_ms:,.0f} ms) ==")
+
+        run_mysql = cleanup = None
+        if args.mysql:
+            run_mysql, cleanup = mysql_like(rows)
+
+        header = f"{'query':<14}{'sort':<12}{'hits':>9}{'index ms':>11}{'scan ms':>10}"
+        print(header + (f"{'mysql ms':>11}" if run_mysql else ''))
+        for query in QUERIES:
+            for sort_by in SORTS:
+                _, hits = index.search(query, sort_by=sort_by, limit=12)
+                index_ms = time_it(lambda: index.search(query, sort_by=sort_by, limit=12), args.repeat)
+                scan_ms = time_it(lambda: like_scan(rows, query, sort_by), max(1, args.repeat // 2))
+                line = f"{query:<14}{sort_by:<12}{hits:>9,}{index_ms:>11.2f}{scan_ms:>10.2f}"
+                if run_mysql:
+                    line += f"{time_it(lambda: run_mysql(query, sort_by), max(1, args.repeat // 2)):>11.2f}"
+                print(line)
+
+        if cleanup:
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""Load-test DrugWeb over HTTP with a realistic mix of customer, admin and courier traffic.
+
+Usage (from the "Dragweb Project" directory, MySQL running):
+
+    python benchmarks/loadtest.py --generate --customers 10000 --medicines 5000 --payments 50000
+    python benchmarks/loadtest.py --users 32 --duration 60 --output before.json
+    python benchmarks/loadtest.py --users 32 --duration 60 --compare before.json
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --mix browse=5,search=3,checkout=1
+
+--generate fills the database first with generate_data.py (same size
+arguments). Unless --url is given, the app is started with serve.py on
+--port and stopped afterwards. Each virtual user logs in as a generated
+account (see generate_data.py) and then runs scenarios picked by weight
+from --mix until --duration runs out.
+
+For every scenario the report gives request count, errors, throughput,
+p50/p95/p99 latency and database queries per request (from the
+X-DB-Queries header). The JSON report (stdout, or --output) also records
+the commit and arguments so runs can be compared across versions.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from generate_data import (PASSWORD, BRANDS, STEMS, CATEGORIES, customer_id,  # noqa: E402
+                           deliveryman_id, admin_id, med_code)
+
+DEFAULT_MIX = 'browse=35,search=25,add_to_cart=20,checkout=5,admin_payments=10,deliveryman_dashboard=5'
+
+# Scenario -> role of the virtual user that runs it
+SCENARIO_ROLES = {
+    'browse': 'customer',
+    'search': 'customer',
+    'add_to_cart': 'customer',
+    'checkout': 'customer',
+    'admin_payments': 'admin',
+    'deliveryman_dashboard': 'deliveryman'
+}
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects instead of following them, so a bounce to /login counts as an error"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Recorder:
+    """Latency, status and query counts per scenario, shared by all virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name, seconds, ok, queries):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            if queries is not None:
+                self.queries[name].append(queries)
+            if not ok:
+                self.errors[name] += 1
+
+
+class VirtualUser:
+    """One logged-in browser session (its own cookie jar)"""
+
+    def __init__(self, base_url, role, account, recorder, rng, args):
+        self.base_url = base_url
+        self.role = role
+        self.account = account
+        self.recorder = recorder
+        self.rng = rng
+        self.args = args
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, name, path, data=None, json_body=None, expect_redirect=None):
+        """Send one request and record it under `name`. Returns (status, body).
+
+        A redirect to /login, an HTTP error, a JSON {'success': false} or,
+        with expect_redirect, a redirect anywhere else counts as an error.
+        """
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(req, timeout=self.args.timeout)
+            status, payload, response_headers = response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            status, payload, response_headers = e.code, e.read(), e.headers
+        except (urllib.error.URLError, OSError):
+            self.recorder.add(name, time.perf_counter() - started, False, None)
+            return None, b''
+        elapsed = time.perf_counter() - started
+
+        location = response_headers.get('Location', '') or ''
+        ok = status < 400 and '/login' not in location
+        if expect_redirect is not None:
+            ok = ok and location.endswith(expect_redirect)
+        if ok and json_body is not None and payload.startswith(b'{'):
+            ok = json.loads(payload).get('success', True)
+        queries = response_headers.get('X-DB-Queries')
+        self.recorder.add(name, elapsed, ok, int(queries) if queries is not None else None)
+        return status, payload
+
+    def login(self):
+        """Log in as the generated account; True on success"""
+        # Follow the post-login redirect with the same cookie jar
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self._jar()))
+        body = urllib.parse.urlencode({'email': f"{self.account.lower()}@gen.test", 'password': PASSWORD,
+                                       'user_type': self.role}).encode()
+        response = opener.open(urllib.request.Request(self.base_url + '/login', data=body),
+                               timeout=self.args.timeout)
+        response.read()
+        return '/login' not in response.url
+
+    def _jar(self):
+        for handler in self.opener.handlers:
+            if isinstance(handler, urllib.request.HTTPCookieProcessor):
+                return handler.cookiejar
+        raise RuntimeError('opener has no cookie jar')
+
+    # --- scenarios ---
+
+    def browse(self):
+        params = {'sort_by': self.rng.choice(['name', 'price', 'price_desc'])}
+        if self.rng.random() < 0.5:
+            params['category'] = self.rng.choice(CATEGORIES)
+        self.request('browse', '/customer/browse?' + urllib.parse.urlencode(params))
+
+    def search(self):
+        term = self.rng.choice([self.rng.choice(BRANDS), self.rng.choice(STEMS)])
+        self.request('search', '/customer/browse?' + urllib.parse.urlencode({'search': term}))
+
+    def add_to_cart(self):
+        code = med_code(self.rng.randint(1, self.args.medicines))
+        self.request('add_to_cart', '/customer/add_to_cart',
+                     json_body={'med_code': code, 'quantity': self.rng.randint(1, 2)})
+
+    def checkout(self):
+        self.add_to_cart()
+        self.request('checkout', '/customer/process_payment', data={'payment_method': 'Cash on Delivery'},
+                     expect_redirect='/customer/dashboard')
+
+    def admin_payments(self):
+        params = {'page': self.rng.randint(1, 5)}
+        if self.rng.random() < 0.3:
+            params['status'] = self.rng.choice(['Pending Assignment', 'Assigned', 'Delivered'])
+        self.request('admin_payments', '/admin/payments?' + urllib.parse.urlencode(params))
+
+    def deliveryman_dashboard(self):
+        self.request('deliveryman_dashboard', '/deliveryman/dashboard')
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIO_ROLES:
+            raise SystemExit(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIO_ROLES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def account_for(role, index, args):
+    if role == 'customer':
+        return customer_id(index % args.customers + 1)
+    if role == 'deliveryman':
+        return deliveryman_id(index % args.deliverymen + 1)
+    return admin_id(index % args.admins + 1)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None
+    }
+
+
+def run_load(base_url, args, mix):
+    recorder = Recorder()
+    # Each role gets a share of the virtual users proportional to its scenarios' weight (at least one)
+    role_weight = defaultdict(float)
+    for name, weight in mix.items():
+        role_weight[SCENARIO_ROLES[name]] += weight
+    total_weight = sum(role_weight.values())
+    shares = {role: max(1, round(args.users * weight / total_weight)) for role, weight in role_weight.items()}
+    roles = [role for role in sorted(shares, key=shares.get, reverse=True) for _ in range(shares[role])]
+
+    users = []
+    for index, role in enumerate(roles):
+        scenarios = [name for name in mix if SCENARIO_ROLES[name] == role]
+        user = VirtualUser(base_url, role, account_for(role, index, args), recorder,
+                           random.Random(args.seed + index), args)
+        users.append((user, scenarios, [mix[name] for name in scenarios]))
+
+    print(f"Logging in {len(users)} virtual user(s)...", file=sys.stderr)
+    for user, _, _ in users:
+        if not user.login():
+            raise SystemExit(f"Login failed for {user.account} ({user.role}); did you run --generate?")
+
+    deadline = time.monotonic() + args.duration
+    barrier = threading.Barrier(len(users) + 1)
+
+    def work(user, scenarios, weights):
+        barrier.wait()
+        while time.monotonic() < deadline:
+            getattr(user, user.rng.choices(scenarios, weights)[0])()
+            if args.think_time:
+                time.sleep(user.rng.uniform(0, 2 * args.think_time))
+
+    threads = [threading.Thread(target=work, args=entry, daemon=True) for entry in users]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    scenarios = {name: summarize(recorder.latencies[name], recorder.queries[name], recorder.errors[name], elapsed)
+                 for name in sorted(recorder.latencies)}
+    overall = summarize([v for values in recorder.latencies.values() for v in values],
+                        [v for values in recorder.queries.values() for v in values],
+                        sum(recorder.errors.values()), elapsed)
+    return elapsed, scenarios, overall
+
+
+def start_server(args):
+    """Run serve.py in a child process and wait until it answers"""
+    env = dict(os.environ, DRUGWEB_REMINDERS='0', DRUGWEB_POINTS_SNAPSHOTS='0')
+    process = subprocess.Popen([sys.executable, 'serve.py', '--port', str(args.port)], cwd=PROJECT_DIR, env=env,
+                               stdout=subprocess.DEVNULL if args.quiet_server else None, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + args.boot_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"serve.py exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=2).read()
+            return process, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"serve.py did not answer within {args.boot_timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(report, baseline=None):
+    rows = list(report['scenarios'].items()) + [('ALL', report['overall'])]
+    print(f"{'scenario':<22}{'reqs':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}"
+          + ('  p95 vs base   rps vs base' if baseline else ''), file=sys.stderr)
+    for name, s in rows:
+        line = (f"{name:<22}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>9.1f}"
+                f"{s['p50_ms'] or 0:>9.1f}{s['p95_ms'] or 0:>9.1f}{s['p99_ms'] or 0:>9.1f}"
+                f"{s['queries_per_request'] if s['queries_per_request'] is not None else '-':>7}")
+        if baseline:
+            base = baseline['overall'] if name == 'ALL' else baseline['scenarios'].get(name)
+            if base and base.get('p95_ms') and base.get('throughput_rps'):
+                line += (f"  {(s['p95_ms'] or 0) / base['p95_ms'] - 1:>+11.1%}"
+                         f"  {s['throughput_rps'] / base['throughput_rps'] - 1:>+11.1%}")
+        print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='test an already running server instead of starting serve.py')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--boot-timeout', type=float, default=60)
+    parser.add_argument('--quiet-server', action='store_true', help="hide serve.py's output")
+    parser.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load after login')
+    parser.add_argument('--think-time', type=float, default=0, help='mean pause between a user\'s requests (s)')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout (s)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario=weight,... (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='earlier JSON report to show p95 and throughput changes against')
+    gen = parser.add_argument_group('data set (must match what generate_data.py created)')
+    gen.add_argument('--generate', action='store_true', help='run generate_data.py with these sizes first')
+    gen.add_argument('--customers', type=int, default=1000)
+    gen.add_argument('--deliverymen', type=int, default=20)
+    gen.add_argument('--admins', type=int, default=2)
+    gen.add_argument('--medicines', type=int, default=2000)
+    gen.add_argument('--payments', type=int, default=5000)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.generate:
+        subprocess.check_call([sys.executable, 'generate_data.py', '--customers', str(args.customers),
+                               '--deliverymen', str(args.deliverymen), '--admins', str(args.admins),
+                               '--medicines', str(args.medicines), '--payments', str(args.payments)],
+                              cwd=PROJECT_DIR, stdout=sys.stderr)
+
+    process = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        process, base_url = start_server(args)
+    try:
+        elapsed, scenarios, overall = run_load(base_url, args, mix)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'config': {'users': args.users, 'duration': args.duration, 'think_time': args.think_time, 'mix': mix,
+                   'customers': args.customers, 'deliverymen': args.deliverymen, 'medicines': args.medicines,
+                   'payments': args.payments, 'url': base_url},
+        'elapsed_s': round(elapsed, 2),
+        'scenarios': scenarios,
+        'overall': overall
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Check that cached carts match the cart table after the table rejects a write.
+
+Usage (from the "Dragweb Project" directory, MySQL running and /setup_db done):
+
+    python benchmarks/stress_cart_flush.py --customers 200
+
+Creates throwaway customers CF0001.. that each hold 2 units of the CFLUSH1
+medicine in the cart table, loads their carts into cart_cache, then lowers
+the medicine's stock in MySQL behind the cached catalog's back. Half the
+customers raise their line past the new stock (the flush is rejected), the
+other half lower it (the flush succeeds). After cart_cache.flush_all() it
+checks that:
+
+  * every cached cart has the same lines and quantities as the table,
+  * every cached total equals the sum of the table's line totals,
+  * the rejected lines were counted in cart_cache.stats().
+
+Exits non-zero if any check fails. Use --cleanup to remove the test rows.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection  # noqa: E402
+from cart import cart_cache, cart_lines  # noqa: E402
+from catalog_cache import catalog, refresh_medicines  # noqa: E402
+
+MED_CODE = 'CFLUSH1'
+
+
+def customer_ids(count):
+    return [f"CF{i:04d}" for i in range(1, count + 1)]
+
+
+def cleanup(cursor, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"DELETE FROM cart WHERE Customer_ID IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM customer WHERE Customer_ID IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM user WHERE ID IN ({placeholders})", ids)
+    cursor.execute("DELETE FROM medicine WHERE Med_Code = %s", (MED_CODE,))
+
+
+def prepare(count):
+    ids = customer_ids(count)
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cleanup(cursor, ids)
+    cursor.execute("""
+        INSERT INTO medicine (Med_Code, Name, Generic_name, Category, Price, Stock)
+        VALUES (%s, 'Flush Test Tablet', 'Flushamol', 'General', 12.50, 100)
+    """, (MED_CODE,))
+    cursor.executemany("""
+        INSERT INTO user (ID, F_name, L_name, email, password, address, phone)
+        VALUES (%s, 'Flush', 'Tester', %s, 'x', 'Test Lane', '000')
+    """, [(cid, f"{cid.lower()}@flush.test") for cid in ids])
+    cursor.executemany("INSERT INTO customer (Customer_ID, points) VALUES (%s, 0)", [(cid,) for cid in ids])
+    cursor.executemany("""
+        INSERT INTO cart (Customer_ID, Med_Code, Med_Name, Quantity, Price, total_price)
+        VALUES (%s, %s, 'Flush Test Tablet', 2, 12.50, 25.00)
+    """, [(cid, MED_CODE) for cid in ids])
+    connection.commit()
+    # The cached catalog now believes there are 100 units
+    catalog.ensure_fresh()
+    refresh_medicines(connection, [MED_CODE])
+    cursor.close()
+    connection.close()
+    return ids
+
+
+def table_carts(ids):
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    carts = {cid: cart_lines(cursor, cid) for cid in ids}
+    cursor.close()
+    connection.close()
+    return carts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--cleanup', action='store_true', help='remove the test rows afterwards')
+    args = parser.parse_args()
+
+    ids = prepare(args.customers)
+    for cid in ids:
+        cart_cache.view(cid)
+
+    # Only 3 units left: raising a line to 5 is refused by apply_batch()
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cursor.execute("UPDATE medicine SET Stock = 3 WHERE Med_Code = %s", (MED_CODE,))
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+    rejected_before = cart_cache.stats()['rejected_lines']
+    for n, cid in enumerate(ids):
+        cart_cache.set_quantity(cid, MED_CODE, 5 if n % 2 == 0 else 1)
+    cart_cache.flush_all()
+    rejected = cart_cache.stats()['rejected_lines'] - rejected_before
+
+    tables = table_carts(ids)
+    mismatched_lines = 0
+    mismatched_totals = 0
+    for cid in ids:
+        lines, total = cart_cache.view(cid)
+        cached = {line['Med_Code']: line['quantity'] for line in lines}
+        stored = {row['Med_Code']: row['quantity'] for row in tables[cid]}
+        if cached != stored:
+            mismatched_lines += 1
+        if total != sum(row['total_price'] for row in tables[cid]):
+            mismatched_totals += 1
+
+    print(f"customers={len(ids)} rejected={rejected} "
+          f"mismatched_lines={mismatched_lines} mismatched_totals={mismatched_totals}")
+    checks = {
+        'cached lines match the table': mismatched_lines == 0,
+        'cached totals match the table': mismatched_totals == 0,
+        'rejected lines counted': rejected == (len(ids) + 1) // 2
+    }
+    for name, passed in checks.items():
+        print(f"  [{'PASS' if passed else 'FAIL'}] {name}")
+
+    if args.cleanup:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cleanup(cursor, ids)
+        connection.commit()
+        cursor.close()
+        connection.close()
+        for cid in ids:
+            cart_cache.discard(cid)
+
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Fire hundreds of simultaneous checkouts at one low-stock medicine and check for oversell.
+
+Usage (from the "Dragweb Project" directory, MySQL running and /setup_db done):
+
+    DRUGWEB_POOL_SIZE=50 python benchmarks/stress_checkout.py --buyers 300 --stock 25
+
+Creates throwaway customers ST0001.. that each have one unit of the STRESS1
+medicine in their cart, posts /customer/process_payment for all of them at
+once through the Flask app, then checks that:
+
+  * stock never went negative,
+  * units sold (order_items) == starting stock - remaining stock,
+  * successful payments == units sold (one unit per buyer).
+
+Exits non-zero if any check fails. Use --cleanup to remove the test rows.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from db import get_db_connection  # noqa: E402
+
+MED_CODE = 'STRESS1'
+
+
+def customer_ids(count):
+    return [f"ST{i:04d}" for i in range(1, count + 1)]
+
+
+def cleanup(cursor, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"DELETE FROM cart WHERE Customer_ID IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM points_history WHERE customer_id IN ({placeholders})", ids)
+    cursor.execute(f"DELETE oi FROM order_items oi JOIN payment p ON oi.payment_id = p.payment_id "
+                   f"WHERE p.Customer_ID IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM notifications WHERE customer_id IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM payment WHERE Customer_ID IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM customer WHERE Customer_ID IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM user WHERE ID IN ({placeholders})", ids)
+    cursor.execute("DELETE FROM medicine WHERE Med_Code = %s", (MED_CODE,))
+
+
+def prepare(buyers, stock):
+    ids = customer_ids(buyers)
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cleanup(cursor, ids)
+    cursor.execute("""
+        INSERT INTO medicine (Med_Code, Name, Generic_name, Category, Price, Stock)
+        VALUES (%s, 'Stress Test Tablet', 'Stressamol', 'General', 15.00, %s)
+    """, (MED_CODE, stock))
+    cursor.executemany("""
+        INSERT INTO user (ID, F_name, L_name, email, password, address, phone)
+        VALUES (%s, 'Stress', 'Buyer', %s, 'x', 'Test Lane', '000')
+    """, [(cid, f"{cid.lower()}@stress.test") for cid in ids])
+    cursor.executemany("INSERT INTO customer (Customer_ID, points) VALUES (%s, 0)", [(cid,) for cid in ids])
+    cursor.executemany("""
+        INSERT INTO cart (Customer_ID, Med_Code, Med_Name, Quantity, Price, total_price)
+        VALUES (%s, %s, 'Stress Test Tablet', 1, 15.00, 15.00)
+    """, [(cid, MED_CODE) for cid in ids])
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return ids
+
+
+def checkout(customer_id, barrier, results):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = customer_id
+        session['user_type'] = 'customer'
+    barrier.wait()
+    started = time.perf_counter()
+    response = client.post('/customer/process_payment', data={'payment_method': 'Cash on Delivery'})
+    results.append((response.headers.get('Location', ''), time.perf_counter() - started))
+
+
+def verify(ids, stock):
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cursor.execute("SELECT Stock FROM medicine WHERE Med_Code = %s", (MED_CODE,))
+    remaining = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(SUM(Quantity), 0) FROM order_items WHERE Med_Code = %s", (MED_CODE,))
+    sold = int(cursor.fetchone()[0])
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"SELECT COUNT(*) FROM payment WHERE Customer_ID IN ({placeholders})", ids)
+    payments = cursor.fetchone()[0]
+    cursor.close()
+    connection.close()
+    return remaining, sold, payments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=25)
+    parser.add_argument('--cleanup', action='store_true', help='remove the test rows afterwards')
+    args = parser.parse_args()
+
+    ids = prepare(args.buyers, args.stock)
+    barrier = threading.Barrier(args.buyers)
+    results = []
+    threads = [threading.Thread(target=checkout, args=(cid, barrier, results)) for cid in ids]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    remaining, sold, payments = verify(ids, args.stock)
+    succeeded = sum(1 for location, _ in results if location.endswith('/customer/dashboard'))
+    latencies = sorted(duration for _, duration in results)
+
+    print(f"buyers={args.buyers} stock={args.stock} elapsed={elapsed:.2f}s "
+          f"throughput={len(results) / elapsed:.1f} checkouts/s")
+    print(f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+    print(f"succeeded={succeeded} payments={payments} units_sold={sold} remaining_stock={remaining}")
+
+    checks = {
+        'stock never negative': remaining >= 0,
+        'sold + remaining == starting stock': sold + remaining == args.stock,
+        'one payment per unit sold': payments == sold,
+        'no more sales than stock': sold <= args.stock
+    }
+    for name, passed in checks.items():
+        print(f"  [{'PASS' if passed else 'FAIL'}] {name}")
+
+    if args.cleanup:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cleanup(cursor, ids)
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Run many signups in parallel and check that every one gets a unique customer ID.
+
+Usage (from the "Dragweb Project" directory, MySQL running and /setup_db done):
+
+    DRUGWEB_POOL_SIZE=50 python benchmarks/stress_signup.py --signups 500 --threads 50
+
+Each thread posts /signup through the Flask app with a unique e-mail
+address. Afterwards the script checks that every signup produced exactly one
+user and one customer row, that no IDs were duplicated, and reports how
+many id_sequence block reservations were needed. Use --cleanup to remove
+the test accounts.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from db import get_db_connection  # noqa: E402
+from ids import customer_sequence  # noqa: E402
+
+
+def worker(emails, results):
+    client = app.test_client()
+    for email in emails:
+        started = time.perf_counter()
+        response = client.post('/signup', data={
+            'f_name': 'Stress', 'l_name': 'Signup', 'email': email, 'password': 'x',
+            'address': 'Test Lane', 'phone': '000'
+        })
+        results.append((response.status_code, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--signups', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--cleanup', action='store_true', help='remove the test accounts afterwards')
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    emails = [f"signup{i}-{run}@stress.test" for i in range(args.signups)]
+    chunks = [emails[i::args.threads] for i in range(args.threads)]
+    results = []
+
+    reservations = 0
+    original_reserve = customer_sequence._reserve
+
+    def counting_reserve():
+        nonlocal reservations
+        reservations += 1
+        original_reserve()
+
+    customer_sequence._reserve = counting_reserve
+
+    threads = [threading.Thread(target=worker, args=(chunk, results)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT u.ID, c.Customer_ID FROM user u
+        LEFT JOIN customer c ON c.Customer_ID = u.ID
+        WHERE u.email LIKE %s
+    """, (f"%-{run}@stress.test",))
+    rows = cursor.fetchall()
+    ids = [row[0] for row in rows]
+
+    checks = {
+        'every signup created a user': len(rows) == args.signups,
+        'every user has a customer row': all(row[1] for row in rows),
+        'no duplicate customer IDs': len(set(ids)) == len(ids),
+        'IDs sort as text in numeric order': sorted(ids) == sorted(ids, key=lambda x: int(x[2:]))
+    }
+
+    latencies = sorted(duration for _, duration in results)
+    print(f"signups={args.signups} threads={args.threads} elapsed={elapsed:.2f}s "
+          f"throughput={len(results) / elapsed:.1f} signups/s")
+    print(f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+          f"block reservations={reservations} (block size {customer_sequence.block_size})")
+    for name, passed in checks.items():
+        print(f"  [{'PASS' if passed else 'FAIL'}] {name}")
+
+    if args.cleanup and ids:
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f"DELETE FROM customer WHERE Customer_ID IN ({placeholders})", ids)
+        cursor.execute(f"DELETE FROM user WHERE ID IN ({placeholders})", ids)
+        connection.commit()
+    cursor.close()
+    connection.close()
+
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+"""Customer carts: an in-memory cache in front of the cart table.
+
+Cart pages and the checkout summary are served from CartCache, which holds
+each customer's lines and running total. Mutations change the cached cart
+at once and are written to the cart table behind the request, in one
+apply_batch() transaction per customer, by a background flusher. Checkout
+flushes first, so orders are always placed from the table. The table stays
+the source of truth: a cart missing from memory (after a restart or crash)
+is reloaded from it, so at most the last flush interval of edits is lost.
+
+Prices always come from the medicine data on the server; nothing the client
+sends is trusted except the medicine code and quantity. The cache is per
+process: run one worker, or set DRUGWEB_CART_CACHE=0 to write every change
+through and always read carts from the table.
+"""
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from mysql.connector import Error
+
+from db import get_db_connection
+from catalog_cache import catalog
+from search import medicine_index
+
+# Most lines one batch request may change
+MAX_BATCH_ITEMS = 100
+
+CART_CACHE_ENABLED = os.environ.get('DRUGWEB_CART_CACHE', '1') != '0'
+CART_FLUSH_INTERVAL = float(os.environ.get('DRUGWEB_CART_FLUSH_INTERVAL', 2))  # seconds
+CART_CACHE_SIZE = int(os.environ.get('DRUGWEB_CART_CACHE_SIZE', 10000))  # customers kept in memory
+
+
+class CartError(Exception):
+    """A cart change that could not be applied (unknown medicine, not enough stock)"""
+
+
+def _explain_miss(cursor, med_code, quantity):
+    """Failure path only: say why an upsert matched no medicine row"""
+    cursor.execute("SELECT Stock FROM medicine WHERE Med_Code = %s", (med_code,))
+    row = cursor.fetchone()
+    if not row:
+        return 'Medicine not found'
+    stock = row['Stock'] if isinstance(row, dict) else row[0]
+    return f'Only {stock} units available'
+
+
+def cart_lines_query(customer_id, med_codes=None):
+    """(sql, params) for cart_lines(); migrations.ROUTE_QUERIES checks the same SQL"""
+    conditions = "Customer_ID = %s"
+    params = [customer_id]
+    if med_codes:
+        conditions += f" AND Med_Code IN ({', '.join(['%s'] * len(med_codes))})"
+        params += list(med_codes)
+    return f"""
+        SELECT Cart_ID, Med_Code, Med_Name, Quantity AS quantity, Price AS unit_price, total_price
+        FROM cart
+        WHERE {conditions}
+        ORDER BY Cart_ID DESC
+    """, params
+
+
+def cart_lines(cursor, customer_id, med_codes=None):
+    """The customer's cart, newest line first, priced from the cart rows.
+
+    Pass med_codes to read only those lines.
+    """
+    cursor.execute(*cart_lines_query(customer_id, med_codes))
+    return cursor.fetchall()
+
+
+def apply_batch(connection, customer_id, changes):
+    """Set many quantities at once; quantity 0 removes the line.
+
+    `changes` is a list of (med_code, quantity). All upserts go in one
+    INSERT ... SELECT over a derived table and all removals in one DELETE,
+    inside a single transaction. Returns {med_code: status} where status is
+    'updated', 'removed', or the reason the line was skipped.
+    """
+    wanted = {}
+    for med_code, quantity in changes:
+        wanted[med_code] = quantity  # last change for a code wins
+    upserts = [(code, qty) for code, qty in wanted.items() if qty > 0]
+    removals = [code for code, qty in wanted.items() if qty == 0]
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        if not connection.in_transaction:
+            connection.start_transaction()
+
+        if upserts:
+            rows = ' UNION ALL '.join(['SELECT %s AS Med_Code, %s AS qty'] * len(upserts))
+            params = [customer_id]
+            for code, qty in upserts:
+                params.extend([code, qty])
+            cursor.execute(f"""
+                INSERT INTO cart (Customer_ID, Med_Code, Med_Name, Quantity, Price, total_price)
+                SELECT %s, m.Med_Code, m.Name, v.qty, m.Price, m.Price * v.qty
+                FROM ({rows}) v
+                JOIN medicine m ON m.Med_Code = v.Med_Code
+                WHERE m.Stock >= v.qty
+                ON DUPLICATE KEY UPDATE Quantity = VALUES(Quantity),
+                                        Price = VALUES(Price),
+                                        total_price = VALUES(total_price)
+            """, params)
+
+        if removals:
+            placeholders = ', '.join(['%s'] * len(removals))
+            cursor.execute(f"DELETE FROM cart WHERE Customer_ID = %s AND Med_Code IN ({placeholders})",
+                           [customer_id] + removals)
+
+        results = {code: 'removed' for code in removals}
+        if upserts:
+            placeholders = ', '.join(['%s'] * len(upserts))
+            cursor.execute(f"""
+                SELECT Med_Code, Quantity FROM cart
+                WHERE Customer_ID = %s AND Med_Code IN ({placeholders})
+            """, [customer_id] + [code for code, _ in upserts])
+            applied = {row['Med_Code']: row['Quantity'] for row in cursor.fetchall()}
+            for code, qty in upserts:
+                if applied.get(code) == qty:
+                    results[code] = 'updated'
+                else:
+                    results[code] = _explain_miss(cursor, code, qty)
+
+        connection.commit()
+        return results
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class CachedCart:
+    """One customer's cart: lines by Med_Code, running total, unwritten changes"""
+
+    def __init__(self, lines):
+        self.lines = OrderedDict()
+        self.total = Decimal('0')
+        for line in reversed(lines):  # cart_lines() is newest first
+            self.restore(line['Med_Code'], line)
+        self.pending = {}  # Med_Code -> quantity to write, 0 deletes
+        self.flush_lock = threading.Lock()
+
+    def set(self, medicine, quantity):
+        old = self.lines.get(medicine.Med_Code)
+        if old:
+            self.total -= old['total_price']
+        if quantity == 0:
+            self.lines.pop(medicine.Med_Code, None)
+        else:
+            line = old or {'Cart_ID': None, 'Med_Code': medicine.Med_Code}
+            line.update(Med_Name=medicine.Name, quantity=quantity, unit_price=medicine.Price,
+                        total_price=medicine.Price * quantity)
+            self.lines[medicine.Med_Code] = line
+            self.total += line['total_price']
+        self.pending[medicine.Med_Code] = quantity
+
+    def drop(self, med_code):
+        line = self.lines.pop(med_code, None)
+        if line:
+            self.total -= line['total_price']
+
+    def restore(self, med_code, row):
+        """Make a line match its cart table row, or drop it if there is none"""
+        if row is None:
+            self.drop(med_code)
+            return
+        old = self.lines.get(med_code)
+        if old:
+            self.total -= old['total_price']
+        line = dict(row)
+        line['unit_price'] = Decimal(line['unit_price'] or 0)
+        line['total_price'] = Decimal(line['total_price'] or 0)
+        self.lines[med_code] = line  # an existing line keeps its place
+        self.total += line['total_price']
+
+    def items(self):
+        """Copies of the lines, newest first"""
+        return [dict(line) for line in reversed(self.lines.values())]
+
+    def code_for(self, cart_id):
+        """Med_Code of a line known by its table Cart_ID"""
+        for line in self.lines.values():
+            if str(line['Cart_ID']) == str(cart_id):
+                return line['Med_Code']
+        return None
+
+
+def _medicine(med_code):
+    catalog.ensure_fresh()
+    return medicine_index.get(med_code)
+
+
+class CartCache:
+    """LRU map of customer ID -> CachedCart with write-behind to the cart table"""
+
+    def __init__(self, size=CART_CACHE_SIZE, flush_interval=CART_FLUSH_INTERVAL, enabled=CART_CACHE_ENABLED):
+        self.size = size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._carts = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher = None
+        self._stats = {'hits': 0, 'loads': 0, 'flushes': 0, 'flushed_lines': 0,
+                       'flush_errors': 0, 'rejected_lines': 0}
+
+    # --- loading ---
+
+    def _load(self, customer_id):
+        """Read a cart from the table (recovery path)"""
+        connection = get_db_connection()
+        if not connection:
+            raise Error(msg='Database connection failed')
+        try:
+            cursor = connection.cursor(dictionary=True)
+            lines = cart_lines(cursor, customer_id)
+            cursor.close()
+        finally:
+            connection.close()
+        return CachedCart(lines)
+
+    def _get(self, customer_id):
+        with self._lock:
+            cart = self._carts.get(customer_id)
+            if cart is not None and self.enabled:
+                self._carts.move_to_end(customer_id)
+                self._stats['hits'] += 1
+                return cart
+        loaded = self._load(customer_id)
+        with self._lock:
+            self._stats['loads'] += 1
+            # Another request may have loaded (and changed) it meanwhile
+            cart = self._carts.get(customer_id) if self.enabled else None
+            if cart is None:
+                cart = self._carts[customer_id] = loaded
+            self._evict()
+            return cart
+
+    def _evict(self):
+        # Drop least recently used carts that have nothing left to write
+        for customer_id in list(self._carts):
+            if len(self._carts) <= self.size:
+                break
+            if customer_id not in self._dirty:
+                del self._carts[customer_id]
+
+    # --- reads ---
+
+    def view(self, customer_id):
+        """(lines newest first, total)"""
+        cart = self._get(customer_id)
+        with self._lock:
+            return cart.items(), cart.total
+
+    # --- mutations ---
+
+    def _written(self, customer_id):
+        """Called after a mutation, outside the cache lock"""
+        if self.enabled:
+            self.start()
+        else:
+            self.flush(customer_id)
+
+    def add(self, customer_id, med_code, quantity):
+        """Add units of a medicine. Returns the line's new quantity."""
+        medicine = _medicine(med_code)
+        if medicine is None:
+            raise CartError('Medicine not found')
+        if medicine.Stock < quantity:
+            raise CartError(f'Only {medicine.Stock} units available')
+        cart = self._get(customer_id)
+        with self._lock:
+            line = cart.lines.get(med_code)
+            new_quantity = (line['quantity'] if line else 0) + quantity
+            cart.set(medicine, new_quantity)
+            self._dirty.add(customer_id)
+        self._written(customer_id)
+        return new_quantity
+
+    def set_quantity(self, customer_id, med_code, quantity):
+        """Set a line's quantity (0 removes it). Returns the line total, or None if absent."""
+        cart = self._get(customer_id)
+        medicine = _medicine(med_code)
+        with self._lock:
+            if med_code not in cart.lines:
+                return None
+            if medicine is None:
+                raise CartError('Medicine not found')
+            if medicine.Stock < quantity:
+                raise CartError(f'Only {medicine.Stock} units available')
+            cart.set(medicine, quantity)
+            self._dirty.add(customer_id)
+        self._written(customer_id)
+        return medicine.Price * quantity
+
+    def apply(self, customer_id, changes):
+        """Set many quantities; returns {med_code: status} like apply_batch()"""
+        cart = self._get(customer_id)
+        catalog.ensure_fresh()
+        results = {}
+        with self._lock:
+            for med_code, quantity in changes:
+                medicine = medicine_index.get(med_code)
+                if medicine is None:
+                    results[med_code] = 'Medicine not found'
+                elif quantity == 0:
+                    if med_code in cart.lines:
+                        cart.set(medicine, 0)
+                    results[med_code] = 'removed'
+                elif medicine.Stock < quantity:
+                    results[med_code] = f'Only {medicine.Stock} units available'
+                else:
+                    cart.set(medicine, quantity)
+                    results[med_code] = 'updated'
+            self._dirty.add(customer_id)
+        self._written(customer_id)
+        return results
+
+    def code_for(self, customer_id, cart_id):
+        cart = self._get(customer_id)
+        with self._lock:
+            return cart.code_for(cart_id)
+
+    def discard(self, customer_id):
+        """Forget a cart whose table rows were just consumed (after checkout)"""
+        with self._lock:
+            self._carts.pop(customer_id, None)
+            self._dirty.discard(customer_id)
+
+    # --- write-behind ---
+
+    def flush(self, customer_id):
+        """Write a customer's pending changes now. Returns False if the write failed."""
+        with self._lock:
+            cart = self._carts.get(customer_id)
+        if cart is None:
+            return True
+        # One writer per cart, so a checkout flush waits for an in-flight one
+        with cart.flush_lock:
+            with self._lock:
+                pending, cart.pending = cart.pending, {}
+                self._dirty.discard(customer_id)
+            if not pending:
+                return True
+            connection = get_db_connection()
+            try:
+                if not connection:
+                    raise Error(msg='Database connection failed')
+                results = apply_batch(connection, customer_id, list(pending.items()))
+                rejected = [code for code, status in results.items() if status not in ('updated', 'removed')]
+                if rejected:
+                    # The table kept its old rows for these: read them back
+                    cursor = connection.cursor(dictionary=True)
+                    rows = {row['Med_Code']: row for row in cart_lines(cursor, customer_id, rejected)}
+                    cursor.close()
+            except Error as e:
+                print(f"Error flushing cart for {customer_id}: {e}")
+                with self._lock:
+                    # Keep the failed writes unless something newer replaced them
+                    for med_code, quantity in pending.items():
+                        cart.pending.setdefault(med_code, quantity)
+                    self._dirty.add(customer_id)
+                    self._stats['flush_errors'] += 1
+                return False
+            finally:
+                if connection:
+                    connection.close()
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['flushed_lines'] += len(pending)
+                for med_code in rejected:
+                    # The table refused it (e.g. stock ran out): match memory to the table
+                    self._stats['rejected_lines'] += 1
+                    if med_code not in cart.pending:
+                        cart.restore(med_code, rows.get(med_code))
+            return True
+
+    def flush_all(self):
+        with self._lock:
+            dirty = list(self._dirty)
+        for customer_id in dirty:
+            self.flush(customer_id)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush_all()
+
+    def start(self):
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._run, name='cart-flusher', daemon=True)
+                    self._flusher.start()
+
+    def stop(self):
+        self._stop.set()
+        self.flush_all()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['carts'] = len(self._carts)
+            stats['dirty'] = len(self._dirty)
+            stats['enabled'] = self.enabled
+        return stats
+
+
+cart_cache = CartCache()
+
+# Write out whatever is still pending when the process exits normally
+atexit.register(cart_cache.stop)
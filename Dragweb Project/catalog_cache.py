@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+
+from mysql.connector import Error
+
+from db import get_db_connection
+from search import medicine_index, MEDICINE_COLUMNS, encode_cursor, decode_cursor
+
+# Seconds before the cached catalog is re-read from MySQL
+CATALOG_TTL = float(os.environ.get('DRUGWEB_CATALOG_TTL', 300))
+
+
+class CatalogCache:
+    """Read-through cache of the medicine table.
+
+    Rows live once, as compact Medicine tuples inside the search index; the
+    category list is derived from the same rows. The whole catalog is re-read
+    when the TTL expires or after invalidate(), and single medicines can be
+    patched in place with refresh() after stock or price changes.
+    """
+
+    def __init__(self, index, ttl=CATALOG_TTL):
+        self.index = index
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'invalidations': 0, 'refreshed_rows': 0}
+
+    def load(self):
+        """Read the whole medicine table into the cache"""
+        connection = get_db_connection()
+        if not connection:
+            return False
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicine")
+            self.index.build(cursor.fetchall())
+            cursor.close()
+            self._loaded_at = time.monotonic()
+            self._stats['reloads'] += 1
+            return True
+        except Error as e:
+            print(f"Error loading medicine catalog: {e}")
+            return False
+        finally:
+            connection.close()
+
+    def _fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def ensure_fresh(self):
+        """Reload the catalog if it is missing or expired"""
+        if self._fresh():
+            self._stats['hits'] += 1
+            return
+        with self._lock:
+            # Another request may have reloaded while we waited for the lock
+            if self._fresh():
+                self._stats['hits'] += 1
+                return
+            self._stats['misses'] += 1
+            self.load()
+
+    def invalidate(self):
+        """Drop the cached catalog; the next read goes to MySQL"""
+        self._loaded_at = None
+        self._stats['invalidations'] += 1
+
+    def refresh(self, connection, med_codes):
+        """Re-read the given medicines after a stock or price change"""
+        med_codes = list(set(med_codes))
+        if not med_codes or self._loaded_at is None:
+            return
+        try:
+            cursor = connection.cursor()
+            placeholders = ', '.join(['%s'] * len(med_codes))
+            cursor.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicine WHERE Med_Code IN ({placeholders})", med_codes)
+            rows = cursor.fetchall()
+            cursor.close()
+        except Error as e:
+            # The change is already committed; fall back to a full reload
+            print(f"Error refreshing medicine catalog: {e}")
+            self.invalidate()
+            return
+        found = set()
+        for row in rows:
+            self.index.upsert(row)
+            found.add(row[0])
+        for med_code in set(med_codes) - found:
+            self.index.remove(med_code)
+        self._stats['refreshed_rows'] += len(med_codes)
+
+    def medicines(self):
+        self.ensure_fresh()
+        return self.index.medicines()
+
+    def categories(self):
+        self.ensure_fresh()
+        return self.index.categories()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['size'] = len(self.index)
+        stats['ttl'] = self.ttl
+        stats['age'] = round(time.monotonic() - self._loaded_at, 3) if self._loaded_at is not None else None
+        return stats
+
+
+# Shared catalog used by the customer and admin routes
+catalog = CatalogCache(medicine_index)
+
+
+def load_catalog():
+    """Load the catalog at startup"""
+    return catalog.load()
+
+
+def invalidate_catalog():
+    """Invalidation hook for anything that rewrites the medicine table"""
+    catalog.invalidate()
+
+
+def refresh_medicines(connection, med_codes):
+    """Invalidation hook for stock or price changes to specific medicines"""
+    catalog.refresh(connection, med_codes)
+
+
+def search_medicines(query='', category=None, sort_by='name', offset=0, limit=None):
+    """Search the cached catalog. Returns (medicines, total)."""
+    catalog.ensure_fresh()
+    return medicine_index.search(query, category, sort_by, offset, limit)
+
+
+def browse_page(query='', category=None, sort_by='name', cursor=None, limit=12):
+    """Keyset page for the browse endpoints.
+
+    Returns (medicines, next_cursor, total_count). The total comes from the
+    index's cached counts, so paging never pays for an exact COUNT(*).
+    """
+    catalog.ensure_fresh()
+    after = decode_cursor(cursor, sort_by) if cursor else None
+    medicines, next_key = medicine_index.page(query, category, sort_by, after, limit)
+    next_cursor = encode_cursor(sort_by, medicines[-1]) if next_key else None
+    return medicines, next_cursor, medicine_index.count(query, category)
@@ -1,36 +1,28 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response
 from mysql.connector import Error
-from datetime import datetime, date, timedelta
-import random
-import string
+
+from db import get_db_connection, release_db_connection
+from search import encode_cursor
+from catalog_cache import catalog, search_medicines, browse_page, refresh_medicines
+from cart import cart_cache, CartError, MAX_BATCH_ITEMS
+from orders import place_order, OutOfStockError, EmptyCartError
+from ids import next_payment_id
+from notifications import fetch_page, fetch_since, mark_read, unread_count, FEED_LIMIT
+from ledger import fetch_history
+from reviews import fetch_page as fetch_reviews_page, add_review, review_feed
+from events import bus, notification_channel, notification_stream, format_sse
 
 # Create customer blueprint
 customer_bp = Blueprint('customer', __name__, url_prefix='/customer')
 
-# Database configuration
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
+# The customer's own requests (also EXPLAINed by migrations.ROUTE_QUERIES)
+CUSTOMER_REQUESTS_QUERY = """
+    SELECT request_med_name, Expected_date, 
+           IFNULL(Status, 'Pending') as Status
+    FROM customer_request
+    WHERE Customer_ID = %s
+    ORDER BY request_med_name DESC
+"""
 
 @customer_bp.route('/dashboard')
 def dashboard():
@@ -45,7 +37,6 @@ def dashboard():
     show_all = request.args.get('show_all', '0')
     
     connection = get_db_connection()
-    medicines = []
     customer_points = 0
     
     if connection:
@@ -60,32 +51,13 @@ def dashboard():
             print(f"Error fetching customer points: {e}")
             customer_points = 0
         
-        # Build query based on search and sort
-        base_query = "SELECT * FROM medicine WHERE 1=1"
-        params = []
-        
-        # Add search condition
-        if search:
-            base_query += " AND (Name LIKE %s OR Generic_name LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        # Add sorting
-        if sort_by == 'price':
-            base_query += " ORDER BY Price ASC"
-        elif sort_by == 'price_desc':
-            base_query += " ORDER BY Price DESC"
-        else:
-            base_query += " ORDER BY Name ASC"
-        
-        # Add limit if not showing all
-        if show_all != '1' and not search:
-            base_query += " LIMIT 9"
-        
-        cursor.execute(base_query, params)
-        medicines = cursor.fetchall()
         cursor.close()
         connection.close()
     
+    # Medicines come from the cached catalog; searches use its index
+    limit = None if search or show_all == '1' else 9
+    medicines, _ = search_medicines(search, sort_by=sort_by, limit=limit)
+    
     return render_template('customer_dashboard.html', medicines=medicines, 
                          search=search, sort_by=sort_by, show_all=show_all, customer_points=customer_points)
 
@@ -97,27 +69,18 @@ def notifications():
         return redirect(url_for('login'))
     
     customer_id = session['user_id']
+    before = request.args.get('before', type=int)
     connection = get_db_connection()
     notifications = []
+    older = None
     
     if connection:
         try:
             cursor = connection.cursor(dictionary=True)
             
-            # Get all notifications for this customer, ordered by newest first
-            cursor.execute("""
-                SELECT notification_id, message, type, is_read, created_at
-                FROM notifications
-                WHERE customer_id = %s
-                ORDER BY created_at DESC
-            """, (customer_id,))
-            
-            notifications = cursor.fetchall()
-            
-            # Mark all notifications as read
-            cursor.execute("""
-                UPDATE notifications SET is_read = TRUE WHERE customer_id = %s
-            """, (customer_id,))
+            # Newest page only; mark just the rows shown as read
+            notifications, older = fetch_page(cursor, customer_id, before)
+            mark_read(cursor, customer_id, notifications)
             
             connection.commit()
             
@@ -127,7 +90,7 @@ def notifications():
         finally:
             connection.close()
     
-    return render_template('customer_notifications.html', notifications=notifications)
+    return render_template('customer_notifications.html', notifications=notifications, older=older)
 
 @customer_bp.route('/points')
 def points():
@@ -138,8 +101,10 @@ def points():
     
     customer_id = session['user_id']
     connection = get_db_connection()
+    before = request.args.get('before', type=int)
     points_history = []
     current_points = 0
+    older = None
     
     if connection:
         try:
@@ -150,15 +115,8 @@ def points():
             points_result = cursor.fetchone()
             current_points = points_result['points'] if points_result else 0
             
-            # Get points transaction history
-            cursor.execute("""
-                SELECT points_earned, transaction_type, payment_id, description, created_at
-                FROM points_history
-                WHERE customer_id = %s
-                ORDER BY created_at DESC
-            """, (customer_id,))
-            
-            points_history = cursor.fetchall()
+            # One page of the ledger, newest first
+            points_history, older = fetch_history(cursor, customer_id, before)
             
         except Exception as e:
             print(f"Error fetching points history: {e}")
@@ -168,7 +126,8 @@ def points():
     
     return render_template('customer_points.html', 
                          points_history=points_history, 
-                         current_points=current_points)
+                         current_points=current_points,
+                         older=older)
 
 @customer_bp.route('/browse')
 def browse_medicines():
@@ -179,64 +138,29 @@ def browse_medicines():
     search = request.args.get('search', '').strip()
     sort_by = request.args.get('sort_by', 'name')
     category = request.args.get('category', '')
-    page = int(request.args.get('page', 1))
+    after = request.args.get('after', '')
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 12  # Show 12 medicines per page
     
-    medicines = []
-    total_count = 0
-    
-    connection = get_db_connection()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        
-        # Build the base query
-        base_query = "SELECT * FROM medicine WHERE 1=1"
-        count_query = "SELECT COUNT(*) as total FROM medicine WHERE 1=1"
-        params = []
-        
-        # Add search condition
-        if search:
-            base_query += " AND (Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s)"
-            count_query += " AND (Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
-        
-        # Add category filter
-        if category:
-            base_query += " AND Category = %s"
-            count_query += " AND Category = %s"
-            params.append(category)
-        
-        # Add ordering
-        if sort_by == 'price':
-            base_query += " ORDER BY Price ASC"
-        elif sort_by == 'price_desc':
-            base_query += " ORDER BY Price DESC"
-        else:
-            base_query += " ORDER BY Name ASC"
-        
-        # Get total count for pagination
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()['total']
-        
-        # Add pagination
+    # Match, filter, sort and paginate from the in-memory search index
+    if after or page == 1:
+        # Cursor mode: continue after the last medicine of the previous page
+        medicines, next_cursor, total_count = browse_page(search, category, sort_by, after, per_page)
+    else:
         offset = (page - 1) * per_page
-        base_query += f" LIMIT {per_page} OFFSET {offset}"
-        
-        # Get medicines
-        cursor.execute(base_query, params)
-        medicines = cursor.fetchall()
-        
-        # Get all categories for filter dropdown
-        cursor.execute("SELECT DISTINCT Category FROM medicine WHERE Category IS NOT NULL AND Category != '' ORDER BY Category")
-        categories = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+        medicines, total_count = search_medicines(search, category=category, sort_by=sort_by,
+                                                  offset=offset, limit=per_page)
+        next_cursor = None
+        if medicines and offset + per_page < total_count:
+            next_cursor = encode_cursor(sort_by, medicines[-1])
+    
+    # Categories for filter dropdown
+    categories = catalog.categories()
     
     # Calculate pagination info
     total_pages = (total_count + per_page - 1) // per_page
     has_prev = page > 1
-    has_next = page < total_pages
+    has_next = next_cursor is not None
     
     return render_template('browse_medicines.html', 
                          medicines=medicines, 
@@ -248,42 +172,58 @@ def browse_medicines():
                          total_pages=total_pages,
                          has_prev=has_prev,
                          has_next=has_next,
+                         next_cursor=next_cursor,
                          total_count=total_count)
 
+@customer_bp.route('/browse/json')
+def browse_medicines_json():
+    """Next page of browse results for infinite scroll"""
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    search = request.args.get('search', '').strip()
+    sort_by = request.args.get('sort_by', 'name')
+    category = request.args.get('category', '')
+    after = request.args.get('after', '')
+    limit = min(max(request.args.get('limit', 12, type=int), 1), 48)
+    
+    medicines, next_cursor, total_count = browse_page(search, category, sort_by, after, limit)
+    
+    return jsonify({
+        'success': True,
+        'medicines': [med._asdict() for med in medicines],
+        'next_cursor': next_cursor,
+        'total_count': total_count
+    })
+
 @customer_bp.route('/get_notifications')
 def get_notifications():
-    """Get notifications via AJAX"""
+    """Incremental notification feed via AJAX.
+
+    Returns notifications newer than ?since=<notification_id>, oldest first,
+    and the cursor to send next time. Only the returned rows are marked read.
+    """
     if 'user_id' not in session or session['user_type'] != 'customer':
         return jsonify({'success': False, 'message': 'Unauthorized access'})
     
     customer_id = session['user_id']
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', FEED_LIMIT, type=int), 100)
     connection = get_db_connection()
     
     if connection:
         cursor = connection.cursor(dictionary=True)
         try:
-            # Get unread notifications for the customer
-            cursor.execute("""
-                SELECT Notification_ID, Message, Type, Created_at, Is_read
-                FROM notifications 
-                WHERE Customer_ID = %s 
-                ORDER BY Created_at DESC
-                LIMIT 10
-            """, (customer_id,))
-            
-            notifications = cursor.fetchall()
-            
-            # Mark notifications as read
-            cursor.execute("""
-                UPDATE notifications 
-                SET Is_read = 1 
-                WHERE Customer_ID = %s AND Is_read = 0
-            """, (customer_id,))
+            notifications, next_since = fetch_since(cursor, customer_id, since, limit)
+            mark_read(cursor, customer_id, notifications)
+            unread = unread_count(cursor, customer_id)
             
             connection.commit()
-            return jsonify({'success': True, 'notifications': notifications})
+            return jsonify({'success': True, 'notifications': notifications,
+                            'since': next_since, 'unread_count': unread})
             
         except Exception as e:
+            connection.rollback()
             return jsonify({'success': False, 'message': f'Error: {str(e)}'})
         finally:
             cursor.close()
@@ -291,6 +231,81 @@ def get_notifications():
     
     return jsonify({'success': False, 'message': 'Database connection failed'})
 
+@customer_bp.route('/events')
+def events():
+    """Server-Sent Events stream of new notifications.
+
+    One catch-up read on connect (from ?since= or the Last-Event-ID header the
+    browser sends on reconnect); after that events come from the in-process
+    bus and the stream holds no database connection.
+    """
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized access'}), 401
+    
+    customer_id = session['user_id']
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+    
+    # Subscribe first so nothing published during the catch-up read is missed
+    channel = notification_channel(customer_id)
+    subscriber = bus.subscribe(channel)
+    try:
+        backlog, unread = [], None
+        connection = get_db_connection()
+        if connection:
+            try:
+                cursor = connection.cursor(dictionary=True)
+                unread = unread_count(cursor, customer_id)
+                if since:
+                    backlog, _ = fetch_since(cursor, customer_id, since, FEED_LIMIT)
+                cursor.close()
+            except Error as e:
+                print(f"Error reading notification backlog: {e}")
+            finally:
+                # Hand the connection back now; the stream may stay open for hours
+                release_db_connection()
+        
+        def stream():
+            try:
+                last_id = since
+                yield "retry: 5000\n\n"
+                if unread is not None:
+                    yield format_sse('unread', {'unread_count': unread})
+                for notification in backlog:
+                    last_id = notification['notification_id']
+                    yield format_sse('notification', notification, last_id)
+                yield from notification_stream(customer_id, subscriber, last_id)
+            finally:
+                bus.unsubscribe(channel, subscriber)
+        
+        response = Response(stream(), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        # Also covers a response that is closed before its first frame
+        response.call_on_close(lambda: bus.unsubscribe(channel, subscriber))
+        return response
+    except BaseException:
+        bus.unsubscribe(channel, subscriber)
+        raise
+
+@customer_bp.route('/notifications/unread_count')
+def notifications_unread_count():
+    """Unread badge count, read from the per-customer counter"""
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'success': False, 'message': 'Database connection failed'})
+    
+    try:
+        cursor = connection.cursor()
+        unread = unread_count(cursor, session['user_id'])
+        cursor.close()
+        return jsonify({'success': True, 'unread_count': unread})
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        connection.close()
+
 @customer_bp.route('/reviews', methods=['GET', 'POST'])
 def reviews():
     """Customer reviews system"""
@@ -301,39 +316,48 @@ def reviews():
     connection = get_db_connection()
     
     if request.method == 'POST':
-        review_text = request.form['review']
+        review_text = request.form.get('review', '').strip()
         customer_id = session['user_id']
         
-        if connection:
+        if not review_text:
+            flash('Please write something before submitting.', 'error')
+        elif connection:
             cursor = connection.cursor()
             try:
-                cursor.execute("""
-                    INSERT INTO customer_review (Customer_ID, review) 
-                    VALUES (%s, %s)
-                """, (customer_id, review_text))
+                add_review(cursor, customer_id, review_text)
                 connection.commit()
+                review_feed.invalidate()
                 flash('Your review has been submitted successfully!', 'success')
             except Error as e:
                 connection.rollback()
                 flash(f'Error submitting review: {e}', 'error')
             finally:
                 cursor.close()
+        else:
+            flash('Database connection failed', 'error')
+        
+        # Post/redirect/get: the feed is read once, by the GET
+        return redirect(url_for('customer.reviews'))
     
-    # Fetch all reviews with customer names
+    before = request.args.get('before', type=int)
     reviews_list = []
+    older = None
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT cr.review, u.F_name, u.L_name, cr.Customer_ID
-            FROM customer_review cr
-            JOIN user u ON cr.Customer_ID = u.ID
-            ORDER BY cr.Customer_ID DESC
-        """)
-        reviews_list = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        try:
+            # Newest first by Review_ID; the first page usually comes from memory
+            if before:
+                reviews_list, older = fetch_reviews_page(cursor, before)
+            else:
+                reviews_list, older = review_feed.first_page(cursor)
+        except Error as e:
+            print(f"Error fetching reviews: {e}")
+            flash("Error loading reviews", "error")
+        finally:
+            cursor.close()
+            connection.close()
     
-    return render_template('reviews.html', reviews=reviews_list)
+    return render_template('reviews.html', reviews=reviews_list, older=older)
 
 @customer_bp.route('/request_medicine', methods=['GET', 'POST'])
 def request_medicine():
@@ -368,33 +392,7 @@ def request_medicine():
     requests_list = []
     if connection:
         cursor = connection.cursor(dictionary=True)
-        
-        # First ensure the Status column exists
-        try:
-            cursor.execute("ALTER TABLE customer_request ADD COLUMN IF NOT EXISTS Status VARCHAR(20) DEFAULT 'Pending'")
-            connection.commit()
-        except:
-            pass  # Column might already exist
-        
-        try:
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status
-                FROM customer_request
-                WHERE Customer_ID = %s
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
-        except:
-            # If Status column still doesn't exist, add it and retry
-            cursor.execute("ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'")
-            connection.commit()
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status
-                FROM customer_request
-                WHERE Customer_ID = %s
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
+        cursor.execute(CUSTOMER_REQUESTS_QUERY, (session['user_id'],))
         requests_list = cursor.fetchall()
         cursor.close()
         connection.close()
@@ -493,184 +491,60 @@ def profile():
 
 @customer_bp.route('/all_notifications')
 def all_notifications():
-    """Show all customer notifications"""
+    """Show all customer notifications, including request reminders.
+
+    Reminders are written by the daily job in reminders.py, so this is one
+    indexed read; it does not change read state.
+    """
     if 'user_id' not in session or session['user_type'] != 'customer':
         flash('Please login as customer first!', 'error')
         return redirect(url_for('login'))
     
+    before = request.args.get('before', type=int)
     connection = get_db_connection()
     notifications = []
+    older = None
     
     if connection:
         cursor = connection.cursor(dictionary=True)
-        
-        # Create notifications based on requests and current date
         try:
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status 
-                FROM customer_request 
-                WHERE Customer_ID = %s 
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
-        except:
-            # If Status column doesn't exist, just get without it
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       'Pending' as Status 
-                FROM customer_request 
-                WHERE Customer_ID = %s 
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
-        requests = cursor.fetchall()
-        
-        today = date.today()
-        
-        for request in requests:
-            expected_date = request['Expected_date']
-            status = request.get('Status', 'Pending')
-            
-            # Add status-based notifications first
-            if status == 'Accepted':
-                notifications.append({
-                    'type': 'accepted',
-                    'title': 'Request Accepted',
-                    'message': f"Great! Your request for '{request['request_med_name']}' has been accepted by admin",
-                    'date': expected_date or today,
-                    'icon': 'fas fa-check-circle',
-                    'class': 'alert-success'
-                })
-            elif status == 'Declined':
-                notifications.append({
-                    'type': 'declined',
-                    'title': 'Request Declined',
-                    'message': f"Sorry, your request for '{request['request_med_name']}' has been declined",
-                    'date': expected_date or today,
-                    'icon': 'fas fa-times-circle',
-                    'class': 'alert-danger'
-                })
-            
-            # Add date-based notifications only for pending requests
-            if status == 'Pending' or not status:
-                if expected_date:
-                    days_diff = (expected_date - today).days
-                    
-                    if days_diff < 0:
-                        notifications.append({
-                            'type': 'overdue',
-                            'title': 'Request Overdue',
-                            'message': f"Your request for '{request['request_med_name']}' was expected on {expected_date.strftime('%B %d, %Y')}",
-                            'date': expected_date,
-                            'icon': 'fas fa-exclamation-triangle',
-                            'class': 'alert-danger'
-                        })
-                    elif days_diff == 0:
-                        notifications.append({
-                            'type': 'today',
-                            'title': 'Request Due Today',
-                            'message': f"Your request for '{request['request_med_name']}' is expected today",
-                            'date': expected_date,
-                            'icon': 'fas fa-bell',
-                            'class': 'alert-warning'
-                        })
-                    elif days_diff <= 3:
-                        notifications.append({
-                            'type': 'upcoming',
-                            'title': 'Request Due Soon',
-                            'message': f"Your request for '{request['request_med_name']}' is expected in {days_diff} day{'s' if days_diff > 1 else ''}",
-                            'date': expected_date,
-                            'icon': 'fas fa-info-circle',
-                            'class': 'alert-info'
-                        })
-        
-        # Add welcome notification for new users
-        cursor.execute("SELECT points FROM customer WHERE Customer_ID = %s", (session['user_id'],))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-    
-    # Sort notifications by date (newest first)
-    notifications.sort(key=lambda x: x['date'], reverse=True)
+            notifications, older = fetch_page(cursor, session['user_id'], before)
+        except Error as e:
+            print(f"Error fetching notifications: {e}")
+            flash("Error loading notifications", "error")
+        finally:
+            cursor.close()
+            connection.close()
     
-    return render_template('notifications.html', notifications=notifications)
+    return render_template('customer_notifications.html', notifications=notifications, older=older,
+                           page_endpoint='customer.all_notifications')
 
 # Cart Management Routes
 @customer_bp.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
-    """Add item to cart"""
+    """Add item to cart (price is taken from the medicine table, not the client)"""
     
     if 'user_id' not in session or session['user_type'] != 'customer':
         return jsonify({'success': False, 'message': 'Please login as customer first'})
     
+    data = request.get_json(silent=True) or {}
+    med_code = data.get('med_code')
     try:
-        data = request.json
-        
-        med_code = data.get('med_code')
-        med_name = data.get('med_name')
         quantity = int(data.get('quantity', 1))
-        price = float(data.get('price', 0))
-        customer_id = session['user_id']
-        
-        if not med_code or quantity <= 0:
-            return jsonify({'success': False, 'message': 'Invalid input data'})
-        
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'message': 'Database connection failed'})
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Check if medicine exists and has enough stock
-        cursor.execute("SELECT Stock FROM medicine WHERE Med_code = %s", (med_code,))
-        medicine = cursor.fetchone()
-        
-        if not medicine:
-            cursor.close()
-            connection.close()
-            return jsonify({'success': False, 'message': 'Medicine not found'})
-        
-        if medicine['Stock'] < quantity:
-            cursor.close()
-            connection.close()
-            return jsonify({'success': False, 'message': f'Only {medicine["Stock"]} units available'})
-        
-        # Check if item already exists in cart
-        cursor.execute("""
-            SELECT quantity FROM cart 
-            WHERE Customer_ID = %s AND Med_Code = %s
-        """, (customer_id, med_code))
-        
-        existing_item = cursor.fetchone()
-        
-        if existing_item:
-            # Update quantity
-            new_quantity = existing_item['quantity'] + quantity
-            new_total = new_quantity * price
-            cursor.execute("""
-                UPDATE cart 
-                SET quantity = %s, total_price = %s
-                WHERE Customer_ID = %s AND Med_Code = %s
-            """, (new_quantity, new_total, customer_id, med_code))
-        else:
-            # Add new item to cart
-            total_price = quantity * price
-            cursor.execute("""
-                INSERT INTO cart (Customer_ID, Med_Code, quantity, total_price) 
-                VALUES (%s, %s, %s, %s)
-            """, (customer_id, med_code, quantity, total_price))
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        
+    except (TypeError, ValueError):
+        quantity = 0
+    
+    if not med_code or quantity <= 0:
+        return jsonify({'success': False, 'message': 'Invalid input data'})
+    
+    try:
+        # Changes the cached cart now; the row is written behind the request
+        cart_cache.add(session['user_id'], med_code, quantity)
         return jsonify({'success': True, 'message': 'Item added to cart successfully'})
-        
-    except Exception as e:
+    except CartError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Error as e:
         print(f"Error adding to cart: {e}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
 @customer_bp.route('/cart')
@@ -679,35 +553,23 @@ def view_cart():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = get_db_connection()
-    if not connection:
-        flash("Database connection failed", "error")
-        return redirect(url_for('customer.dashboard'))
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT c.Cart_ID, c.Med_Code, c.quantity, c.total_price,
-                   m.Name as Med_Name, m.Price as unit_price
-            FROM cart c 
-            JOIN medicine m ON c.Med_Code = m.Med_Code
-            WHERE c.Customer_ID = %s
-            ORDER BY c.Cart_ID DESC
-        """, (session['user_id'],))
-        cart_items = cursor.fetchall()
-        
-        # Calculate total cart value
-        total_cart_value = sum(item['total_price'] for item in cart_items)
-        
+        # Lines and total come from the cart cache
+        cart_items, total_cart_value = cart_cache.view(session['user_id'])
         return render_template('cart.html', cart_items=cart_items, total_cart_value=total_cart_value)
         
-    except Exception as e:
+    except Error as e:
         print(f"Error fetching cart: {e}")
         flash("Error loading cart", "error")
         return redirect(url_for('customer.dashboard'))
-    finally:
-        cursor.close()
-        connection.close()
+
+def _cart_line_code(data):
+    """Med_Code from a cart request; older pages send the table's cart_id"""
+    if data.get('med_code'):
+        return str(data['med_code'])
+    if data.get('cart_id'):
+        return cart_cache.code_for(session['user_id'], data['cart_id'])
+    return None
 
 @customer_bp.route('/update_cart_quantity', methods=['POST'])
 def update_cart_quantity():
@@ -715,55 +577,71 @@ def update_cart_quantity():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not logged in'})
     
-    data = request.get_json()
-    cart_id = data.get('cart_id')
-    new_quantity = data.get('quantity')
+    data = request.get_json(silent=True) or {}
+    try:
+        new_quantity = int(data.get('quantity'))
+    except (TypeError, ValueError):
+        new_quantity = 0
     
-    if not cart_id or not new_quantity or int(new_quantity) < 1:
+    if new_quantity < 1:
         return jsonify({'success': False, 'message': 'Invalid quantity'})
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'success': False, 'message': 'Database connection failed'})
-    
     try:
-        cursor = connection.cursor()
-        
-        # Get current item details to calculate new total
-        cursor.execute("""
-            SELECT c.Med_Code, m.Price 
-            FROM cart c 
-            JOIN medicine m ON c.Med_Code = m.Med_Code 
-            WHERE c.Cart_ID = %s
-        """, (cart_id,))
-        
-        item = cursor.fetchone()
-        if not item:
+        med_code = _cart_line_code(data)
+        item_total = cart_cache.set_quantity(session['user_id'], med_code, new_quantity) if med_code else None
+        if item_total is None:
             return jsonify({'success': False, 'message': 'Item not found'})
-        
-        new_total = int(new_quantity) * item[1]  # quantity * unit price
-        
-        # Update the quantity and total
-        cursor.execute("""
-            UPDATE cart 
-            SET quantity = %s, total_price = %s
-            WHERE Cart_ID = %s AND Customer_ID = %s
-        """, (new_quantity, new_total, cart_id, session['user_id']))
-        
-        connection.commit()
+        _, cart_total = cart_cache.view(session['user_id'])
         
         return jsonify({
             'success': True, 
-            'new_quantity': int(new_quantity),
-            'item_total': float(new_total)
+            'new_quantity': new_quantity,
+            'item_total': float(item_total),
+            'cart_total': float(cart_total)
         })
         
-    except Exception as e:
+    except CartError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Error as e:
         print(f"Error updating cart: {e}")
         return jsonify({'success': False, 'message': 'Error updating cart'})
-    finally:
-        cursor.close()
-        connection.close()
+
+@customer_bp.route('/cart/batch', methods=['POST'])
+def update_cart_batch():
+    """Apply many quantity changes in one request (and one table transaction).
+
+    Body: {"items": [{"med_code": "MED001", "quantity": 3}, ...]}; quantity 0
+    removes the line. Returns a status per medicine code.
+    """
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Please login as customer first'})
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'No items given'})
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'success': False, 'message': f'At most {MAX_BATCH_ITEMS} items per batch'})
+    
+    changes = []
+    for item in items:
+        try:
+            med_code = str(item['med_code'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Each item needs med_code and quantity'})
+        if quantity < 0:
+            return jsonify({'success': False, 'message': f'Invalid quantity for {med_code}'})
+        changes.append((med_code, quantity))
+    
+    try:
+        # Applied to the cached cart; written to the table in one transaction by the flusher
+        results = cart_cache.apply(session['user_id'], changes)
+        _, cart_total = cart_cache.view(session['user_id'])
+        return jsonify({'success': True, 'results': results, 'cart_total': float(cart_total)})
+    except Error as e:
+        print(f"Error updating cart batch: {e}")
+        return jsonify({'success': False, 'message': 'Error updating cart'})
 
 @customer_bp.route('/remove_from_cart', methods=['POST'])
 def remove_from_cart():
@@ -771,35 +649,21 @@ def remove_from_cart():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not logged in'})
     
-    data = request.get_json()
-    cart_id = data.get('cart_id')
-    
-    if not cart_id:
-        return jsonify({'success': False, 'message': 'Invalid item'})
-    
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'success': False, 'message': 'Database connection failed'})
+    data = request.get_json(silent=True) or {}
     
     try:
-        cursor = connection.cursor()
+        med_code = _cart_line_code(data)
+        if not med_code:
+            return jsonify({'success': False, 'message': 'Invalid item'})
         
         # Remove the item
-        cursor.execute("""
-            DELETE FROM cart 
-            WHERE Cart_ID = %s AND Customer_ID = %s
-        """, (cart_id, session['user_id']))
-        
-        connection.commit()
+        cart_cache.set_quantity(session['user_id'], med_code, 0)
         
         return jsonify({'success': True, 'message': 'Item removed from cart'})
         
-    except Exception as e:
+    except (CartError, Error) as e:
         print(f"Error removing from cart: {e}")
         return jsonify({'success': False, 'message': 'Error removing item'})
-    finally:
-        cursor.close()
-        connection.close()
 
 @customer_bp.route('/proceed_checkout')
 def proceed_checkout():
@@ -815,65 +679,26 @@ def payment_page():
         flash("Please login first", "error")
         return redirect(url_for('login'))
     
-    connection = get_db_connection()
-    if not connection:
-        # Fallback test data if database fails
-        cart_items = [
-            {
-                'name': 'Sample Medicine',
-                'quantity': 1,
-                'unit_price': 20.00,
-                'total': 20.00
-            }
-        ]
-        total_amount = 20.00
-    else:
-        try:
-            cursor = connection.cursor(dictionary=True)
-            # Get cart items for the user - same query as cart view
-            cursor.execute("""
-                SELECT c.Cart_ID, c.Med_Code, c.quantity, c.total_price,
-                       m.Name as Med_Name, m.Price as unit_price
-                FROM cart c 
-                JOIN medicine m ON c.Med_Code = m.Med_Code
-                WHERE c.Customer_ID = %s
-                ORDER BY c.Cart_ID DESC
-            """, (session['user_id'],))
-            
-            cart_results = cursor.fetchall()
-            
-            cart_items = []
-            total_amount = 0
-            
-            for item in cart_results:
-                cart_items.append({
-                    'name': item['Med_Name'],
-                    'quantity': item['quantity'], 
-                    'unit_price': float(item['unit_price']),
-                    'total': float(item['total_price'])
-                })
-                total_amount += float(item['total_price'])
-            
-            cursor.close()
-            connection.close()
-            
-            print(f"DEBUG: Loaded {len(cart_items)} items from database")
-            
-        except Exception as e:
-            print(f"Database error in payment_page: {e}")
-            # Fallback data
-            cart_items = [
-                {
-                    'name': 'Sample Medicine',
-                    'quantity': 1,
-                    'unit_price': 20.00,
-                    'total': 20.00
-                }
-            ]
-            total_amount = 20.00
+    try:
+        # Same cached lines and total as the cart page
+        lines, total_amount = cart_cache.view(session['user_id'])
+    except Error as e:
+        print(f"Database error in payment_page: {e}")
+        flash("Could not load your cart, please try again", "error")
+        return redirect(url_for('customer.view_cart'))
+    
+    if not lines:
+        flash("Your cart is empty", "error")
+        return redirect(url_for('customer.view_cart'))
+    
+    cart_items = [{
+        'name': line['Med_Name'],
+        'quantity': line['quantity'],
+        'unit_price': line['unit_price'],
+        'total': line['total_price']
+    } for line in lines]
     
     try:
-        print("DEBUG: Attempting to render payment_page.html")
         return render_template('payment_page.html', 
                              cart_items=cart_items, 
                              total_amount=total_amount)
@@ -895,92 +720,47 @@ def process_payment():
         flash("Please select a payment method", "error")
         return redirect(url_for('customer.payment_page'))
     
+    customer_id = str(session['user_id'])
+    
+    # The order is built from the cart table, so write any pending cart changes first
+    if not cart_cache.flush(customer_id):
+        flash("Could not save your cart, please try again", "error")
+        return redirect(url_for('customer.view_cart'))
+    
     connection = get_db_connection()
     if not connection:
         flash("Database connection failed", "error")
         return redirect(url_for('customer.payment_page'))
     
     try:
-        cursor = connection.cursor()
-        
-        print(f"DEBUG: Processing payment for user {session['user_id']}")
-        print(f"DEBUG: Payment method selected: {payment_type}")
-        
-        # Calculate total from cart using same method as cart view
-        cursor.execute("""
-            SELECT SUM(c.total_price) as total
-            FROM cart c 
-            WHERE c.Customer_ID = %s
-        """, (session['user_id'],))
-        
-        result = cursor.fetchone()
-        total_amount = result[0] if result and result[0] else 0
-        
-        if total_amount <= 0:
-            flash("Cart is empty", "error")
-            return redirect(url_for('customer.dashboard'))
+        # Time-ordered unique ID, no collision check needed
+        payment_id = next_payment_id()
         
-        # Generate unique payment ID
-        payment_id = 'PAY' + ''.join(random.choices(string.digits, k=6))
+        # Payment, order items, points, stock and cart all change in one transaction
+        order = place_order(connection, customer_id, str(payment_type), payment_id)
         
-        # Save payment record to existing payment table
+        # Keep the cached catalog's stock in step
+        refresh_medicines(connection, order['med_codes'])
+        # The cart table is now empty; the next read reloads it
+        cart_cache.discard(customer_id)
         
-        try:
-            # First check if payment_id already exists
-            cursor.execute("SELECT COUNT(*) FROM payment WHERE payment_id = %s", (payment_id,))
-            if cursor.fetchone()[0] > 0:
-                # Generate a new payment ID if collision
-                payment_id = 'PAY' + ''.join(random.choices(string.digits, k=8))
-            
-            # Convert values to ensure proper types
-            customer_id_str = str(session['user_id'])
-            total_amount_decimal = float(total_amount)
-            payment_type_str = str(payment_type)
-            
-            cursor.execute("""
-                INSERT INTO payment (payment_id, Customer_ID, amount, payment_type, DeliveryMan_ID)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (payment_id, customer_id_str, total_amount_decimal, payment_type_str, None))
-            
-        except Exception as insert_error:
-            raise insert_error
-        
-        # Award points for successful purchase
-        # Points calculation: 1 point for every 10 BDT spent (rounded down)
-        points_earned = int(total_amount_decimal // 10)
-        
-        if points_earned > 0:
-            print(f"DEBUG: Awarding {points_earned} points for purchase of ৳{total_amount_decimal}")
-            
-            # Add points to customer's account
-            cursor.execute("""
-                UPDATE customer 
-                SET points = points + %s 
-                WHERE Customer_ID = %s
-            """, (points_earned, customer_id_str))
-            
-            # Log the points transaction
-            cursor.execute("""
-                INSERT INTO points_history (customer_id, points_earned, transaction_type, payment_id, description, created_at)
-                VALUES (%s, %s, 'earned', %s, %s, NOW())
-            """, (customer_id_str, points_earned, payment_id, f"Purchase reward: {points_earned} points for ৳{total_amount_decimal} purchase"))
-            
-            # Update the flash message to include points earned
-            flash(f"Payment successful! Payment ID: {payment_id}. You earned {points_earned} points!", "success")
+        if order['points_earned'] > 0:
+            flash(f"Payment successful! Payment ID: {payment_id}. You earned {order['points_earned']} points!", "success")
         else:
             flash(f"Payment successful! Payment ID: {payment_id}", "success")
         
-        # Clear cart after successful payment
-        cursor.execute("DELETE FROM cart WHERE Customer_ID = %s", (session['user_id'],))
-        
-        connection.commit()
-        
         return redirect(url_for('customer.dashboard'))
         
+    except EmptyCartError:
+        flash("Cart is empty", "error")
+        return redirect(url_for('customer.dashboard'))
+    except OutOfStockError as e:
+        flash(f"Payment failed. {e}", "error")
+        return redirect(url_for('customer.view_cart'))
     except Exception as e:
+        print(f"Error processing payment: {e}")
         connection.rollback()
         flash("Payment failed. Please try again.", "error")
         return redirect(url_for('customer.payment_page'))
     finally:
-        cursor.close()
-        connection.close()
\ No newline at end of file
+        connection.close()
@@ -0,0 +1,232 @@
+import os
+import time
+import threading
+from collections import deque
+
+import mysql.connector
+from mysql.connector import Error
+from flask import g, has_app_context
+
+from instrumentation import InstrumentedCursor
+
+# Database configuration (override with DRUGWEB_DB_* environment variables)
+DB_CONFIG = {
+    'host': os.environ.get('DRUGWEB_DB_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('DRUGWEB_DB_PORT', 3306)),
+    'database': os.environ.get('DRUGWEB_DB_NAME', 'drugweb'),
+    'user': os.environ.get('DRUGWEB_DB_USER', 'root'),
+    'password': os.environ.get('DRUGWEB_DB_PASSWORD', '')  # Add your MySQL password here
+}
+
+# Connection pool configuration
+POOL_CONFIG = {
+    'size': int(os.environ.get('DRUGWEB_POOL_SIZE', 10)),
+    'timeout': float(os.environ.get('DRUGWEB_POOL_TIMEOUT', 5)),  # seconds to wait for a free connection
+    'ping_interval': float(os.environ.get('DRUGWEB_POOL_PING_INTERVAL', 30))  # skip health check if used recently
+}
+
+
+class PooledConnection:
+    """Wrapper handed out by the pool.
+
+    Behaves like a normal mysql connection, but close() gives the connection
+    back to the pool instead of dropping it. While a request is running the
+    connection belongs to the request, so close() does nothing and the
+    connection is returned on app context teardown.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._request_scoped = False
+        self.last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        # Every statement is timed and counted (see instrumentation.py)
+        return InstrumentedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if not self._request_scoped:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections"""
+
+    def __init__(self, config, size=10, timeout=5, ping_interval=30):
+        self.config = dict(config)
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = deque()
+        self._created = 0
+        self._lock = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'reconnects': 0
+        }
+
+    def _connect(self):
+        return PooledConnection(self, mysql.connector.connect(**self.config))
+
+    def acquire(self):
+        """Borrow a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        started = None
+        with self._lock:
+            while not self._idle and self._created >= self.size:
+                if started is None:
+                    started = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['wait_time'] += time.monotonic() - started
+                    raise Error(msg="Timed out waiting for a database connection")
+                self._lock.wait(remaining)
+
+            if started is not None:
+                self._stats['wait_time'] += time.monotonic() - started
+            self._stats['checkouts'] += 1
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                # Reserve the slot before connecting outside the lock
+                self._created += 1
+                conn = None
+
+        if conn is None:
+            try:
+                return self._connect()
+            except Error:
+                self._discard()
+                raise
+
+        return self._check_health(conn)
+
+    def _check_health(self, conn):
+        """Ping connections that have been idle for a while before handing them out"""
+        if time.monotonic() - conn.last_used < self.ping_interval:
+            return conn
+        try:
+            conn._raw.ping(reconnect=True, attempts=1, delay=0)
+            return conn
+        except Error:
+            with self._lock:
+                self._stats['reconnects'] += 1
+            try:
+                conn._raw.close()
+            except Error:
+                pass
+            try:
+                return self._connect()
+            except Error:
+                self._discard()
+                raise
+
+    def _discard(self):
+        with self._lock:
+            self._created -= 1
+            self._lock.notify()
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        conn._request_scoped = False
+        try:
+            if conn._raw.in_transaction:
+                conn._raw.rollback()
+        except Error:
+            try:
+                conn._raw.close()
+            except Error:
+                pass
+            self._discard()
+            return
+
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+            self._lock.notify()
+
+    def stats(self):
+        """Snapshot of pool metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._created - len(self._idle)
+        stats['wait_time'] = round(stats['wait_time'], 6)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+    return _pool
+
+
+def init_db():
+    """Create the database if it does not exist. Run once at startup."""
+    config = dict(DB_CONFIG)
+    database = config.pop('database')
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        cursor.close()
+        connection.close()
+        return True
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        print("Please ensure MySQL server is running and accessible")
+        return False
+
+
+def get_db_connection():
+    """Return a pooled database connection.
+
+    Inside a request the same connection is reused for the whole request and
+    returned to the pool on teardown. Outside a request the caller must call
+    close() to give it back.
+    """
+    if has_app_context() and 'db_connection' in g:
+        return g.db_connection
+
+    try:
+        connection = get_pool().acquire()
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+    if has_app_context():
+        connection._request_scoped = True
+        g.db_connection = connection
+    return connection
+
+
+def release_db_connection(exception=None):
+    """Teardown handler that hands the request's connection back to the pool"""
+    connection = g.pop('db_connection', None)
+    if connection is not None:
+        get_pool().release(connection)
+
+
+def init_app(app):
+    """Register pool teardown on the Flask app and prepare the database"""
+    app.teardown_appcontext(release_db_connection)
+    init_db()
@@ -1,67 +1,97 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
-from mysql.connector import Error
 from datetime import datetime
 
+from db import get_db_connection
+from notifications import notify
+from events import publish_notifications
+
 # Create deliveryman blueprint
 deliveryman_bp = Blueprint('deliveryman', __name__, url_prefix='/deliveryman')
 
-# Database configuration
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''
-}
+# Statuses still needing the courier's attention; the dashboard shows only these
+ACTIVE_STATUSES = ['Assigned', 'Accepted for Delivery']
+
+HISTORY_PAGE_SIZE = 20
+
+# Both queries range over idx_payment_deliveryman_status_created, so completed
+# deliveries never enter the active queue's scan
+PAYMENT_COLUMNS = """
+    SELECT p.payment_id as Payment_ID, p.Customer_ID, p.amount as Total_Amount, 
+           p.payment_type, p.DeliveryMan_ID,
+           CONCAT(u.F_name, ' ', u.L_name) as Customer_name,
+           u.email as Customer_email, u.phone as Customer_phone, 
+           u.address as Customer_address,
+           p.status as Status,
+           p.created_at as Payment_date, p.delivery_date
+    FROM payment p
+    JOIN user u ON p.Customer_ID = u.ID
+"""
+
+
+def active_queue_query(deliveryman_id, statuses=ACTIVE_STATUSES):
+    """(sql, params) for fetch_active_queue(); migrations.ROUTE_QUERIES checks the same SQL"""
+    placeholders = ', '.join(['%s'] * len(statuses))
+    return f"""
+        {PAYMENT_COLUMNS}
+        WHERE p.DeliveryMan_ID = %s AND p.status IN ({placeholders})
+        ORDER BY p.created_at, p.payment_id
+    """, [deliveryman_id] + list(statuses)
+
+
+def history_page_query(deliveryman_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """(sql, params) for fetch_history_page()"""
+    conditions = ["p.DeliveryMan_ID = %s", "p.status = 'Delivered'"]
+    params = [deliveryman_id]
+    if before:
+        conditions.append("(p.created_at < %s OR (p.created_at = %s AND p.payment_id < %s))")
+        params += [before[0], before[0], before[1]]
+    return f"""
+        {PAYMENT_COLUMNS}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY p.created_at DESC, p.payment_id DESC
+        LIMIT %s
+    """, params + [limit + 1]
+
+
+def fetch_active_queue(cursor, deliveryman_id, statuses=ACTIVE_STATUSES):
+    """The courier's payments in the given active statuses, oldest first"""
+    cursor.execute(*active_queue_query(deliveryman_id, statuses))
+    return cursor.fetchall()
+
+
+def fetch_history_page(cursor, deliveryman_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """One page of delivered payments, newest first.
+
+    `before` is the (created_at, payment_id) of the last row already shown.
+    Returns (payments, older) where older is the key for the next page, or
+    None on the last page.
+    """
+    cursor.execute(*history_page_query(deliveryman_id, before, limit))
+    rows = cursor.fetchall()
+    older = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        older = (last['Payment_date'], last['Payment_ID'])
+    return rows[:limit], older
 
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
 
 @deliveryman_bp.route('/dashboard')
 def dashboard():
-    """Deliveryman dashboard"""
+    """Deliveryman work queue: active deliveries only"""
     if 'user_id' not in session or session['user_type'] != 'deliveryman':
         flash('Please login as delivery man first!', 'error')
         return redirect(url_for('login'))
     
     deliveryman_id = session['user_id']
+    status = request.args.get('status', '')
+    statuses = [status] if status in ACTIVE_STATUSES else ACTIVE_STATUSES
     connection = get_db_connection()
     assigned_payments = []
     
     if connection:
         try:
             cursor = connection.cursor(dictionary=True)
-            
-            # Get all payments assigned to this delivery man (including reassigned ones)
-            cursor.execute("""
-                SELECT p.payment_id as Payment_ID, p.Customer_ID, p.amount as Total_Amount, 
-                       p.payment_type, p.DeliveryMan_ID,
-                       CONCAT(u.F_name, ' ', u.L_name) as Customer_name,
-                       u.email as Customer_email, u.phone as Customer_phone, 
-                       u.address as Customer_address,
-                       COALESCE(p.status, 'Assigned') as Status,
-                       p.created_at as Payment_date, p.delivery_date
-                FROM payment p
-                JOIN customer c ON p.Customer_ID = c.Customer_ID
-                JOIN user u ON c.Customer_ID = u.ID
-                WHERE p.DeliveryMan_ID = %s
-                ORDER BY p.created_at DESC
-            """, (deliveryman_id,))
-            
-            assigned_payments = cursor.fetchall()
+            assigned_payments = fetch_active_queue(cursor, deliveryman_id, statuses)
             
         except Exception as e:
             print(f"Error fetching assigned payments: {e}")
@@ -70,9 +100,45 @@ def dashboard():
             connection.close()
     
     return render_template('deliveryman_dashboard.html', 
-                         assigned_payments=assigned_payments)
+                         assigned_payments=assigned_payments,
+                         statuses=ACTIVE_STATUSES,
+                         status=status if status in ACTIVE_STATUSES else '')
 
 
+@deliveryman_bp.route('/history')
+def history():
+    """Completed deliveries, a page at a time"""
+    if 'user_id' not in session or session['user_type'] != 'deliveryman':
+        flash('Please login as delivery man first!', 'error')
+        return redirect(url_for('login'))
+    
+    deliveryman_id = session['user_id']
+    before = None
+    try:
+        if request.args.get('before') and request.args.get('before_id'):
+            before = (datetime.strptime(request.args['before'], '%Y-%m-%d %H:%M:%S'), request.args['before_id'])
+    except ValueError:
+        pass
+    
+    connection = get_db_connection()
+    delivered_payments = []
+    older = None
+    
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            delivered_payments, older = fetch_history_page(cursor, deliveryman_id, before)
+            
+        except Exception as e:
+            print(f"Error fetching delivery history: {e}")
+            flash("Error loading delivery history", "error")
+        finally:
+            connection.close()
+    
+    return render_template('deliveryman_history.html',
+                         delivered_payments=delivered_payments,
+                         older=older)
+
 
 @deliveryman_bp.route('/handle_delivery', methods=['POST'])
 def handle_delivery():
@@ -121,10 +187,7 @@ def handle_delivery():
             
             # Add notification for customer
             notification_message = f"Great news! Your order (Payment #{payment_id}) has been accepted by our delivery partner and will be delivered on {delivery_date}."
-            cursor.execute("""
-                INSERT INTO notifications (customer_id, message, type, created_at)
-                VALUES (%s, %s, 'delivery_accepted', NOW())
-            """, (payment['Customer_ID'], notification_message))
+            event = notify(cursor, payment['Customer_ID'], notification_message, 'delivery_accepted')
             
             message = f"Order #{payment_id} accepted for delivery on {delivery_date}. Customer has been notified."
             
@@ -138,10 +201,7 @@ def handle_delivery():
             
             # Add notification for customer
             notification_message = f"We apologize, but your order (Payment #{payment_id}) needs to be reassigned to a different delivery partner. Our admin will assign it shortly."
-            cursor.execute("""
-                INSERT INTO notifications (customer_id, message, type, created_at)
-                VALUES (%s, %s, 'delivery_declined', NOW())
-            """, (payment['Customer_ID'], notification_message))
+            event = notify(cursor, payment['Customer_ID'], notification_message, 'delivery_declined')
             
             message = f"Order #{payment_id} declined and made available for reassignment. Customer has been notified."
 
@@ -156,15 +216,13 @@ def handle_delivery():
             
             # Add notification for customer
             notification_message = f"Your order (Payment #{payment_id}) has been successfully delivered. Thank you for shopping with DrugWeb!"
-            cursor.execute("""
-                INSERT INTO notifications (customer_id, message, type, created_at)
-                VALUES (%s, %s, 'delivery_completed', NOW())
-            """, (payment['Customer_ID'], notification_message))
+            event = notify(cursor, payment['Customer_ID'], notification_message, 'delivery_completed')
             
             message = f"Order #{payment_id} marked as Delivered successfully!"
         # ----------------------------------------
         
         connection.commit()
+        publish_notifications([event])
         return jsonify({'success': True, 'message': message})
         
     except Exception as e:
@@ -0,0 +1,114 @@
+"""In-process pub/sub bus for pushing notifications to connected customers.
+
+Routes publish after they commit; each open /customer/events stream holds a
+small queue subscribed to its customer's channel, so delivering an event
+costs no database reads. The bus lives in one process: run the app as a
+single async worker (see serve.py) so every stream shares it.
+"""
+import json
+import queue
+import threading
+from datetime import datetime
+
+# Events buffered per stream before a slow client starts dropping them; it
+# catches up from the notification_id cursor when it reconnects
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+
+class EventBus:
+    """Channels keyed by customer ID, each with any number of subscriber queues"""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, channel):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def publish(self, channel, event):
+        """Hand an event to every subscriber of the channel without blocking"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self._stats['published'] += 1
+        delivered = dropped = 0
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+                delivered += 1
+            except queue.Full:
+                dropped += 1
+        with self._lock:
+            self._stats['delivered'] += delivered
+            self._stats['dropped'] += dropped
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['channels'] = len(self._channels)
+            stats['subscribers'] = sum(len(s) for s in self._channels.values())
+        return stats
+
+
+bus = EventBus()
+
+
+def notification_channel(customer_id):
+    return f"notifications:{customer_id}"
+
+
+def publish_notifications(events):
+    """Publish the events returned by notifications.notify(), after commit"""
+    for event in events:
+        bus.publish(notification_channel(event['customer_id']), event)
+
+
+def format_sse(event_type, data, event_id=None):
+    """One Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=_json_default)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+def notification_stream(customer_id, subscriber, since=0):
+    """Yield SSE frames for a subscribed customer until the client goes away"""
+    channel = notification_channel(customer_id)
+    try:
+        while True:
+            try:
+                event = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            # The catch-up read may already have sent it
+            if event['notification_id'] <= since:
+                continue
+            since = event['notification_id']
+            payload = {key: value for key, value in event.items() if key != 'customer_id'}
+            yield format_sse('notification', payload, since)
+    finally:
+        bus.unsubscribe(channel, subscriber)
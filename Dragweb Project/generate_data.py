@@ -0,0 +1,526 @@
+"""Fill all eleven tables with synthetic data for load and scale testing.
+
+    python generate_data.py --customers 10000 --medicines 5000
+    python generate_data.py --customers 1000000 --payments 3000000 --notifications 5000000 \\
+                            --load-data --fast
+    python generate_data.py --reset          # remove generated rows only
+
+Generated rows use their own ID prefixes (GC customers, GD delivery men,
+GA admins, GM medicines, GP payments), so they never collide with real or
+/setup_db data and --reset removes exactly them. Every generated user can
+log in with the password PASSWORD and the email <id>@gen.test.
+
+Activity is skewed with a Zipf distribution (--skew, 0 for uniform): low
+numbered medicines are the hot SKUs and low numbered customers the heavy
+buyers, so GM000001 and GC0000001 see the most traffic.
+
+Rows go in with executemany(), which mysql.connector sends as multi-row
+INSERTs, committed every --batch-size rows. --load-data streams each chunk
+to a tab-separated file and loads it with LOAD DATA LOCAL INFILE instead
+(the server needs local_infile=ON). --fast turns off foreign key and unique
+checks for the session; rows are generated with valid references either
+way, and an orphan check runs at the end unless --skip-verify.
+
+customer.points is set from the generated points_history and
+customer.unread_notifications from the generated notifications, so the
+ledger reconciles and the unread counters are right.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from bisect import bisect
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+import mysql.connector
+from mysql.connector import Error
+
+from db import DB_CONFIG, init_db
+from migrations import run_migrations
+from passwords import hash_password
+
+PASSWORD = 'loadtest123'
+EMAIL_DOMAIN = 'gen.test'
+
+CATEGORIES = ['Pain Relief', 'Antibiotic', 'Gastric', 'Allergy', 'Diabetes', 'Cardiac', 'Respiratory', 'General']
+STEMS = ['para', 'amox', 'omep', 'ceti', 'metfor', 'ator', 'losar', 'azith', 'ibupro', 'napro']
+SUFFIXES = ['cetamol', 'icillin', 'razole', 'rizine', 'min', 'vastatin', 'tan', 'romycin', 'fen', 'floxacin']
+BRANDS = ['Napa', 'Seclo', 'Ace', 'Fexo', 'Maxpro', 'Tufnil', 'Monas', 'Losectil', 'Zimax', 'Rolac']
+AREAS = ['Gulshan', 'Banani', 'Dhanmondi', 'Mirpur', 'Uttara', 'Mohakhali', 'Badda', 'Motijheel']
+FIRST_NAMES = ['Rahim', 'Karim', 'Ayesha', 'Nusrat', 'Tanvir', 'Farhana', 'Sajid', 'Mitu', 'Rafi', 'Sumaiya']
+LAST_NAMES = ['Ahmed', 'Hossain', 'Islam', 'Rahman', 'Khan', 'Chowdhury', 'Akter', 'Sarkar']
+PAYMENT_TYPES = ['Cash on Delivery', 'bKash', 'Nagad', 'Card']
+PAYMENT_STATUSES = ['Pending Assignment', 'Assigned', 'Accepted for Delivery', 'Delivered']
+REQUEST_STATUSES = ['Pending', 'Pending', 'Accepted', 'Declined']
+REVIEWS = ['Fast delivery, well packed.', 'Good prices and genuine medicines.', 'Courier was late by a day.',
+           'Easy to find what I needed.', 'Great service, will order again.', 'Wrong item once, fixed quickly.']
+
+# Columns written per table, in row-tuple order
+COLUMNS = {
+    'user': ('ID', 'F_name', 'L_name', 'email', 'password', 'address', 'phone'),
+    'customer': ('Customer_ID', 'points'),
+    'admin': ('Admin_ID',),
+    'deliveryman': ('DeliveryMan_ID', 'Name', 'Phone', 'Email', 'Area'),
+    'medicine': ('Med_Code', 'Name', 'Generic_name', 'Category', 'Price', 'Stock'),
+    'cart': ('Customer_ID', 'Med_Code', 'Med_Name', 'Quantity', 'Price', 'total_price'),
+    'payment': ('payment_id', 'Customer_ID', 'amount', 'payment_type', 'DeliveryMan_ID', 'status',
+                'delivery_date', 'created_at'),
+    'order_items': ('payment_id', 'Med_Code', 'Med_Name', 'Quantity', 'unit_price', 'total_price'),
+    'points_history': ('customer_id', 'points_earned', 'transaction_type', 'payment_id', 'description',
+                       'created_at'),
+    'notifications': ('customer_id', 'message', 'type', 'is_read', 'created_at'),
+    'customer_request': ('Customer_ID', 'request_med_name', 'Expected_date', 'Status'),
+    'customer_review': ('Customer_ID', 'review')
+}
+
+# Child -> parent references checked after generation: (child table, column, parent table, parent column)
+FOREIGN_KEYS = [
+    ('customer', 'Customer_ID', 'user', 'ID'),
+    ('admin', 'Admin_ID', 'user', 'ID'),
+    ('deliveryman', 'DeliveryMan_ID', 'user', 'ID'),
+    ('cart', 'Customer_ID', 'customer', 'Customer_ID'),
+    ('cart', 'Med_Code', 'medicine', 'Med_Code'),
+    ('payment', 'Customer_ID', 'customer', 'Customer_ID'),
+    ('payment', 'DeliveryMan_ID', 'deliveryman', 'DeliveryMan_ID'),
+    ('order_items', 'payment_id', 'payment', 'payment_id'),
+    ('order_items', 'Med_Code', 'medicine', 'Med_Code'),
+    ('points_history', 'customer_id', 'customer', 'Customer_ID'),
+    ('notifications', 'customer_id', 'customer', 'Customer_ID'),
+    ('customer_request', 'Customer_ID', 'customer', 'Customer_ID'),
+    ('customer_review', 'Customer_ID', 'customer', 'Customer_ID')
+]
+
+# Rows per LOAD DATA file
+LOAD_DATA_CHUNK = 200000
+
+
+def customer_id(n):
+    return f"GC{n:07d}"
+
+
+def deliveryman_id(n):
+    return f"GD{n:05d}"
+
+
+def admin_id(n):
+    return f"GA{n:03d}"
+
+
+def med_code(n):
+    return f"GM{n:06d}"
+
+
+def payment_id(n):
+    return f"GP{n:010d}"
+
+
+def email(user_id):
+    return f"{user_id.lower()}@{EMAIL_DOMAIN}"
+
+
+class Skewed:
+    """Draws 1..n with Zipf weights 1/k**s (uniform when s is 0)"""
+
+    def __init__(self, n, s, rng):
+        self.n = n
+        self.rng = rng
+        self.cum = list(accumulate(1 / k ** s for k in range(1, n + 1))) if s > 0 and n else None
+
+    def draw(self):
+        if self.cum is None:
+            return self.rng.randint(1, self.n)
+        return min(bisect(self.cum, self.rng.random() * self.cum[-1]) + 1, self.n)
+
+    def distinct(self, k):
+        """k different numbers, still favouring the hot end"""
+        k = min(k, self.n)
+        picked = set()
+        attempts = 0
+        while len(picked) < k:
+            # Very steep skews keep hitting the same few; fall back to uniform
+            picked.add(self.draw() if attempts < 20 * k else self.rng.randint(1, self.n))
+            attempts += 1
+        return picked
+
+
+class InsertSink:
+    """Writes row chunks with executemany() in --batch-size batches"""
+
+    def __init__(self, connection, batch_size):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.chunk_size = batch_size
+        self.counts = {}
+        self.seconds = {}
+
+    def write(self, table, rows):
+        if not rows:
+            return
+        started = time.perf_counter()
+        self._write(table, rows)
+        self.counts[table] = self.counts.get(table, 0) + len(rows)
+        self.seconds[table] = self.seconds.get(table, 0) + time.perf_counter() - started
+
+    def _write(self, table, rows):
+        columns = COLUMNS[table]
+        sql = (f"INSERT INTO `{table}` ({', '.join(columns)}) "
+               f"VALUES ({', '.join(['%s'] * len(columns))})")
+        cursor = self.connection.cursor()
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(sql, rows[start:start + self.batch_size])
+                self.connection.commit()
+        finally:
+            cursor.close()
+
+
+def tsv_field(value):
+    """One value in LOAD DATA's default format (tab separated, \\N for NULL)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+class LoadDataSink(InsertSink):
+    """Streams each chunk to a temporary file and loads it with LOAD DATA LOCAL INFILE"""
+
+    def __init__(self, connection, batch_size):
+        super().__init__(connection, batch_size)
+        self.chunk_size = max(batch_size, LOAD_DATA_CHUNK)
+
+    def _write(self, table, rows):
+        handle, path = tempfile.mkstemp(prefix=f'drugweb-{table}-', suffix='.tsv')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write('\t'.join(tsv_field(value) for value in row))
+                    f.write('\n')
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+                               f"({', '.join(COLUMNS[table])})", (path,))
+                self.connection.commit()
+            finally:
+                cursor.close()
+        finally:
+            os.unlink(path)
+
+
+class Generator:
+    """Builds one data set from a seed, so the same arguments give the same rows"""
+
+    def __init__(self, sink, args):
+        self.sink = sink
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.hot_medicines = Skewed(args.medicines, args.skew, self.rng)
+        self.heavy_customers = Skewed(args.customers, args.skew, self.rng)
+        self.medicines_by_n = {}
+        self.now = datetime.now().replace(microsecond=0)
+
+    def emit(self, table, rows):
+        """Write a row iterator in chunks, so large tables never sit in memory"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.sink.chunk_size:
+                self.sink.write(table, chunk)
+                chunk = []
+        self.sink.write(table, chunk)
+
+    def past(self):
+        return self.now - timedelta(minutes=self.rng.randint(0, self.args.history_days * 24 * 60))
+
+    def users(self):
+        args = self.args
+        rng = self.rng
+        password_hash = hash_password(PASSWORD)
+        ids = ([customer_id(n) for n in range(1, args.customers + 1)] +
+               [deliveryman_id(n) for n in range(1, args.deliverymen + 1)] +
+               [admin_id(n) for n in range(1, args.admins + 1)])
+        self.emit('user', ((user_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), email(user_id),
+                            password_hash, f"{rng.randint(1, 200)} Road {rng.randint(1, 30)}, {rng.choice(AREAS)}",
+                            f"01{rng.randint(300000000, 999999999)}") for user_id in ids))
+        # Balances and unread counters are derived at the end (see finish())
+        self.emit('customer', ((customer_id(n), 0) for n in range(1, args.customers + 1)))
+        self.emit('admin', ((admin_id(n),) for n in range(1, args.admins + 1)))
+        self.emit('deliveryman', ((deliveryman_id(n), f"Courier {deliveryman_id(n)}",
+                                   f"01{rng.randint(300000000, 999999999)}", email(deliveryman_id(n)),
+                                   rng.choice(AREAS)) for n in range(1, args.deliverymen + 1)))
+
+    def medicines(self):
+        rng = self.rng
+        hot = max(1, self.args.medicines // 100)
+        rows = []
+        for n in range(1, self.args.medicines + 1):
+            generic = rng.choice(STEMS) + rng.choice(SUFFIXES)
+            name = f"{rng.choice(BRANDS)} {generic.capitalize()} {rng.choice([5, 10, 20, 40, 250, 500])}"
+            # Hot SKUs are stocked deeper so load tests do not sell them out
+            stock = rng.randint(50, 5000) * (20 if n <= hot and self.args.skew else 1)
+            rows.append((med_code(n), name, generic.capitalize(), rng.choice(CATEGORIES),
+                         round(rng.uniform(1, 500), 2), stock))
+            self.medicines_by_n[n] = (rows[-1][0], name, rows[-1][4])
+        self.emit('medicine', rows)
+
+    def carts(self):
+        def rows():
+            for n in range(1, self.args.customers + 1):
+                # One line per medicine (uq_cart_customer_med)
+                for m in self.hot_medicines.distinct(self.rng.randint(0, self.args.cart_lines)):
+                    code, name, price = self.medicines_by_n[m]
+                    quantity = self.rng.randint(1, 3)
+                    yield (customer_id(n), code, name, quantity, price, round(price * quantity, 2))
+        self.emit('cart', rows())
+
+    def payments(self):
+        """Payments with their order_items and the points each one earned"""
+        args = self.args
+        rng = self.rng
+        payments, items, points = [], [], []
+        for n in range(1, args.payments + 1):
+            pid = payment_id(n)
+            cid = customer_id(self.heavy_customers.draw())
+            amount = 0
+            for m in self.hot_medicines.distinct(rng.randint(1, 4)):
+                code, name, price = self.medicines_by_n[m]
+                quantity = rng.randint(1, 3)
+                amount += price * quantity
+                items.append((pid, code, name, quantity, price, round(price * quantity, 2)))
+            amount = round(amount, 2)
+            status = rng.choice(PAYMENT_STATUSES)
+            if status == 'Pending Assignment' or not args.deliverymen:
+                status, courier = 'Pending Assignment', None
+            else:
+                courier = deliveryman_id(rng.randint(1, args.deliverymen))
+            created = self.past()
+            delivered = created.date() + timedelta(days=2) if status == 'Delivered' else None
+            payments.append((pid, cid, amount, rng.choice(PAYMENT_TYPES), courier, status, delivered, created))
+
+            # Same rule as orders.place_order()
+            earned = int(amount // 10)
+            if earned > 0:
+                points.append((cid, earned, 'earned', pid,
+                               f"Purchase reward: {earned} points for ৳{amount} purchase", created))
+
+            if len(payments) >= self.sink.chunk_size:
+                self._write_payments(payments, items, points)
+                payments, items, points = [], [], []
+        self._write_payments(payments, items, points)
+
+    def _write_payments(self, payments, items, points):
+        # Parents before children so foreign key checks pass chunk by chunk
+        self.sink.write('payment', payments)
+        self.sink.write('order_items', items)
+        self.sink.write('points_history', points)
+
+    def notifications(self):
+        rng = self.rng
+
+        def rows():
+            for _ in range(self.args.notifications):
+                kind = rng.random()
+                if kind < 0.6:
+                    message, notification_type = "Your order is on its way.", 'delivery_accepted'
+                elif kind < 0.85:
+                    message, notification_type = "Your order has been delivered.", 'delivery_completed'
+                else:
+                    message, notification_type = "Good news! Your medicine request has been accepted.", 'request_accepted'
+                yield (customer_id(self.heavy_customers.draw()), message, notification_type,
+                       rng.random() < 0.7, self.past())
+        self.emit('notifications', rows())
+
+    def requests(self):
+        rng = self.rng
+        today = self.now.date()
+
+        def rows():
+            for _ in range(self.args.requests):
+                generic = rng.choice(STEMS) + rng.choice(SUFFIXES)
+                yield (customer_id(self.heavy_customers.draw()), f"{generic.capitalize()} {rng.choice([10, 20, 500])}",
+                       today + timedelta(days=rng.randint(-14, 21)), rng.choice(REQUEST_STATUSES))
+        self.emit('customer_request', rows())
+
+    def reviews(self):
+        def rows():
+            for _ in range(self.args.reviews):
+                yield (customer_id(self.heavy_customers.draw()), self.rng.choice(REVIEWS))
+        self.emit('customer_review', rows())
+
+    def run(self):
+        self.users()
+        if self.args.medicines:
+            self.medicines()
+            self.carts()
+            if self.args.customers:
+                self.payments()
+        if self.args.customers:
+            self.notifications()
+            self.requests()
+            self.reviews()
+
+
+def finish(connection):
+    """Derive balances and unread counters from the generated rows"""
+    cursor = connection.cursor()
+    cursor.execute("""
+        UPDATE customer c
+        JOIN (
+            SELECT customer_id, SUM(points_earned) AS total
+            FROM points_history
+            WHERE customer_id LIKE 'GC%'
+            GROUP BY customer_id
+        ) t ON t.customer_id = c.Customer_ID
+        SET c.points = t.total
+    """)
+    cursor.execute("""
+        UPDATE customer c
+        JOIN (
+            SELECT customer_id, SUM(is_read = FALSE) AS unread
+            FROM notifications
+            WHERE customer_id LIKE 'GC%'
+            GROUP BY customer_id
+        ) t ON t.customer_id = c.Customer_ID
+        SET c.unread_notifications = t.unread
+    """)
+    connection.commit()
+    cursor.close()
+
+
+def verify(connection):
+    """Count rows whose foreign key has no parent. Returns {description: count} for failures."""
+    cursor = connection.cursor()
+    orphans = {}
+    for child, column, parent, parent_column in FOREIGN_KEYS:
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM `{child}` c
+            LEFT JOIN `{parent}` p ON p.{parent_column} = c.{column}
+            WHERE c.{column} IS NOT NULL AND p.{parent_column} IS NULL
+        """)
+        count = cursor.fetchone()[0]
+        if count:
+            orphans[f"{child}.{column} -> {parent}.{parent_column}"] = count
+    cursor.close()
+    return orphans
+
+
+def delete_in_batches(cursor, connection, sql, batch=50000):
+    """Run a single-table DELETE ... LIMIT until nothing is left, keeping transactions small"""
+    while True:
+        cursor.execute(f"{sql} LIMIT {batch}")
+        deleted = cursor.rowcount
+        connection.commit()
+        if deleted < batch:
+            return
+
+
+def reset(connection):
+    """Delete every generated row, children first"""
+    cursor = connection.cursor()
+    generated_payments = "SELECT payment_id FROM payment WHERE Customer_ID LIKE 'GC%' OR DeliveryMan_ID LIKE 'GD%'"
+    statements = [
+        "DELETE FROM order_items WHERE payment_id LIKE 'GP%'",
+        f"DELETE FROM order_items WHERE payment_id IN ({generated_payments})",
+        "DELETE FROM order_items WHERE Med_Code LIKE 'GM%'",
+        "DELETE FROM payment WHERE payment_id LIKE 'GP%'",
+        "DELETE FROM payment WHERE Customer_ID LIKE 'GC%' OR DeliveryMan_ID LIKE 'GD%'",
+        "DELETE FROM cart WHERE Customer_ID LIKE 'GC%'",
+        "DELETE FROM cart WHERE Med_Code LIKE 'GM%'",
+        "DELETE FROM points_history WHERE customer_id LIKE 'GC%'",
+        "DELETE FROM notifications WHERE customer_id LIKE 'GC%'",
+        "DELETE FROM customer_request WHERE Customer_ID LIKE 'GC%'",
+        "DELETE FROM customer_review WHERE Customer_ID LIKE 'GC%'",
+        "DELETE FROM points_snapshot WHERE customer_id LIKE 'GC%'",
+        "DELETE FROM medicine WHERE Med_Code LIKE 'GM%'",
+        "DELETE FROM customer WHERE Customer_ID LIKE 'GC%'",
+        "DELETE FROM deliveryman WHERE DeliveryMan_ID LIKE 'GD%'",
+        "DELETE FROM admin WHERE Admin_ID LIKE 'GA%'",
+        f"DELETE FROM user WHERE email LIKE '%@{EMAIL_DOMAIN}'"
+    ]
+    for sql in statements:
+        delete_in_batches(cursor, connection, sql)
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill DrugWeb with synthetic data')
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--deliverymen', type=int, default=20)
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--medicines', type=int, default=2000)
+    parser.add_argument('--cart-lines', type=int, default=3, help='most cart lines per customer')
+    parser.add_argument('--payments', type=int, default=5000)
+    parser.add_argument('--notifications', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000, help='customer medicine requests')
+    parser.add_argument('--reviews', type=int, default=5000)
+    parser.add_argument('--history-days', type=int, default=90, help='spread timestamps over this many days')
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='Zipf exponent for hot medicines and heavy customers (0 = uniform)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows per INSERT batch and commit')
+    parser.add_argument('--load-data', action='store_true', help='load chunks with LOAD DATA LOCAL INFILE')
+    parser.add_argument('--fast', action='store_true', help='disable foreign key and unique checks while loading')
+    parser.add_argument('--skip-verify', action='store_true', help='skip the orphan check at the end')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='remove generated rows and stop')
+    parser.add_argument('--no-reset', action='store_true', help='do not remove earlier generated rows first')
+    args = parser.parse_args()
+
+    if not init_db() or run_migrations() is None:
+        sys.exit(1)
+    try:
+        # A dedicated connection: LOAD DATA LOCAL must be allowed when it is opened
+        connection = mysql.connector.connect(**DB_CONFIG, allow_local_infile=args.load_data)
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        if args.reset or not args.no_reset:
+            reset(connection)
+            print(f"Removed generated rows in {time.perf_counter() - started:.2f}s")
+        if args.reset:
+            return
+
+        cursor = connection.cursor()
+        if args.fast:
+            cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        sink = (LoadDataSink if args.load_data else InsertSink)(connection, args.batch_size)
+        Generator(sink, args).run()
+        finish(connection)
+        if args.fast:
+            cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+        cursor.close()
+
+        for table in COLUMNS:
+            count, seconds = sink.counts.get(table, 0), sink.seconds.get(table, 0)
+            print(f"  {table:<17} {count:>11,} rows  {seconds:8.2f}s  {count / max(seconds, 1e-9):>10,.0f} rows/s")
+        total = sum(sink.counts.values())
+        elapsed = time.perf_counter() - started
+        print(f"{total:,} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s); "
+              f"password for generated users: {PASSWORD}")
+
+        if not args.skip_verify:
+            orphans = verify(connection)
+            for description, count in orphans.items():
+                print(f"  ORPHANS {description}: {count:,}")
+            if orphans:
+                sys.exit(1)
+            print("Foreign keys verified: no orphan rows")
+    except Error as e:
+        print(f"Error generating data: {e}")
+        sys.exit(1)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+import atexit
+import os
+import random
+import string
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+
+from db import DB_CONFIG
+
+# Crockford base32: no I, L, O, U, so IDs are easy to read out over the phone
+BASE32 = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Custom epoch (2024-01-01 UTC) keeps the timestamp small
+EPOCH_MS = 1704067200000
+
+TIMESTAMP_BITS = 41  # ~69 years of milliseconds
+WORKER_BITS = 10     # 1024 worker processes
+SEQUENCE_BITS = 12   # 4096 IDs per worker per millisecond
+
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def encode_base32(number, width):
+    """Fixed-width base32 so IDs sort as text in numeric order"""
+    chars = []
+    for _ in range(width):
+        number, remainder = divmod(number, 32)
+        chars.append(BASE32[remainder])
+    return ''.join(reversed(chars))
+
+
+class WorkerLease:
+    """A worker number no other live process is using, leased from MySQL.
+
+    Each number 0-1023 is a named lock (drugweb_worker_<n>); the lease holds
+    one on a connection of its own for the life of the process. MySQL frees
+    the lock when that session ends, so a crashed worker's number becomes
+    available again, and release() hands it back on a clean exit. The
+    connection is pinged every CHECK_INTERVAL seconds, which also keeps it
+    from hitting wait_timeout; if it was lost, a new number is leased.
+
+    DRUGWEB_WORKER_ID picks the first number tried; when another process
+    holds it, the next free one is used instead.
+    """
+
+    LOCK_PREFIX = 'drugweb_worker_'
+    CHECK_INTERVAL = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._checked = 0.0
+        self.worker_id = None
+
+    def _acquire(self):
+        value = os.environ.get('DRUGWEB_WORKER_ID')
+        first = int(value) if value is not None else os.getpid()
+        connection = mysql.connector.connect(**DB_CONFIG)
+        try:
+            cursor = connection.cursor()
+            for offset in range(MAX_WORKER + 1):
+                worker_id = (first + offset) & MAX_WORKER
+                cursor.execute("SELECT GET_LOCK(%s, 0)", (f"{self.LOCK_PREFIX}{worker_id}",))
+                if cursor.fetchone()[0] == 1:
+                    cursor.close()
+                    if value is not None and offset:
+                        print(f"Worker ID {first & MAX_WORKER} is in use, leased {worker_id} instead")
+                    self._connection, self.worker_id = connection, worker_id
+                    return
+            raise Error(msg=f"All {MAX_WORKER + 1} worker IDs are leased")
+        except Exception:
+            connection.close()
+            raise
+
+    def get(self):
+        """The leased worker number, leasing one on first use (and after a fork)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child shares its parent's socket: leave it alone and lease anew
+                self._pid = os.getpid()
+                self._connection = self.worker_id = None
+            now = time.monotonic()
+            if self._connection is not None and now - self._checked >= self.CHECK_INTERVAL:
+                try:
+                    self._connection.ping()
+                except Error:
+                    # The session ended, and the lock with it
+                    self._connection = self.worker_id = None
+            if self._connection is None:
+                self._acquire()
+            self._checked = now
+            return self.worker_id
+
+    def release(self):
+        with self._lock:
+            if self._connection is None or self._pid != os.getpid():
+                return
+            try:
+                self._connection.close()  # ending the session releases the lock
+            except Error:
+                pass
+            self._connection = self.worker_id = None
+
+
+worker_lease = WorkerLease()
+atexit.register(worker_lease.release)
+
+
+def default_worker_id():
+    """This process's worker number, leased from MySQL (see WorkerLease)"""
+    return worker_lease.get()
+
+
+class SnowflakeIdGenerator:
+    """Time-ordered, monotonic IDs that need no database round trip.
+
+    Each ID packs milliseconds since EPOCH_MS, a worker number and a
+    per-millisecond sequence into 63 bits, written as 13 base32 characters
+    after the prefix (e.g. PAY0C4Z7Q2M80001). New IDs always sort after
+    older ones from the same worker, so inserts land at the end of the
+    InnoDB clustered index instead of splitting random pages.
+    """
+
+    def __init__(self, prefix, worker_id=None):
+        self.prefix = prefix
+        self._explicit_worker = worker_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _worker(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._last_ms = -1
+            self._sequence = 0
+        # The lease is checked on every call, so a re-leased number is picked up
+        self.worker_id = self._explicit_worker if self._explicit_worker is not None else default_worker_id()
+        return self.worker_id
+
+    def next_int(self):
+        with self._lock:
+            worker_id = self._worker()
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now < self._last_ms:
+                # Clock moved backwards: keep counting from the last timestamp
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond: borrow the next one
+                    now = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (worker_id << SEQUENCE_BITS) | self._sequence
+
+    def __call__(self):
+        return self.prefix + encode_base32(self.next_int(), 13)
+
+
+class RandomIdGenerator:
+    """The old scheme: prefix plus random digits (needs a uniqueness check)"""
+
+    def __init__(self, prefix, digits=6):
+        self.prefix = prefix
+        self.digits = digits
+
+    def __call__(self):
+        return self.prefix + ''.join(random.choices(string.digits, k=self.digits))
+
+
+# Generators by ID kind; swap one with set_id_generator()
+_generators = {
+    'payment': SnowflakeIdGenerator('PAY')
+}
+
+
+def set_id_generator(kind, generator):
+    """Replace the generator used for an ID kind (any callable returning a string)"""
+    _generators[kind] = generator
+
+
+def next_id(kind):
+    return _generators[kind]()
+
+
+def next_payment_id():
+    return next_id('payment')
+
+
+class SequenceBlockAllocator:
+    """Numbers from the id_sequence table, reserved in blocks per process.
+
+    One UPDATE reserves `block_size` numbers at once; they are then handed
+    out from memory, so most allocations need no database round trip and
+    concurrent workers can never get the same number. Numbers left in a
+    block when a process exits are skipped, so IDs can have gaps.
+
+    Reservations use a short-lived connection of their own, not the pool:
+    the request asking for an ID already holds a pooled connection, and a
+    burst of signups could otherwise take every pooled connection and then
+    wait on each other for one more.
+    """
+
+    def __init__(self, name, block_size=50, seed_query=None):
+        self.name = name
+        self.block_size = block_size
+        self.seed_query = seed_query
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = 0
+        self._end = 0
+
+    def _reserve(self):
+        """Reserve the next block on a connection of its own, committed at once"""
+        connection = mysql.connector.connect(**DB_CONFIG)
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE id_sequence SET next_value = LAST_INSERT_ID(next_value + %s)
+                WHERE name = %s
+            """, (self.block_size, self.name))
+            if cursor.rowcount == 0:
+                # First use: start after the highest existing number
+                start = 1
+                if self.seed_query:
+                    cursor.execute(self.seed_query)
+                    row = cursor.fetchone()
+                    start = (row[0] or 0) + 1 if row else 1
+                cursor.execute("INSERT IGNORE INTO id_sequence (name, next_value) VALUES (%s, %s)",
+                               (self.name, start))
+                cursor.execute("""
+                    UPDATE id_sequence SET next_value = LAST_INSERT_ID(next_value + %s)
+                    WHERE name = %s
+                """, (self.block_size, self.name))
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            end = cursor.fetchone()[0]
+            connection.commit()
+            cursor.close()
+        finally:
+            # Anything left uncommitted if the reservation failed is rolled back on close
+            connection.close()
+        self._next, self._end = end - self.block_size, end
+
+    def next(self):
+        with self._lock:
+            # A forked child must not reuse its parent's block
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            if self._next >= self._end:
+                self._reserve()
+            value = self._next
+            self._next += 1
+            return value
+
+
+# Customer IDs keep the CM prefix; the fixed width keeps text order == numeric order
+customer_sequence = SequenceBlockAllocator(
+    'customer',
+    block_size=int(os.environ.get('DRUGWEB_ID_BLOCK_SIZE', 50)),
+    seed_query="SELECT MAX(CAST(SUBSTRING(Customer_ID, 3) AS UNSIGNED)) FROM customer WHERE Customer_ID LIKE 'CM%'"
+)
+
+
+def next_customer_id():
+    """Next customer ID, e.g. CM0000042"""
+    return f"CM{customer_sequence.next():07d}"
@@ -0,0 +1,233 @@
+"""Per-request SQL instrumentation.
+
+Every cursor handed out by the pool is an InstrumentedCursor, which times
+each statement. Within a request the statements are counted and grouped by
+normalized SQL (literals and placeholders replaced by ?), so a request that
+runs the same statement N_PLUS_ONE_THRESHOLD times or more is flagged as a
+likely N+1 loop. Statements slower than SLOW_QUERY_MS go to the slow-query
+log: an in-memory ring shown at /admin/slow_queries and, if
+DRUGWEB_SLOW_QUERY_LOG is set, a file.
+
+After each request the totals are added to per-endpoint aggregates, which
+/admin/metrics serves in the Prometheus text format. Responses also carry
+X-DB-Queries and X-DB-Time-Ms headers (used by benchmarks/loadtest.py).
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from functools import lru_cache
+
+from flask import g, has_app_context, has_request_context, request
+
+SLOW_QUERY_MS = float(os.environ.get('DRUGWEB_SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG = os.environ.get('DRUGWEB_SLOW_QUERY_LOG')  # optional file path
+SLOW_LOG_SIZE = 200
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('DRUGWEB_N_PLUS_ONE_THRESHOLD', 10))
+
+# Request duration histogram buckets (seconds)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """SQL with literals, placeholders and IN/VALUES lists collapsed, for grouping"""
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?)', sql)
+    return _VALUES_LIST.sub(r'\1', sql)
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times every statement and reports it to the request"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(operation, params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - started)
+
+
+class Metrics:
+    """Per-endpoint aggregates and the slow-query ring, shared by all threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+
+    def _endpoint(self, endpoint):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = {
+                'requests': 0, 'seconds': 0.0, 'buckets': [0] * len(DURATION_BUCKETS),
+                'queries': 0, 'db_seconds': 0.0, 'slow_queries': 0, 'n_plus_one': 0, 'errors': 0
+            }
+        return stats
+
+    def add_request(self, endpoint, seconds, queries, db_seconds, n_plus_one, error):
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['requests'] += 1
+            stats['seconds'] += seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['queries'] += queries
+            stats['db_seconds'] += db_seconds
+            stats['n_plus_one'] += n_plus_one
+            stats['errors'] += error
+
+    def add_slow_query(self, entry):
+        with self._lock:
+            self.slow_queries.append(entry)
+            self._endpoint(entry['endpoint'])['slow_queries'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self.endpoints.items()}
+            return endpoints, list(self.slow_queries)
+
+
+metrics = Metrics()
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+def record_query(sql, seconds):
+    """Called by InstrumentedCursor after every statement"""
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    normalized = None
+    if has_app_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.0) + seconds
+        normalized = normalize_sql(sql)
+        if 'db_statements' not in g:
+            g.db_statements = Counter()
+        g.db_statements[normalized] += 1
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'endpoint': _current_endpoint(),
+            'ms': round(seconds * 1000, 1),
+            'sql': normalized or normalize_sql(sql)
+        }
+        metrics.add_slow_query(entry)
+        line = f"SLOW QUERY {entry['ms']}ms [{entry['endpoint']}] {entry['sql']}"
+        if SLOW_QUERY_LOG:
+            with open(SLOW_QUERY_LOG, 'a') as f:
+                f.write(f"{entry['at']} {line}\n")
+        else:
+            print(line)
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    """Add the request to the endpoint aggregates and report its query totals"""
+    seconds = time.perf_counter() - g.get('request_started', time.perf_counter())
+    queries = g.get('db_queries', 0)
+    db_seconds = g.get('db_seconds', 0.0)
+    endpoint = _current_endpoint()
+
+    repeated = [(sql, count) for sql, count in g.get('db_statements', Counter()).items()
+                if count >= N_PLUS_ONE_THRESHOLD]
+    for sql, count in repeated:
+        print(f"N+1 suspected [{endpoint}]: {count}x {sql}")
+
+    metrics.add_request(endpoint, seconds, queries, db_seconds, len(repeated), response.status_code >= 500)
+    response.headers['X-DB-Queries'] = str(queries)
+    response.headers['X-DB-Time-Ms'] = f"{db_seconds * 1000:.1f}"
+    return response
+
+
+def init_app(app):
+    """Time every request and aggregate its SQL per endpoint"""
+    app.before_request(_start_timer)
+    app.after_request(_finish_request)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(gauges=None):
+    """Endpoint aggregates (plus optional {name: (help, value)} gauges) as Prometheus text"""
+    endpoints, _ = metrics.snapshot()
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+
+    def per_endpoint(key, fmt=str):
+        return [f'{{endpoint="{_label(name)}"}} {fmt(stats[key])}' for name, stats in sorted(endpoints.items())]
+
+    samples = []
+    for name, stats in sorted(endpoints.items()):
+        label = _label(name)
+        for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+            samples.append(f'drugweb_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+        samples.append(f'drugweb_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {stats["requests"]}')
+        samples.append(f'drugweb_request_duration_seconds_sum{{endpoint="{label}"}} {stats["seconds"]:.6f}')
+        samples.append(f'drugweb_request_duration_seconds_count{{endpoint="{label}"}} {stats["requests"]}')
+    family('drugweb_request_duration_seconds', 'histogram', 'Request latency by endpoint', samples)
+
+    counters = [
+        ('drugweb_db_queries_total', 'queries', 'SQL statements executed, by endpoint', str),
+        ('drugweb_db_seconds_total', 'db_seconds', 'Time spent in SQL statements, by endpoint',
+         lambda v: f"{v:.6f}"),
+        ('drugweb_db_slow_queries_total', 'slow_queries', f'Statements slower than {SLOW_QUERY_MS:g}ms', str),
+        ('drugweb_db_n_plus_one_total', 'n_plus_one',
+         f'Statements repeated {N_PLUS_ONE_THRESHOLD}+ times in one request', str),
+        ('drugweb_request_errors_total', 'errors', 'Responses with status 5xx', str)
+    ]
+    for name, key, help_text, fmt in counters:
+        family(name, 'counter', help_text, [name + sample for sample in per_endpoint(key, fmt)])
+
+    for name, (help_text, value) in sorted((gauges or {}).items()):
+        family(name, 'gauge', help_text, [f"{name} {value}"])
+    return '\n'.join(lines) + '\n'
+
+
+def slow_queries():
+    """The most recent slow statements, newest first"""
+    _, entries = metrics.snapshot()
+    return list(reversed(entries))
@@ -0,0 +1,290 @@
+"""Loyalty points ledger.
+
+points_history is the ledger; customer.points is the running balance and
+must equal the sum of the customer's entries. record_entry() changes both in
+the caller's transaction.
+
+points_snapshot keeps, per customer, the ledger sum up to a history_id, so
+a balance can be checked by adding only the entries after the snapshot.
+Snapshots are refreshed daily from the entries above a global watermark; reconciliation streams the whole ledger in
+keyset batches and reports every customer whose balance has drifted.
+
+    python ledger.py snapshot
+    python ledger.py verify CM0000042
+    python ledger.py reconcile [--batch-size 1000] [--fix]
+"""
+import argparse
+import os
+import sys
+import time
+
+from mysql.connector import Error
+
+from db import get_pool, init_db
+from scheduler import DailyJob
+
+HISTORY_PAGE_SIZE = 20
+RECONCILE_BATCH_SIZE = 1000
+
+# Entries younger than this are left for the next snapshot, so a transaction
+# that took a history_id but has not committed yet is never skipped
+SNAPSHOT_LAG_SECONDS = 300
+
+SNAPSHOT_HOUR = int(os.environ.get('DRUGWEB_SNAPSHOT_HOUR', 3))
+SNAPSHOTS_ENABLED = os.environ.get('DRUGWEB_POINTS_SNAPSHOTS', '1') != '0'
+
+# Read queries (also EXPLAINed by migrations.ROUTE_QUERIES)
+HISTORY_QUERY = """
+    SELECT history_id, points_earned, transaction_type, payment_id, description, created_at
+    FROM points_history
+    WHERE customer_id = %s
+    ORDER BY history_id DESC
+    LIMIT %s
+"""
+HISTORY_BEFORE_QUERY = """
+    SELECT history_id, points_earned, transaction_type, payment_id, description, created_at
+    FROM points_history
+    WHERE customer_id = %s AND history_id < %s
+    ORDER BY history_id DESC
+    LIMIT %s
+"""
+# Fold the entries in (watermark, upto] into each customer's snapshot. The
+# per-customer last_history_id check is a guard only; the range comes from
+# the watermark, on the primary key.
+SNAPSHOT_QUERY = """
+    INSERT INTO points_snapshot (customer_id, balance, last_history_id, taken_at)
+    SELECT h.customer_id, COALESCE(s.balance, 0) + SUM(h.points_earned), MAX(h.history_id), NOW()
+    FROM points_history h
+    LEFT JOIN points_snapshot s ON s.customer_id = h.customer_id
+    WHERE h.history_id > %s AND h.history_id <= %s
+      AND h.history_id > COALESCE(s.last_history_id, 0)
+    GROUP BY h.customer_id, s.balance
+    ON DUPLICATE KEY UPDATE balance = VALUES(balance),
+                            last_history_id = VALUES(last_history_id),
+                            taken_at = VALUES(taken_at)
+"""
+VERIFY_BALANCE_QUERY = """
+    SELECT c.points,
+           COALESCE(s.balance, 0) + (
+               SELECT COALESCE(SUM(h.points_earned), 0)
+               FROM points_history h
+               WHERE h.customer_id = c.Customer_ID AND h.history_id > COALESCE(s.last_history_id, 0)
+           ) AS ledger
+    FROM customer c
+    LEFT JOIN points_snapshot s ON s.customer_id = c.Customer_ID
+    WHERE c.Customer_ID = %s
+"""
+
+
+def record_entry(cursor, customer_id, points, transaction_type, payment_id, description):
+    """Append a ledger entry and move the balance by the same amount"""
+    cursor.execute("""
+        UPDATE customer
+        SET points = points + %s
+        WHERE Customer_ID = %s
+    """, (points, customer_id))
+    cursor.execute("""
+        INSERT INTO points_history (customer_id, points_earned, transaction_type, payment_id, description, created_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+    """, (customer_id, points, transaction_type, payment_id, description))
+
+
+def fetch_history(cursor, customer_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """One page of ledger entries, newest first.
+
+    Returns (entries, older) where older is the history_id to pass as
+    `before` for the next page, or None on the last page.
+    """
+    if before:
+        cursor.execute(HISTORY_BEFORE_QUERY, (customer_id, before, limit + 1))
+    else:
+        cursor.execute(HISTORY_QUERY, (customer_id, limit + 1))
+    rows = cursor.fetchall()
+    older = rows[limit - 1]['history_id'] if len(rows) > limit else None
+    return rows[:limit], older
+
+
+def take_snapshots(connection):
+    """Roll every customer's snapshot forward to the latest settled entry.
+
+    points_snapshot_watermark holds the highest history_id already folded
+    in, so a run range-scans points_history's primary key above it: the cost
+    follows recent activity rather than the size of the ledger. The
+    watermark row is locked for the run, which keeps concurrent runs (every
+    worker schedules one) from adding the same entries twice.
+    Returns the number of snapshots written.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT last_history_id FROM points_snapshot_watermark WHERE id = 1 FOR UPDATE")
+        row = cursor.fetchone()
+        watermark = row[0] if row else 0
+        cursor.execute("""
+            SELECT COALESCE(MAX(history_id), 0) FROM points_history
+            WHERE history_id > %s AND created_at < NOW() - INTERVAL %s SECOND
+        """, (watermark, SNAPSHOT_LAG_SECONDS))
+        upto = cursor.fetchone()[0]
+        written = 0
+        if upto > watermark:
+            cursor.execute(SNAPSHOT_QUERY, (watermark, upto))
+            written = cursor.rowcount
+            cursor.execute("""
+                INSERT INTO points_snapshot_watermark (id, last_history_id) VALUES (1, %s)
+                ON DUPLICATE KEY UPDATE last_history_id = VALUES(last_history_id)
+            """, (upto,))
+        connection.commit()
+        return written
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def verify_balance(cursor, customer_id):
+    """Check one customer's balance against snapshot + entries since it.
+
+    Returns {'balance', 'ledger', 'ok'} or None for an unknown customer.
+    """
+    cursor.execute(VERIFY_BALANCE_QUERY, (customer_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    balance, ledger = (row['points'], row['ledger']) if isinstance(row, dict) else row
+    return {'balance': int(balance or 0), 'ledger': int(ledger), 'ok': int(balance or 0) == int(ledger)}
+
+
+def reconcile(connection, batch_size=RECONCILE_BATCH_SIZE):
+    """Stream every customer's balance against the full ledger.
+
+    Walks customers in primary-key batches and sums each batch's entries
+    through the customer_id index, so memory and lock time stay bounded
+    however large points_history grows. Yields (customer_id, balance, ledger)
+    for each mismatch and returns the number of customers scanned.
+    """
+    cursor = connection.cursor()
+    last_id = ''
+    scanned = 0
+    try:
+        while True:
+            cursor.execute("""
+                SELECT c.Customer_ID, c.points, COALESCE(SUM(h.points_earned), 0)
+                FROM (
+                    SELECT Customer_ID, points FROM customer
+                    WHERE Customer_ID > %s
+                    ORDER BY Customer_ID
+                    LIMIT %s
+                ) c
+                LEFT JOIN points_history h ON h.customer_id = c.Customer_ID
+                GROUP BY c.Customer_ID, c.points
+                ORDER BY c.Customer_ID
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            # Release the batch's read view before the next one
+            connection.commit()
+            if not rows:
+                return scanned
+            for customer_id, balance, ledger in rows:
+                if int(balance or 0) != int(ledger):
+                    yield customer_id, int(balance or 0), int(ledger)
+            scanned += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        cursor.close()
+
+
+def fix_balance(connection, customer_id, balance, ledger):
+    """Append an adjustment entry so the ledger matches the balance"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO points_history (customer_id, points_earned, transaction_type, description, created_at)
+            VALUES (%s, %s, 'adjustment', %s, NOW())
+        """, (customer_id, balance - ledger, f"Reconciliation adjustment: balance {balance}, ledger {ledger}"))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def run_snapshots():
+    """Snapshot job on a pooled connection. Returns rows written, or None on error."""
+    pool = get_pool()
+    try:
+        connection = pool.acquire()
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+    try:
+        return take_snapshots(connection)
+    except Error as e:
+        print(f"Error taking points snapshots: {e}")
+        return None
+    finally:
+        pool.release(connection)
+
+
+scheduler = DailyJob('points-snapshots', run_snapshots, SNAPSHOT_HOUR)
+
+
+def start_scheduler():
+    """Start the daily snapshot job unless DRUGWEB_POINTS_SNAPSHOTS=0"""
+    if SNAPSHOTS_ENABLED:
+        scheduler.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Loyalty points ledger maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('snapshot', help='roll balance snapshots forward')
+    verify = commands.add_parser('verify', help="check one customer's balance against snapshot + recent entries")
+    verify.add_argument('customer_id')
+    rec = commands.add_parser('reconcile', help='stream the whole ledger and report drifted balances')
+    rec.add_argument('--batch-size', type=int, default=RECONCILE_BATCH_SIZE)
+    rec.add_argument('--fix', action='store_true', help='append adjustment entries for mismatches')
+    args = parser.parse_args()
+
+    if not init_db():
+        sys.exit(1)
+    pool = get_pool()
+    connection = pool.acquire()
+    started = time.perf_counter()
+
+    try:
+        if args.command == 'snapshot':
+            print(f"{take_snapshots(connection)} snapshot row(s) written in {time.perf_counter() - started:.2f}s")
+
+        elif args.command == 'verify':
+            cursor = connection.cursor()
+            result = verify_balance(cursor, args.customer_id)
+            cursor.close()
+            if result is None:
+                print(f"Unknown customer {args.customer_id}")
+                sys.exit(1)
+            print(f"{args.customer_id}: balance={result['balance']} ledger={result['ledger']} "
+                  f"[{'OK' if result['ok'] else 'MISMATCH'}]")
+            sys.exit(0 if result['ok'] else 1)
+
+        else:
+            mismatches = []
+            scan = reconcile(connection, args.batch_size)
+            while True:
+                try:
+                    customer_id, balance, ledger = next(scan)
+                except StopIteration as done:
+                    scanned = done.value
+                    break
+                mismatches.append((customer_id, balance, ledger))
+                print(f"  MISMATCH {customer_id}: balance={balance} ledger={ledger} diff={balance - ledger:+d}")
+            if args.fix:
+                # Fix after the scan so adjustments do not shift the batches
+                for customer_id, balance, ledger in mismatches:
+                    fix_balance(connection, customer_id, balance, ledger)
+            print(f"{scanned} customer(s) scanned, {len(mismatches)} mismatch(es)"
+                  f"{', fixed' if args.fix and mismatches else ''} in {time.perf_counter() - started:.2f}s")
+            sys.exit(1 if mismatches and not args.fix else 0)
+    finally:
+        pool.release(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,526 @@
+"""Versioned schema migrations.
+
+Each migration runs once per database and is recorded in the
+schema_migrations table. They are applied at startup (and by /setup_db),
+never from a request handler, so no route takes DDL metadata locks.
+
+    python migrations.py            apply pending migrations
+    python migrations.py --status   list applied and pending versions
+    python migrations.py --check    EXPLAIN the route queries, fail on full table scans
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from mysql.connector import Error
+
+import admin
+import assignment
+import cart
+import customer
+import deliveryman
+import ledger
+import notifications
+import reminders
+import reviews
+import roles
+from db import get_pool, init_db
+
+# Serializes runners when several workers start at once
+LOCK_NAME = 'drugweb_migrations'
+LOCK_TIMEOUT = 60
+
+# Sample key for the route queries that page or filter by time
+SAMPLE_TIME = datetime(2030, 1, 1)
+
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+
+def add_column(cursor, table, column, definition):
+    """ADD COLUMN unless it is already there (MySQL has no ADD COLUMN IF NOT EXISTS)"""
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def add_index(cursor, table, index, columns):
+    if not index_exists(cursor, table, index):
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+
+
+def m001_base_tables(cursor):
+    """The original eleven tables"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user (
+            ID VARCHAR(10) PRIMARY KEY,
+            F_name VARCHAR(50) NOT NULL,
+            L_name VARCHAR(50) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(100) NOT NULL,
+            address TEXT,
+            phone VARCHAR(20)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer (
+            Customer_ID VARCHAR(10) PRIMARY KEY,
+            points INT DEFAULT 0,
+            FOREIGN KEY (Customer_ID) REFERENCES user(ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS admin (
+            Admin_ID VARCHAR(10) PRIMARY KEY,
+            FOREIGN KEY (Admin_ID) REFERENCES user(ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deliveryman (
+            DeliveryMan_ID VARCHAR(10) PRIMARY KEY,
+            Name VARCHAR(100),
+            Phone VARCHAR(20),
+            Email VARCHAR(100),
+            Area VARCHAR(100),
+            FOREIGN KEY (DeliveryMan_ID) REFERENCES user(ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS medicine (
+            Med_Code VARCHAR(10) PRIMARY KEY,
+            Name VARCHAR(100) NOT NULL,
+            Generic_name VARCHAR(100),
+            Category VARCHAR(50),
+            Price DECIMAL(10,2) NOT NULL,
+            Stock INT DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_review (
+            Review_ID INT AUTO_INCREMENT PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            review TEXT,
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_request (
+            Request_ID INT AUTO_INCREMENT PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            request_med_name VARCHAR(100),
+            Expected_date DATE,
+            Status VARCHAR(20) DEFAULT 'Pending',
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cart (
+            Cart_ID INT AUTO_INCREMENT PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            Med_Code VARCHAR(10),
+            Med_Name VARCHAR(100),
+            Quantity INT DEFAULT 1,
+            Price DECIMAL(10,2),
+            total_price DECIMAL(10,2),
+            Added_Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
+            FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            notification_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id VARCHAR(10),
+            message TEXT NOT NULL,
+            type VARCHAR(50) DEFAULT 'general',
+            is_read BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS points_history (
+            history_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id VARCHAR(10),
+            points_earned INT NOT NULL,
+            transaction_type VARCHAR(20) DEFAULT 'earned',
+            payment_id VARCHAR(20),
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payment (
+            payment_id VARCHAR(20) PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            amount DECIMAL(10,2),
+            payment_type VARCHAR(50),
+            DeliveryMan_ID VARCHAR(10),
+            status VARCHAR(50) DEFAULT 'Assigned',
+            delivery_date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
+            FOREIGN KEY (DeliveryMan_ID) REFERENCES deliveryman(DeliveryMan_ID)
+        )
+    """)
+
+
+def m002_legacy_columns(cursor):
+    """Columns older databases got from /update_medicine_db, /update_db, /fix_db and /force_fix_cart"""
+    if not column_exists(cursor, 'medicine', 'Category'):
+        cursor.execute("ALTER TABLE medicine ADD COLUMN Category VARCHAR(50)")
+        cursor.execute("UPDATE medicine SET Category = 'Pain Relief' WHERE Name LIKE '%Paracetamol%' OR Name LIKE '%Aspirin%'")
+        cursor.execute("UPDATE medicine SET Category = 'Antibiotic' WHERE Name LIKE '%Amoxicillin%' OR Name LIKE '%Penicillin%'")
+        cursor.execute("UPDATE medicine SET Category = 'General' WHERE Category IS NULL")
+    add_column(cursor, 'customer_request', 'Request_ID', 'INT AUTO_INCREMENT PRIMARY KEY FIRST')
+    add_column(cursor, 'customer_request', 'Status', "VARCHAR(20) DEFAULT 'Pending'")
+    add_column(cursor, 'cart', 'total_price', 'DECIMAL(10,2)')
+    cursor.execute("UPDATE cart SET total_price = Price * Quantity WHERE total_price IS NULL")
+
+
+def m003_payment_listing_indexes(cursor):
+    """Admin payments list: newest first, optionally filtered by status"""
+    add_index(cursor, 'payment', 'idx_payment_created', 'created_at')
+    add_index(cursor, 'payment', 'idx_payment_status_created', 'status, created_at')
+
+
+def m004_order_items(cursor):
+    """Line items of each payment"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_items (
+            Order_Item_ID INT AUTO_INCREMENT PRIMARY KEY,
+            payment_id VARCHAR(20) NOT NULL,
+            Med_Code VARCHAR(10) NOT NULL,
+            Med_Name VARCHAR(100),
+            Quantity INT NOT NULL,
+            unit_price DECIMAL(10,2) NOT NULL,
+            total_price DECIMAL(10,2) NOT NULL,
+            INDEX idx_order_items_payment (payment_id),
+            FOREIGN KEY (payment_id) REFERENCES payment(payment_id),
+            FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
+        )
+    """)
+
+
+def m005_id_sequence(cursor):
+    """Block-reserved ID counters (see ids.SequenceBlockAllocator)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS id_sequence (
+            name VARCHAR(30) PRIMARY KEY,
+            next_value BIGINT NOT NULL
+        )
+    """)
+
+
+def m006_route_indexes(cursor):
+    """Composite indexes for the per-customer and per-deliveryman route queries"""
+    add_index(cursor, 'cart', 'idx_cart_customer_med', 'Customer_ID, Med_Code')
+    add_index(cursor, 'notifications', 'idx_notifications_customer_created', 'customer_id, created_at')
+    add_index(cursor, 'payment', 'idx_payment_deliveryman_created', 'DeliveryMan_ID, created_at')
+    add_index(cursor, 'points_history', 'idx_points_history_customer_created', 'customer_id, created_at')
+
+
+def m007_unread_notification_counter(cursor):
+    """Per-customer unread counter kept by notifications.py, backfilled from is_read"""
+    add_column(cursor, 'customer', 'unread_notifications', 'INT NOT NULL DEFAULT 0')
+    cursor.execute("""
+        UPDATE customer c
+        LEFT JOIN (
+            SELECT customer_id, COUNT(*) AS unread
+            FROM notifications
+            WHERE is_read = FALSE
+            GROUP BY customer_id
+        ) n ON n.customer_id = c.Customer_ID
+        SET c.unread_notifications = COALESCE(n.unread, 0)
+    """)
+
+
+def m008_request_reminders(cursor):
+    """Dedupe key for idempotent reminder inserts; index for the daily reminder scan"""
+    add_column(cursor, 'notifications', 'dedupe_key', 'VARCHAR(100) NULL')
+    if not index_exists(cursor, 'notifications', 'uq_notifications_dedupe'):
+        cursor.execute("ALTER TABLE notifications ADD UNIQUE INDEX uq_notifications_dedupe (dedupe_key)")
+    cursor.execute("UPDATE customer_request SET Status = 'Pending' WHERE Status IS NULL")
+    add_index(cursor, 'customer_request', 'idx_customer_request_status_expected', 'Status, Expected_date')
+
+
+def m009_points_snapshot(cursor):
+    """Per-customer ledger sum up to a history_id (see ledger.py)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS points_snapshot (
+            customer_id VARCHAR(10) PRIMARY KEY,
+            balance INT NOT NULL,
+            last_history_id INT NOT NULL,
+            taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
+        )
+    """)
+
+
+def m010_unique_cart_lines(cursor):
+    """One cart row per (Customer_ID, Med_Code), so cart writes can be upserts"""
+    # Fold duplicate lines into the oldest one first
+    cursor.execute("""
+        UPDATE cart c
+        JOIN (
+            SELECT MIN(Cart_ID) AS keep_id, SUM(Quantity) AS quantity
+            FROM cart
+            GROUP BY Customer_ID, Med_Code
+            HAVING COUNT(*) > 1
+        ) d ON c.Cart_ID = d.keep_id
+        SET c.Quantity = d.quantity
+    """)
+    cursor.execute("""
+        DELETE c FROM cart c
+        JOIN (
+            SELECT Customer_ID, Med_Code, MIN(Cart_ID) AS keep_id
+            FROM cart
+            GROUP BY Customer_ID, Med_Code
+            HAVING COUNT(*) > 1
+        ) d ON c.Customer_ID = d.Customer_ID AND c.Med_Code = d.Med_Code AND c.Cart_ID <> d.keep_id
+    """)
+    # Older add_to_cart code left name and price empty; fill them from medicine
+    cursor.execute("""
+        UPDATE cart c
+        JOIN medicine m ON m.Med_Code = c.Med_Code
+        SET c.Med_Name = m.Name, c.Price = m.Price, c.total_price = m.Price * c.Quantity
+    """)
+    # Add the unique key before dropping the plain one, which may back the Customer_ID foreign key
+    if not index_exists(cursor, 'cart', 'uq_cart_customer_med'):
+        cursor.execute("ALTER TABLE cart ADD UNIQUE INDEX uq_cart_customer_med (Customer_ID, Med_Code)")
+    if index_exists(cursor, 'cart', 'idx_cart_customer_med'):
+        cursor.execute("ALTER TABLE cart DROP INDEX idx_cart_customer_med")
+
+
+def m011_admin_dashboard_indexes(cursor):
+    """Keyset pages of the admin dashboard's request list, filtered by status"""
+    add_index(cursor, 'customer_request', 'idx_customer_request_status_id', 'Status, Request_ID')
+
+
+def m012_deliveryman_queue_index(cursor):
+    """Deliveryman work queue and history: one courier's payments in one status, by created_at"""
+    # Legacy rows with no status were shown as Assigned; store that so the index finds them
+    cursor.execute("UPDATE payment SET status = 'Assigned' WHERE status IS NULL")
+    add_index(cursor, 'payment', 'idx_payment_deliveryman_status_created', 'DeliveryMan_ID, status, created_at')
+    # Superseded: nothing lists a courier's payments across all statuses any more
+    if index_exists(cursor, 'payment', 'idx_payment_deliveryman_created'):
+        cursor.execute("ALTER TABLE payment DROP INDEX idx_payment_deliveryman_created")
+
+
+def m013_points_snapshot_watermark(cursor):
+    """Highest history_id folded into the snapshots, so a run reads only newer entries"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS points_snapshot_watermark (
+            id TINYINT PRIMARY KEY,
+            last_history_id INT NOT NULL
+        )
+    """)
+    # Every entry up to the newest one already in a snapshot has been folded in
+    cursor.execute("""
+        INSERT IGNORE INTO points_snapshot_watermark (id, last_history_id)
+        SELECT 1, COALESCE(MAX(last_history_id), 0) FROM points_snapshot
+    """)
+
+
+# (version, function) in the order they must run. Never renumber or edit a
+# migration that has shipped; add a new one instead.
+MIGRATIONS = [
+    (1, m001_base_tables),
+    (2, m002_legacy_columns),
+    (3, m003_payment_listing_indexes),
+    (4, m004_order_items),
+    (5, m005_id_sequence),
+    (6, m006_route_indexes),
+    (7, m007_unread_notification_counter),
+    (8, m008_request_reminders),
+    (9, m009_points_snapshot),
+    (10, m010_unique_cart_lines),
+    (11, m011_admin_dashboard_indexes),
+    (12, m012_deliveryman_queue_index),
+    (13, m013_points_snapshot_watermark)
+]
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _applied(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor):
+    _ensure_table(cursor)
+    applied = _applied(cursor)
+    return [(version, fn) for version, fn in MIGRATIONS if version not in applied]
+
+
+def run_migrations(verbose=False):
+    """Apply pending migrations. Returns the versions applied, or None on error."""
+    pool = get_pool()
+    try:
+        connection = pool.acquire()
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+    applied = []
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        row = cursor.fetchone()
+        if not row or row[0] != 1:
+            print("Error running migrations: another process holds the migration lock")
+            return None
+        try:
+            # Re-read under the lock: another worker may have just finished
+            for version, fn in pending_migrations(cursor):
+                if verbose:
+                    print(f"Applying {version:03d} {fn.__name__}")
+                # DDL commits implicitly, so each migration is recorded as soon as it finishes
+                fn(cursor)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                               (version, fn.__name__))
+                connection.commit()
+                applied.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+        return applied
+    except Error as e:
+        connection.rollback()
+        print(f"Error running migrations: {e}")
+        return None
+    finally:
+        cursor.close()
+        pool.release(connection)
+
+
+# The route handlers' own queries, built from the constants and query builders
+# the routes execute, with sample parameters. check_indexes() EXPLAINs each one
+# and reports any full table scan. A new route query belongs here too.
+ROUTE_QUERIES = [
+    ('login role resolution', roles.USER_WITH_ROLES_QUERY, ('customer@test.com',)),
+    ('customer cart', *cart.cart_lines_query('CM001')),
+    ('cart lines by medicine', *cart.cart_lines_query('CM001', ['MED001', 'MED002'])),
+    ('notification page', notifications.PAGE_QUERY, ('CM001', 21)),
+    ('notification older page', notifications.PAGE_BEFORE_QUERY, ('CM001', 1000000, 51)),
+    ('notification feed', notifications.SINCE_QUERY, ('CM001', 0, 20)),
+    ('points history', ledger.HISTORY_QUERY, ('CM001', 21)),
+    ('points history older page', ledger.HISTORY_BEFORE_QUERY, ('CM001', 1000000, 21)),
+    ('points balance check', ledger.VERIFY_BALANCE_QUERY, ('CM001',)),
+    ('points snapshot run', ledger.SNAPSHOT_QUERY, (1000000, 1001000)),
+    ('deliveryman active queue', *deliveryman.active_queue_query('DM001')),
+    ('deliveryman history', *deliveryman.history_page_query('DM001')),
+    ('deliveryman history older page', *deliveryman.history_page_query('DM001', (SAMPLE_TIME, 'PAY0000000000000'))),
+    ('admin payments', *admin.payments_page_query(*admin.payment_filters(), 'newest')),
+    ('admin payments by status', *admin.payments_page_query(*admin.payment_filters('Assigned'), 'newest',
+                                                             after=(SAMPLE_TIME, 'PAY0000000000000'))),
+    ('admin payments by deliveryman', *admin.payments_page_query(*admin.payment_filters('', 'DM001'), 'oldest',
+                                                                  before=(SAMPLE_TIME, 'PAY0000000000000'))),
+    ('admin payments by order ID', *admin.payments_page_query(*admin.payment_filters(), 'id_asc',
+                                                               after=('PAY0000000000000',))),
+    ('admin dashboard requests', *admin.keyset_query(admin.DASHBOARD_REQUESTS_SELECT, 'cr.Request_ID',
+                                                     *admin.request_filters('Pending'), 25, 1000000, True)),
+    ('admin dashboard reviews', *admin.keyset_query(admin.DASHBOARD_REVIEWS_SELECT, 'r.Review_ID',
+                                                    *admin.review_filters('CM001'), 25, 1000000, True)),
+    ('bulk assign payment lookup', admin.LOCK_PAYMENTS_QUERY.format(ids='%s, %s'),
+     ('PAY0000000000000', 'PAY0000000000001')),
+    ('bulk assign deliveryman lookup', admin.DELIVERYMEN_BY_ID_QUERY.format(ids='%s, %s'), ('DM001', 'DM002')),
+    ('bulk request lookup', admin.LOCK_REQUESTS_QUERY.format(ids='%s, %s'), (1, 2)),
+    ('customer requests', customer.CUSTOMER_REQUESTS_QUERY, ('CM001',)),
+    ('reviews feed first page', reviews.FEED_QUERY, (21,)),
+    ('reviews feed older page', reviews.FEED_BEFORE_QUERY, (1000000, 21)),
+    ('assignment pending batch', *assignment.pending_query(5000, (SAMPLE_TIME, 'PAY0000000000000'))),
+    ('assignment customer addresses', *assignment.addresses_query(['CM001', 'CM002'])),
+    ('assignment couriers', assignment.COURIERS_QUERY, assignment.ACTIVE_STATUSES)
+] + [
+    (f'{stage} request reminders', reminders.reminder_query(stage),
+     {'today': SAMPLE_TIME.date(), 'window_end': SAMPLE_TIME.date()})
+    for stage in reminders.REMINDER_STAGES
+]
+
+# Full reads a query makes on purpose: query name -> EXPLAIN table names
+EXPECTED_SCANS = {
+    # Every courier is a candidate; only the per-courier count must use an index
+    'assignment couriers': {'d'}
+}
+
+
+def check_indexes(connection):
+    """EXPLAIN every ROUTE_QUERIES entry. Returns a list of (name, table) full scans."""
+    cursor = connection.cursor(dictionary=True)
+    scans = []
+    for name, sql, params in ROUTE_QUERIES:
+        cursor.execute("EXPLAIN " + sql, params)
+        for row in cursor.fetchall():
+            # The target row of an INSERT ... SELECT always reads as ALL
+            if row['select_type'] == 'INSERT' or row['table'] in EXPECTED_SCANS.get(name, ()):
+                continue
+            if row['type'] == 'ALL':
+                scans.append((name, row['table']))
+    cursor.close()
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply or inspect DrugWeb schema migrations')
+    parser.add_argument('--status', action='store_true', help='list applied and pending migrations')
+    parser.add_argument('--check', action='store_true', help='fail if a route query does a full table scan')
+    args = parser.parse_args()
+
+    if not init_db():
+        sys.exit(1)
+
+    if args.status:
+        pool = get_pool()
+        connection = pool.acquire()
+        cursor = connection.cursor()
+        pending = {version for version, _ in pending_migrations(cursor)}
+        connection.commit()
+        cursor.close()
+        pool.release(connection)
+        for version, fn in MIGRATIONS:
+            print(f"{version:03d} {fn.__name__:<32} {'pending' if version in pending else 'applied'}")
+        return
+
+    applied = run_migrations(verbose=True)
+    if applied is None:
+        sys.exit(1)
+    print(f"{len(applied)} migration(s) applied")
+
+    if args.check:
+        pool = get_pool()
+        connection = pool.acquire()
+        scans = check_indexes(connection)
+        pool.release(connection)
+        for name, table in scans:
+            print(f"  [FAIL] {name}: full scan of {table}")
+        if scans:
+            sys.exit(1)
+        print(f"  [PASS] {len(ROUTE_QUERIES)} route queries use an index")
+
+
+if __name__ == '__main__':
+    main()
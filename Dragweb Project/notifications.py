@@ -0,0 +1,161 @@
+"""Customer notifications with a per-customer unread counter.
+
+customer.unread_notifications is kept in step with the is_read flags: notify()
+adds one, mark_read() subtracts exactly the rows it flipped. Badge polling
+reads one primary-key row instead of counting the customer's history.
+
+All functions take a cursor and leave committing to the caller, so a
+notification is written in the same transaction as the change it reports.
+Feed queries filter on customer_id and range over notification_id, which
+the customer_id index already carries (InnoDB appends the primary key).
+"""
+from collections import Counter
+from datetime import datetime
+
+FEED_LIMIT = 20
+PAGE_LIMIT = 50
+
+# Rows per multi-row statement in notify_many()
+INSERT_CHUNK = 1000
+
+NOTIFICATION_COLUMNS = "notification_id, message, type, is_read, created_at"
+
+# Feed queries (also EXPLAINed by migrations.ROUTE_QUERIES)
+SINCE_QUERY = f"""
+    SELECT {NOTIFICATION_COLUMNS}
+    FROM notifications
+    WHERE customer_id = %s AND notification_id > %s
+    ORDER BY notification_id
+    LIMIT %s
+"""
+PAGE_QUERY = f"""
+    SELECT {NOTIFICATION_COLUMNS}
+    FROM notifications
+    WHERE customer_id = %s
+    ORDER BY notification_id DESC
+    LIMIT %s
+"""
+PAGE_BEFORE_QUERY = f"""
+    SELECT {NOTIFICATION_COLUMNS}
+    FROM notifications
+    WHERE customer_id = %s AND notification_id < %s
+    ORDER BY notification_id DESC
+    LIMIT %s
+"""
+
+
+def notify(cursor, customer_id, message, type='general'):
+    """Add a notification and bump the customer's unread counter.
+
+    Returns the new notification as an event for events.publish_notifications(),
+    which the caller should do once the transaction has committed.
+    """
+    cursor.execute("""
+        INSERT INTO notifications (customer_id, message, type, created_at)
+        VALUES (%s, %s, %s, NOW())
+    """, (customer_id, message, type))
+    notification_id = cursor.lastrowid
+    cursor.execute("""
+        UPDATE customer SET unread_notifications = unread_notifications + 1
+        WHERE Customer_ID = %s
+    """, (customer_id,))
+    return {'customer_id': customer_id, 'notification_id': notification_id, 'message': message,
+            'type': type, 'is_read': False, 'created_at': datetime.now()}
+
+
+def notify_many(cursor, notifications, batch_key):
+    """Bulk notify(): add (customer_id, message, type) notifications in a few statements.
+
+    Rows are inserted with executemany, INSERT_CHUNK at a time, and tagged
+    with dedupe keys '<batch_key>:<n>', so the new rows can be read back with
+    one range scan of the dedupe index. Counters are raised with one UPDATE
+    per distinct increment. Returns the events for publish_notifications().
+    """
+    if not notifications:
+        return []
+    rows = [(customer_id, message, type, f"{batch_key}:{n}")
+            for n, (customer_id, message, type) in enumerate(notifications)]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        cursor.executemany("""
+            INSERT INTO notifications (customer_id, message, type, created_at, dedupe_key)
+            VALUES (%s, %s, %s, NOW(), %s)
+        """, rows[start:start + INSERT_CHUNK])
+
+    added = Counter(customer_id for customer_id, _, _ in notifications)
+    by_increment = {}
+    for customer_id, count in added.items():
+        by_increment.setdefault(count, []).append(customer_id)
+    for count, customer_ids in by_increment.items():
+        for start in range(0, len(customer_ids), INSERT_CHUNK):
+            chunk = customer_ids[start:start + INSERT_CHUNK]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"""
+                UPDATE customer SET unread_notifications = unread_notifications + %s
+                WHERE Customer_ID IN ({placeholders})
+            """, [count] + chunk)
+
+    cursor.execute(f"""
+        SELECT customer_id, {NOTIFICATION_COLUMNS}
+        FROM notifications
+        WHERE dedupe_key LIKE %s
+        ORDER BY notification_id
+    """, (batch_key + ':%',))
+    keys = ['customer_id'] + [column.strip() for column in NOTIFICATION_COLUMNS.split(',')]
+    return [row if isinstance(row, dict) else dict(zip(keys, row)) for row in cursor.fetchall()]
+
+
+def unread_count(cursor, customer_id):
+    cursor.execute("SELECT unread_notifications FROM customer WHERE Customer_ID = %s", (customer_id,))
+    row = cursor.fetchone()
+    if not row:
+        return 0
+    return row['unread_notifications'] if isinstance(row, dict) else row[0]
+
+
+def fetch_since(cursor, customer_id, since=0, limit=FEED_LIMIT):
+    """Notifications newer than the `since` ID, oldest first.
+
+    Returns (notifications, cursor) where cursor is the ID to pass as
+    `since` next time (unchanged when there is nothing new).
+    """
+    cursor.execute(SINCE_QUERY, (customer_id, since, limit))
+    rows = cursor.fetchall()
+    return rows, rows[-1]['notification_id'] if rows else since
+
+
+def fetch_page(cursor, customer_id, before=None, limit=PAGE_LIMIT):
+    """One page of notifications, newest first, optionally older than `before`.
+
+    Returns (notifications, older) where older is the ID to pass as `before`
+    for the next page, or None on the last page.
+    """
+    if before:
+        cursor.execute(PAGE_BEFORE_QUERY, (customer_id, before, limit + 1))
+    else:
+        cursor.execute(PAGE_QUERY, (customer_id, limit + 1))
+    rows = cursor.fetchall()
+    older = rows[limit - 1]['notification_id'] if len(rows) > limit else None
+    return rows[:limit], older
+
+
+def mark_read(cursor, customer_id, notifications):
+    """Mark the given notifications read and lower the counter by as many.
+
+    Only rows that were still unread are touched, and the counter drops by
+    the number actually flipped, so concurrent views cannot count one twice.
+    """
+    ids = [n['notification_id'] for n in notifications if not n['is_read']]
+    if not ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+        UPDATE notifications SET is_read = TRUE
+        WHERE customer_id = %s AND notification_id IN ({placeholders}) AND is_read = FALSE
+    """, [customer_id] + ids)
+    flipped = cursor.rowcount
+    if flipped > 0:
+        cursor.execute("""
+            UPDATE customer SET unread_notifications = GREATEST(unread_notifications - %s, 0)
+            WHERE Customer_ID = %s
+        """, (flipped, customer_id))
+    return flipped
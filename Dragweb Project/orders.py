@@ -0,0 +1,121 @@
+from mysql.connector import Error
+
+from ledger import record_entry
+
+
+class OutOfStockError(Exception):
+    """Raised when a cart line cannot be reserved because stock ran out"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages  # list of (Med_Name, requested, available)
+        names = ', '.join(f"{name} (only {available} left)" for name, _, available in shortages)
+        super().__init__(f"Not enough stock for: {names}")
+
+
+class EmptyCartError(Exception):
+    """Raised when checking out an empty cart"""
+
+
+def place_order(connection, customer_id, payment_type, payment_id):
+    """Turn the customer's cart into a paid order in a single transaction.
+
+    Steps, all inside one transaction:
+      1. lock the customer's cart rows (stops a double-submitted checkout),
+      2. price every line from medicine.Price,
+      3. insert the payment, its order_items (executemany) and the points,
+      4. decrement stock with conditional updates (Stock >= quantity),
+      5. clear the cart and commit.
+
+    Stock rows are only locked in step 4, in Med_Code order, right before the
+    commit, so concurrent checkouts of a hot SKU hold its row lock briefly
+    and cannot deadlock on each other. Returns a dict describing the order.
+    """
+    cursor = connection.cursor()
+    try:
+        if not connection.in_transaction:
+            connection.start_transaction()
+
+        cursor.execute("""
+            SELECT Med_Code, Quantity FROM cart
+            WHERE Customer_ID = %s
+            FOR UPDATE
+        """, (customer_id,))
+        quantities = {}
+        for med_code, quantity in cursor.fetchall():
+            quantities[med_code] = quantities.get(med_code, 0) + quantity
+
+        if not quantities:
+            raise EmptyCartError()
+
+        med_codes = sorted(quantities)
+        placeholders = ', '.join(['%s'] * len(med_codes))
+        cursor.execute(f"""
+            SELECT Med_Code, Name, Price FROM medicine
+            WHERE Med_Code IN ({placeholders})
+        """, med_codes)
+        medicines = {row[0]: row for row in cursor.fetchall()}
+
+        items = []
+        total_amount = 0
+        for med_code in med_codes:
+            if med_code not in medicines:
+                continue
+            _, name, price = medicines[med_code]
+            line_total = price * quantities[med_code]
+            items.append((payment_id, med_code, name, quantities[med_code], price, line_total))
+            total_amount += line_total
+
+        if not items:
+            raise EmptyCartError()
+
+        cursor.execute("""
+            INSERT INTO payment (payment_id, Customer_ID, amount, payment_type, DeliveryMan_ID)
+            VALUES (%s, %s, %s, %s, NULL)
+        """, (payment_id, customer_id, total_amount, payment_type))
+
+        cursor.executemany("""
+            INSERT INTO order_items (payment_id, Med_Code, Med_Name, Quantity, unit_price, total_price)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, items)
+
+        # Points calculation: 1 point for every 10 BDT spent (rounded down)
+        points_earned = int(total_amount // 10)
+        if points_earned > 0:
+            record_entry(cursor, customer_id, points_earned, 'earned', payment_id,
+                         f"Purchase reward: {points_earned} points for ৳{total_amount} purchase")
+
+        # Reserve stock last so hot rows stay locked for as short a time as possible.
+        # Each conditional update touches one row or none, so the summed rowcount
+        # tells us whether every line was reserved.
+        reservations = [(item[3], item[1], item[3]) for item in items]
+        cursor.executemany("""
+            UPDATE medicine SET Stock = Stock - %s
+            WHERE Med_Code = %s AND Stock >= %s
+        """, reservations)
+        if cursor.rowcount != len(reservations):
+            connection.rollback()
+            raise OutOfStockError(_find_shortages(cursor, items))
+
+        cursor.execute("DELETE FROM cart WHERE Customer_ID = %s", (customer_id,))
+        connection.commit()
+
+        return {
+            'payment_id': payment_id,
+            'total_amount': total_amount,
+            'points_earned': points_earned,
+            'med_codes': med_codes
+        }
+    except (Error, EmptyCartError):
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _find_shortages(cursor, items):
+    """Lines whose requested quantity is more than the current stock"""
+    placeholders = ', '.join(['%s'] * len(items))
+    cursor.execute(f"SELECT Med_Code, Stock FROM medicine WHERE Med_Code IN ({placeholders})",
+                   [item[1] for item in items])
+    stock = dict(cursor.fetchall())
+    return [(item[2], item[3], stock.get(item[1], 0)) for item in items if stock.get(item[1], 0) < item[3]]
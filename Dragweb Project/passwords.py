@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+ALGORITHM = 'pbkdf2_sha256'
+
+# Work factor; raise it as hardware gets faster; old hashes are upgraded on login
+PASSWORD_ITERATIONS = int(os.environ.get('DRUGWEB_PBKDF2_ITERATIONS', 310000))
+
+# Hashing threads (pbkdf2_hmac releases the GIL) and how many jobs may queue up
+KDF_WORKERS = int(os.environ.get('DRUGWEB_KDF_WORKERS', os.cpu_count() or 2))
+KDF_MAX_PENDING = int(os.environ.get('DRUGWEB_KDF_MAX_PENDING', KDF_WORKERS * 8))
+KDF_TIMEOUT = float(os.environ.get('DRUGWEB_KDF_TIMEOUT', 10))
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool is full and a job could not be queued in time"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def hash_password(password, iterations=None):
+    """Hash a password as pbkdf2_sha256$<iterations>$<salt>$<hash>"""
+    iterations = iterations or PASSWORD_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(ALGORITHM + '$')
+
+
+def verify_password(password, stored):
+    """Check a password against a stored value.
+
+    Returns (matches, needs_rehash). Rows that still hold a plaintext
+    password, or a hash with fewer iterations than PASSWORD_ITERATIONS,
+    need a rehash after a successful login.
+    """
+    if not stored:
+        return False, False
+
+    if not is_hashed(stored):
+        # Legacy plaintext row
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        iterations = int(iterations)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), _unb64(salt), iterations)
+    except (ValueError, TypeError):
+        return False, False
+    return hmac.compare_digest(digest, _unb64(expected)), iterations < PASSWORD_ITERATIONS
+
+
+# Verified when an e-mail is unknown, so a miss takes as long as a wrong password
+_DUMMY_HASH = None
+
+
+def dummy_verify(password):
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password('not-a-real-password')
+    verify_password(password, _DUMMY_HASH)
+    return False, False
+
+
+def _gevent_hub():
+    """The gevent hub when threading is monkey-patched (serve.py), else None"""
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return None
+    return get_hub() if monkey.is_module_patched('threading') else None
+
+
+class KdfPool:
+    """Bounded thread pool for password hashing.
+
+    Request threads hand the slow KDF to a fixed number of hashing threads
+    and wait for the result. At most `max_pending` jobs may be queued or
+    running; beyond that callers wait up to `timeout` seconds for a slot and
+    then get HashingBusyError, so a login burst cannot pile up unbounded work.
+    A job that takes longer than `timeout` to finish also raises
+    HashingBusyError.
+
+    Under gevent (serve.py) a ThreadPoolExecutor would be patched into
+    greenlets and the KDF would block the hub, so jobs go to the hub's
+    threadpool of real OS threads instead.
+    """
+
+    def __init__(self, workers=KDF_WORKERS, max_pending=KDF_MAX_PENDING, timeout=KDF_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kdf')
+        return self._executor
+
+    def _run_on_hub(self, hub, fn, args):
+        from gevent import Timeout
+        threadpool = hub.threadpool
+        if threadpool.maxsize < self.workers:
+            threadpool.maxsize = self.workers
+        try:
+            result = threadpool.spawn(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        result.rawlink(lambda _: self._slots.release())
+        try:
+            return result.get(timeout=self.timeout)
+        except Timeout:
+            raise HashingBusyError("Password check timed out, please try again") from None
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusyError("Too many logins in progress, please try again")
+        hub = _gevent_hub()
+        if hub is not None:
+            return self._run_on_hub(hub, fn, args)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The job keeps its slot until it finishes; callers only see "busy"
+            raise HashingBusyError("Password check timed out, please try again") from None
+
+
+kdf_pool = KdfPool()
+
+
+def check_password(password, stored):
+    """verify_password() on the hashing pool. Returns (matches, needs_rehash)."""
+    if stored is None:
+        return kdf_pool.run(dummy_verify, password)
+    return kdf_pool.run(verify_password, password, stored)
+
+
+def make_password(password):
+    """hash_password() on the hashing pool"""
+    return kdf_pool.run(hash_password, password)
@@ -0,0 +1,144 @@
+"""Daily request reminders, written into the notifications table.
+
+Pending medicine requests get one reminder when they are due soon (within
+REMINDER_WINDOW_DAYS), one on the due date and one once overdue. Each
+reminder carries a dedupe key (request ID + stage) under a unique index, and
+is inserted with INSERT IGNORE, so running the job twice, or from several
+workers at once, never duplicates a reminder.
+
+The app starts a background scheduler that runs the job at startup and
+then daily at REMINDER_HOUR. To run it by hand:
+
+    python reminders.py [--date YYYY-MM-DD]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from mysql.connector import Error
+
+from db import get_pool, init_db
+from scheduler import DailyJob
+
+REMINDER_WINDOW_DAYS = 3
+REMINDER_HOUR = int(os.environ.get('DRUGWEB_REMINDER_HOUR', 6))
+REMINDERS_ENABLED = os.environ.get('DRUGWEB_REMINDERS', '1') != '0'
+
+# Stage -> (notification type, SQL condition on Expected_date, message expression)
+REMINDER_STAGES = {
+    'overdue': (
+        'request_overdue',
+        "cr.Expected_date < %(today)s",
+        "CONCAT('Your request for ''', cr.request_med_name, ''' was expected on ', "
+        "DATE_FORMAT(cr.Expected_date, '%%M %%d, %%Y'))"
+    ),
+    'today': (
+        'request_due_today',
+        "cr.Expected_date = %(today)s",
+        "CONCAT('Your request for ''', cr.request_med_name, ''' is expected today')"
+    ),
+    'soon': (
+        'request_due_soon',
+        "cr.Expected_date > %(today)s AND cr.Expected_date <= %(window_end)s",
+        "CONCAT('Your request for ''', cr.request_med_name, ''' is expected in ', "
+        "DATEDIFF(cr.Expected_date, %(today)s), IF(DATEDIFF(cr.Expected_date, %(today)s) = 1, ' day', ' days'))"
+    )
+}
+
+
+def reminder_query(stage):
+    """INSERT IGNORE ... SELECT writing one stage's reminders (pyformat params: today, window_end)"""
+    notification_type, condition, message = REMINDER_STAGES[stage]
+    return f"""
+        INSERT IGNORE INTO notifications (customer_id, message, type, created_at, dedupe_key)
+        SELECT cr.Customer_ID, {message}, '{notification_type}', NOW(),
+               CONCAT('request:', cr.Request_ID, ':{stage}')
+        FROM customer_request cr
+        WHERE cr.Status = 'Pending' AND {condition}
+    """
+
+
+def materialize_reminders(connection, today=None):
+    """Insert any reminders due as of `today`. Returns the number of new rows.
+
+    Reads pending requests through the (Status, Expected_date) index and
+    writes the reminders and the affected unread counters in one transaction.
+    """
+    today = today or date.today()
+    params = {'today': today, 'window_end': today + timedelta(days=REMINDER_WINDOW_DAYS)}
+    cursor = connection.cursor()
+    try:
+        inserted = 0
+        for stage in REMINDER_STAGES:
+            cursor.execute(reminder_query(stage), params)
+            inserted += max(cursor.rowcount, 0)
+
+        if inserted:
+            # Re-derive the counters of customers who may have new rows
+            cursor.execute("""
+                UPDATE customer c
+                JOIN (
+                    SELECT n.customer_id, SUM(n.is_read = FALSE) AS unread
+                    FROM notifications n
+                    WHERE n.customer_id IN (
+                        SELECT Customer_ID FROM customer_request
+                        WHERE Status = 'Pending' AND Expected_date <= %(window_end)s
+                    )
+                    GROUP BY n.customer_id
+                ) t ON t.customer_id = c.Customer_ID
+                SET c.unread_notifications = t.unread
+            """, params)
+        connection.commit()
+        return inserted
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_reminders(today=None):
+    """Run the job on a pooled connection. Returns the rows added, or None on error."""
+    pool = get_pool()
+    try:
+        connection = pool.acquire()
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+    try:
+        return materialize_reminders(connection, today)
+    except Error as e:
+        print(f"Error materializing request reminders: {e}")
+        return None
+    finally:
+        pool.release(connection)
+
+
+scheduler = DailyJob('reminders', run_reminders, REMINDER_HOUR)
+
+
+def start_scheduler():
+    """Start the daily job unless DRUGWEB_REMINDERS=0"""
+    if REMINDERS_ENABLED:
+        scheduler.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write due request reminders into notifications')
+    parser.add_argument('--date', type=date.fromisoformat, default=None,
+                        help='run as if today were this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    if not init_db():
+        sys.exit(1)
+    started = time.perf_counter()
+    inserted = run_reminders(args.date)
+    if inserted is None:
+        sys.exit(1)
+    print(f"{inserted} reminder(s) added in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Customer reviews feed, newest first.
+
+Pages are keyset ranges over Review_ID (the primary key), so any page costs
+an index range read of PAGE_SIZE + 1 rows whatever the table size. The first
+page, which almost every visit shows, is cached in process and invalidated
+when a review is added; REVIEWS_CACHE_TTL bounds how stale it can get when
+another worker process inserts.
+"""
+import os
+import threading
+import time
+
+REVIEWS_PAGE_SIZE = 20
+REVIEWS_CACHE_TTL = float(os.environ.get('DRUGWEB_REVIEWS_CACHE_TTL', 60))
+
+# Feed queries (also EXPLAINed by migrations.ROUTE_QUERIES)
+FEED_QUERY = """
+    SELECT r.Review_ID, r.Customer_ID, r.review, u.F_name, u.L_name
+    FROM customer_review r
+    JOIN user u ON u.ID = r.Customer_ID
+    ORDER BY r.Review_ID DESC
+    LIMIT %s
+"""
+FEED_BEFORE_QUERY = """
+    SELECT r.Review_ID, r.Customer_ID, r.review, u.F_name, u.L_name
+    FROM customer_review r
+    JOIN user u ON u.ID = r.Customer_ID
+    WHERE r.Review_ID < %s
+    ORDER BY r.Review_ID DESC
+    LIMIT %s
+"""
+
+
+def fetch_page(cursor, before=None, limit=REVIEWS_PAGE_SIZE):
+    """One page of reviews with reviewer names.
+
+    Returns (reviews, older) where older is the Review_ID to pass as
+    `before` for the next page, or None on the last page.
+    """
+    if before:
+        cursor.execute(FEED_BEFORE_QUERY, (before, limit + 1))
+    else:
+        cursor.execute(FEED_QUERY, (limit + 1,))
+    rows = cursor.fetchall()
+    older = rows[limit - 1]['Review_ID'] if len(rows) > limit else None
+    return rows[:limit], older
+
+
+def add_review(cursor, customer_id, text):
+    """Insert a review; the caller commits and then calls review_feed.invalidate()"""
+    cursor.execute("""
+        INSERT INTO customer_review (Customer_ID, review)
+        VALUES (%s, %s)
+    """, (customer_id, text))
+    return cursor.lastrowid
+
+
+class ReviewFeedCache:
+    """The first page of the feed, cached until a review is added or the TTL passes"""
+
+    def __init__(self, ttl=REVIEWS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._page = None
+        self._loaded_at = None
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def first_page(self, cursor):
+        """(reviews, older) for the newest page, from memory when fresh"""
+        with self._lock:
+            if self._page is not None and time.monotonic() - self._loaded_at < self.ttl:
+                self._stats['hits'] += 1
+                return self._page
+            self._stats['misses'] += 1
+            generation = self._generation
+        page = fetch_page(cursor)
+        with self._lock:
+            # Skip storing a page read before a concurrent invalidate()
+            if generation == self._generation:
+                self._page = page
+                self._loaded_at = time.monotonic()
+        return page
+
+    def invalidate(self):
+        with self._lock:
+            self._page = None
+            self._generation += 1
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = self._page is not None
+            stats['ttl'] = self.ttl
+        return stats
+
+
+review_feed = ReviewFeedCache()
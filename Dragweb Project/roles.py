@@ -0,0 +1,52 @@
+from flask import session
+
+# Role name -> (dashboard endpoint, label used in flash messages)
+ROLES = {
+    'admin': ('admin.dashboard', 'Admin'),
+    'deliveryman': ('deliveryman.dashboard', 'Delivery man'),
+    'customer': ('customer.dashboard', 'Customer')
+}
+
+# The user row plus one flag per role, in a single lookup on the unique email index
+USER_WITH_ROLES_QUERY = """
+    SELECT u.ID, u.F_name, u.L_name, u.email, u.password,
+           a.Admin_ID IS NOT NULL AS is_admin,
+           d.DeliveryMan_ID IS NOT NULL AS is_deliveryman,
+           c.Customer_ID IS NOT NULL AS is_customer
+    FROM user u
+    LEFT JOIN admin a ON a.Admin_ID = u.ID
+    LEFT JOIN deliveryman d ON d.DeliveryMan_ID = u.ID
+    LEFT JOIN customer c ON c.Customer_ID = u.ID
+    WHERE u.email = %s
+"""
+
+
+def resolve_user(cursor, email):
+    """Fetch a user and every role they hold in one query.
+
+    Returns the user dict with a 'roles' list added, or None if the e-mail
+    is unknown. The cursor must be a dictionary cursor.
+    """
+    cursor.execute(USER_WITH_ROLES_QUERY, (email,))
+    user = cursor.fetchone()
+    if not user:
+        return None
+    user['roles'] = [role for role in ROLES if user[f'is_{role}']]
+    return user
+
+
+def start_session(user, role):
+    """Log the user in as `role`, caching all their roles in the session"""
+    session['user_id'] = user['ID']
+    session['user_type'] = role
+    session['user_name'] = f"{user['F_name']} {user['L_name']}"
+    session['roles'] = user['roles']
+
+
+def has_role(role):
+    """True if the logged-in account holds `role` (no database lookup)"""
+    return role in session.get('roles', [session.get('user_type')])
+
+
+def home_endpoint(role):
+    return ROLES[role][0]
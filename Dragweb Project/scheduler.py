@@ -0,0 +1,67 @@
+"""Tiny in-process scheduler for the app's maintenance jobs"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until(hour, now=None):
+    """Seconds from now until the next occurrence of hour:00"""
+    now = now or datetime.now()
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class DailyJob:
+    """Background thread running `job` at startup and then daily at `hour`.
+
+    Jobs must be idempotent: every worker process runs its own copy.
+    """
+
+    def __init__(self, name, job, hour):
+        self.name = name
+        self.job = job
+        self.hour = hour
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_result = None
+
+    def run_once(self):
+        # An exception here would end the thread and silently stop the job for good
+        try:
+            self.last_result = self.job()
+        except Exception:
+            logger.exception("Scheduled job %s failed", self.name)
+            self.last_result = None
+        self.last_run = datetime.now()
+
+    def next_delay(self):
+        return seconds_until(self.hour)
+
+    def _loop(self):
+        self.run_once()
+        while not self._stop.wait(self.next_delay()):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class IntervalJob(DailyJob):
+    """Background thread running `job` at startup and then every `interval` seconds"""
+
+    def __init__(self, name, job, interval):
+        super().__init__(name, job, None)
+        self.interval = interval
+
+    def next_delay(self):
+        return self.interval
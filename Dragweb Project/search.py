@@ -0,0 +1,350 @@
+import base64
+import heapq
+import json
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
+from decimal import Decimal, InvalidOperation
+
+# Compact row kept in memory for every medicine
+Medicine = namedtuple('Medicine', ['Med_Code', 'Name', 'Generic_name', 'Category', 'Price', 'Stock'])
+
+MEDICINE_COLUMNS = "Med_Code, Name, Generic_name, Category, Price, Stock"
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Terms shorter than this are only matched exactly or by prefix
+MIN_FUZZY_LENGTH = 4
+
+# Sort keys end with Med_Code so every medicine has a unique position (used as keyset cursor)
+SORT_FIELDS = {
+    'name': lambda m: ((m.Name or '').lower(), m.Med_Code),
+    'price': lambda m: (m.Price, m.Med_Code)
+}
+
+# sort_by option -> (sort field, descending)
+SORT_KEYS = {
+    'name': ('name', False),
+    'price': ('price', False),
+    'price_desc': ('price', True)
+}
+
+# Cached result counts kept per index version
+COUNT_CACHE_SIZE = 1024
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def to_medicine(row):
+    """Build a Medicine from a DB row, keeping Price as Decimal so cursors round-trip exactly"""
+    medicine = Medicine(*row)
+    if isinstance(medicine.Price, (float, int)):
+        medicine = medicine._replace(Price=Decimal(str(medicine.Price)))
+    return medicine
+
+
+def encode_cursor(sort_by, medicine):
+    """Opaque keyset cursor pointing just after medicine in the given sort order"""
+    field, _ = SORT_KEYS.get(sort_by, SORT_KEYS['name'])
+    value, med_code = SORT_FIELDS[field](medicine)
+    payload = json.dumps([sort_by, str(value), med_code]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(token, sort_by):
+    """Turn a cursor back into a sort key, or None if it is invalid or for another sort order"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, value, med_code = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort_by:
+            return None
+        field, _ = SORT_KEYS.get(sort_by, SORT_KEYS['name'])
+        if field == 'price':
+            value = Decimal(value)
+        return (value, med_code)
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+def _deletes(token):
+    """All variants of token with one character removed"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insert, delete, substitution or transposition"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+
+class MedicineSearchIndex:
+    """In-memory inverted index over medicine Name, Generic_name and Category.
+
+    Each query term matches indexed tokens that are equal to it, start with it
+    (so results update while typing) or are one typo away from it. A medicine
+    matches when every query term matches one of its tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}         # Med_Code -> Medicine
+        self._doc_tokens = {}   # Med_Code -> set of tokens
+        self._postings = {}     # token -> set of Med_Code
+        self._deletes = {}      # one-character deletion -> set of tokens
+        self._sorted_tokens = []
+        self._tokens_dirty = False
+        self._orders = {}       # sort field (or 'code') -> sorted list of sort keys
+        self._categories = Counter()
+        self._counts = {}       # (terms, category) -> cached total
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def build(self, rows):
+        """Replace the index contents with rows"""
+        with self._lock:
+            self._docs = {}
+            self._doc_tokens = {}
+            self._postings = {}
+            self._deletes = {}
+            self._orders = {}
+            self._categories = Counter()
+            self._counts = {}
+            for row in rows:
+                self._add(to_medicine(row))
+            self._sorted_tokens = sorted(self._postings)
+            self._tokens_dirty = False
+            self.loaded = True
+
+    def upsert(self, row):
+        """Add or replace a single medicine"""
+        medicine = to_medicine(row)
+        with self._lock:
+            old = self._docs.get(medicine.Med_Code)
+            self._remove(medicine.Med_Code, keep_orders=True)
+            self._add(medicine, keep_orders=True)
+            # Stock-only changes keep the presorted orders
+            if old is None or any(f(old) != f(medicine) for f in SORT_FIELDS.values()):
+                self._orders = {}
+
+    def remove(self, med_code):
+        with self._lock:
+            self._remove(med_code)
+
+    def get(self, med_code):
+        return self._docs.get(med_code)
+
+    def medicines(self):
+        """Every medicine ordered by Med_Code"""
+        with self._lock:
+            order = self._orders.get('code')
+            if order is None:
+                order = self._orders['code'] = sorted(self._docs)
+            return [self._docs[code] for code in order]
+
+    def categories(self):
+        """Distinct non-empty categories in alphabetical order"""
+        with self._lock:
+            return sorted(c for c in self._categories if c)
+
+    def _add(self, medicine, keep_orders=False):
+        if not keep_orders:
+            self._orders = {}
+        self._counts = {}
+        self._categories[medicine.Category] += 1
+        tokens = set(tokenize(medicine.Name))
+        tokens.update(tokenize(medicine.Generic_name))
+        tokens.update(tokenize(medicine.Category))
+        self._docs[medicine.Med_Code] = medicine
+        self._doc_tokens[medicine.Med_Code] = tokens
+        for token in tokens:
+            codes = self._postings.get(token)
+            if codes is None:
+                codes = self._postings[token] = set()
+                self._tokens_dirty = True
+                if len(token) >= MIN_FUZZY_LENGTH:
+                    for variant in _deletes(token):
+                        self._deletes.setdefault(variant, set()).add(token)
+            codes.add(medicine.Med_Code)
+
+    def _remove(self, med_code, keep_orders=False):
+        old = self._docs.pop(med_code, None)
+        if old is None:
+            return
+        if not keep_orders:
+            self._orders = {}
+        self._counts = {}
+        self._categories[old.Category] -= 1
+        if self._categories[old.Category] <= 0:
+            del self._categories[old.Category]
+        for token in self._doc_tokens.pop(med_code, ()):
+            codes = self._postings.get(token)
+            if codes is None:
+                continue
+            codes.discard(med_code)
+            if not codes:
+                del self._postings[token]
+                self._tokens_dirty = True
+                if len(token) >= MIN_FUZZY_LENGTH:
+                    for variant in _deletes(token):
+                        variants = self._deletes.get(variant)
+                        if variants:
+                            variants.discard(token)
+                            if not variants:
+                                del self._deletes[variant]
+
+    def _matching_tokens(self, term):
+        """Indexed tokens that match a query term by exact, prefix or one-typo match"""
+        if self._tokens_dirty:
+            self._sorted_tokens = sorted(self._postings)
+            self._tokens_dirty = False
+
+        matches = set()
+        start = bisect_left(self._sorted_tokens, term)
+        for token in self._sorted_tokens[start:]:
+            if not token.startswith(term):
+                break
+            matches.add(token)
+
+        if len(term) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._deletes.get(term, ()))
+            for variant in _deletes(term):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._deletes.get(variant, ()))
+            matches.update(c for c in candidates if _within_one_edit(term, c))
+        return matches
+
+    def match(self, query):
+        """Set of Med_Codes matching every term of query (all medicines if query is empty)"""
+        terms = tokenize(query)
+        with self._lock:
+            if not terms:
+                return set(self._docs)
+            result = None
+            for term in sorted(set(terms), key=len, reverse=True):
+                codes = set()
+                for token in self._matching_tokens(term):
+                    codes.update(self._postings[token])
+                result = codes if result is None else result & codes
+                if not result:
+                    return set()
+            return result
+
+    def _ordered(self, field):
+        """Sort keys of every medicine for a sort field, rebuilt only after the catalog changes"""
+        order = self._orders.get(field)
+        if order is None:
+            key = SORT_FIELDS[field]
+            order = self._orders[field] = sorted(key(m) for m in self._docs.values())
+        return order
+
+    def _candidates(self, query, category):
+        codes = self.match(query)
+        with self._lock:
+            medicines = [self._docs[code] for code in codes if code in self._docs]
+        if category:
+            medicines = [m for m in medicines if m.Category == category]
+        return medicines
+
+    def count(self, query='', category=None):
+        """Number of matching medicines, cached until the catalog changes"""
+        terms = tuple(sorted(set(tokenize(query))))
+        with self._lock:
+            if not terms:
+                return self._categories.get(category, 0) if category else len(self._docs)
+            cache_key = (terms, category)
+            if cache_key in self._counts:
+                return self._counts[cache_key]
+        total = len(self._candidates(query, category))
+        with self._lock:
+            if len(self._counts) >= COUNT_CACHE_SIZE:
+                self._counts = {}
+            self._counts[cache_key] = total
+        return total
+
+    def search(self, query='', category=None, sort_by='name', offset=0, limit=None):
+        """Return (medicines, total) for a query, sorted like the SQL ORDER BY clauses"""
+        field, reverse = SORT_KEYS.get(sort_by, SORT_KEYS['name'])
+        key = SORT_FIELDS[field]
+
+        if not tokenize(query) and not category and limit is not None:
+            # Whole catalog: slice the presorted order
+            with self._lock:
+                order = self._ordered(field)
+                total = len(order)
+                if reverse:
+                    keys = order[max(0, total - offset - limit):max(0, total - offset)][::-1]
+                else:
+                    keys = order[offset:offset + limit]
+                return [self._docs[k[-1]] for k in keys], total
+
+        medicines = self._candidates(query, category)
+        total = len(medicines)
+        if limit is not None and (offset + limit) * 8 < total:
+            # Shallow page of a large result: partial sort instead of sorting everything
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            return select(offset + limit, medicines, key=key)[offset:], total
+
+        medicines.sort(key=key, reverse=reverse)
+        if limit is not None:
+            medicines = medicines[offset:offset + limit]
+        elif offset:
+            medicines = medicines[offset:]
+        return medicines, total
+
+    def page(self, query='', category=None, sort_by='name', after=None, limit=12):
+        """Keyset page: up to limit medicines that sort after the `after` key.
+
+        Returns (medicines, next_key) where next_key is None on the last page.
+        """
+        field, reverse = SORT_KEYS.get(sort_by, SORT_KEYS['name'])
+        key = SORT_FIELDS[field]
+
+        if not tokenize(query) and not category:
+            with self._lock:
+                order = self._ordered(field)
+                if reverse:
+                    end = bisect_left(order, after) if after else len(order)
+                    keys = order[max(0, end - limit - 1):end][::-1]
+                else:
+                    start = bisect_right(order, after) if after else 0
+                    keys = order[start:start + limit + 1]
+                medicines = [self._docs[k[-1]] for k in keys]
+        else:
+            medicines = self._candidates(query, category)
+            if after:
+                if reverse:
+                    medicines = [m for m in medicines if key(m) < after]
+                else:
+                    medicines = [m for m in medicines if key(m) > after]
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            medicines = select(limit + 1, medicines, key=key)
+
+        if len(medicines) > limit:
+            medicines = medicines[:limit]
+            return medicines, key(medicines[-1])
+        return medicines, None
+
+
+# Shared index, loaded and kept fresh by catalog_cache
+medicine_index = MedicineSearchIndex()
+
@@ -0,0 +1,49 @@
+"""Run DrugWeb on gevent so idle /customer/events streams cost a greenlet, not a thread.
+
+    pip install gevent
+    python serve.py [--host 0.0.0.0] [--port 5000]
+
+Run one process: the notification bus in events.py is in-process, so every
+stream must live in the process whose routes publish. Without gevent this
+falls back to Flask's threaded development server (one thread per stream).
+
+Under gevent, work that does not go through patched Python sockets blocks
+every greenlet, so password hashing runs on gevent's OS-thread pool (see
+passwords.KdfPool) and MySQL is reached through the pure-Python connector:
+the C extension does its network I/O outside gevent's reach.
+"""
+import argparse
+
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    monkey = None
+
+import db  # noqa: E402
+
+if monkey is not None:
+    # Before anything opens a connection (the pool copies this on first use)
+    db.DB_CONFIG['use_pure'] = True
+
+from app import app  # noqa: E402  (imported after monkey-patching)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve DrugWeb with streaming support')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    if monkey is None:
+        print("gevent is not installed; using the threaded development server")
+        app.run(host=args.host, port=args.port, threaded=True)
+        return
+
+    from gevent.pywsgi import WSGIServer
+    print(f"Serving on http://{args.host}:{args.port} (gevent)")
+    WSGIServer((args.host, args.port), app).serve_forever()
+
+
+if __name__ == '__main__':
+    main()